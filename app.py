@@ -5,19 +5,24 @@ Sistema de monitoreo y control para turbina PMSG con detección de anomalías
 Versión: 2.2 AI (Modo Archivo + Simulink)
 """
 import streamlit as st
-import pandas as pd
 import queue
 import time
 
-from config import ui_config
-from core import MLInferenceEngine, TCPServerManager
+from config import ui_config, storage_config, network_config
+from core import MLInferenceEngine, TCPServerManager, ControlState
+from core.power_curve import PowerCurveIndex
+from core.arrow_stream import ArrowStreamServer
+from core.profiler import traced
 from ui import (
     get_custom_css,
     render_header,
     render_sidebar,
     render_metrics_panel,
-    render_charts
+    render_charts,
+    render_resolution_selector,
+    render_rollup_charts
 )
+from storage import RollupEngine, HistorianCompressor, CheckpointManager
 from utils import DataProcessor
 
 # Configura la página de Streamlit
@@ -37,31 +42,63 @@ def get_global_server_resources():
     # 1. Cola compartida
     global_queue = queue.Queue()
 
-    # 2. Controles compartidos (Diccionario mutable)
-    global_controls = {
-        'v': ui_config.WIND_SPEED_DEFAULT,
-        'p': ui_config.PITCH_ANGLE_DEFAULT
-    }
+    # 2. Controles compartidos (instantáneas versionadas, lectura sin bloqueo)
+    global_controls = ControlState(
+        v=ui_config.WIND_SPEED_DEFAULT,
+        p=ui_config.PITCH_ANGLE_DEFAULT
+    )
 
     # 3. Motor de IA
     global_ml = MLInferenceEngine()
 
-    # 4. Servidor TCP (Arranca aquí una sola vez)
+    # 4. Agregados multi-resolución (persistidos junto a los logs)
+    global_rollups = RollupEngine()
+    global_rollups.load()
+
+    # 5. Historiador comprimido (deadband / swinging door por señal)
+    sinks = [global_rollups]
+    if storage_config.HISTORIAN_ENABLED:
+        sinks.append(HistorianCompressor())
+
+    # 6. Checkpoint de arranque en caliente: restaura historial, agregados y
+    #    calibración antes de aceptar conexiones
+    global_checkpoint = None
+    if storage_config.CHECKPOINT_ENABLED:
+        global_checkpoint = CheckpointManager(global_rollups, global_ml)
+        global_checkpoint.restore()
+        sinks.append(global_checkpoint)
+
+    # 7. Stream Arrow IPC para clientes externos (historiador, notebooks)
+    global_stream = None
+    if network_config.STREAM_ENABLED:
+        global_stream = ArrowStreamServer()
+        sinks.append(global_stream)
+
+    # 8. Curva de potencia de referencia (segundo detector, físico)
+    global_power_curve = PowerCurveIndex.load_default()
+
+    # 9. Servidor TCP (Arranca aquí una sola vez)
     server = TCPServerManager(
         data_queue=global_queue,
         controls=global_controls,
-        ml_engine=global_ml
+        ml_engine=global_ml,
+        sinks=sinks,
+        power_curve=global_power_curve
     )
     server.start()
+    if global_stream is not None:
+        global_stream.start()
+    if global_checkpoint is not None:
+        global_checkpoint.start()
 
-    return server, global_queue, global_controls, global_ml
+    return server, global_queue, global_controls, global_ml, global_rollups, global_checkpoint
 # ---------------------------------------------------------
 
 
 # Inicializa el estado de sesión conectándolo a los recursos globales
 def initialize_session_state() -> None:
     # Obtenemos los recursos inmortales
-    server, data_queue, shared_controls, ml_engine = get_global_server_resources()
+    server, data_queue, shared_controls, ml_engine, rollups, checkpoint = get_global_server_resources()
 
     # Los vinculamos a la sesión del usuario actual
     if 'tcp_server' not in st.session_state:
@@ -77,8 +114,15 @@ def initialize_session_state() -> None:
     if 'ml_engine' not in st.session_state:
         st.session_state.ml_engine = ml_engine
 
+    if 'rollups' not in st.session_state:
+        st.session_state.rollups = rollups
+
     if 'history' not in st.session_state:
         st.session_state.history = DataProcessor.initialize_history()
+        # Arranque en caliente: la sesión nueva muestra los últimos frames retenidos
+        if checkpoint is not None:
+            st.session_state.history.extend(
+                checkpoint.history_block(st.session_state.history.capacity))
 
     if 'csv_filepath' not in st.session_state:
         st.session_state.csv_filepath = DataProcessor.create_csv_file()
@@ -96,37 +140,40 @@ def stop_server() -> None:
 
 # Procesa actualizaciones de datos desde la cola
 def process_data_updates() -> bool:
-    new_data = []
-
-    while not st.session_state.data_queue.empty():
-        new_data.append(st.session_state.data_queue.get())
+    new_block = DataProcessor.process_queue(
+        st.session_state.data_queue,
+        st.session_state.history
+    )
 
-    if not new_data:
+    if new_block is None:
         return False
 
     # Guardar en CSV
-    DataProcessor.save_to_csv(
-        st.session_state.csv_filepath,
-        new_data,
-        st.session_state.shared_controls
-    )
-
-    # Actualizar historial en memoria
-    new_df = pd.DataFrame(new_data)
-    st.session_state.history = pd.concat(
-        [st.session_state.history, new_df],
-        ignore_index=True
-    ).tail(ui_config.MAX_HISTORY_SIZE)
+    DataProcessor.save_to_csv(st.session_state.csv_filepath, new_block)
 
     time.sleep(0.05)
     return True
 
 # Renderiza el contenido principal
+@traced('app.render_main_content')
 def render_main_content() -> None:
-    if not st.session_state.history.empty:
-        latest = st.session_state.history.iloc[-1].to_dict()
-        render_metrics_panel(latest, st.session_state.history)
-        render_charts(st.session_state.history)
+    if len(st.session_state.history) > 0:
+        history_df = st.session_state.history.to_frame()
+        latest = history_df.iloc[-1].to_dict()
+        render_metrics_panel(latest, history_df)
+
+        # Última alarma de deriva del score (calibración en línea)
+        calibrator = st.session_state.ml_engine.calibrator
+        alarm = calibrator.last_alarm() if calibrator is not None else None
+        if alarm is not None:
+            st.warning(f"Deriva del score en régimen {alarm['regime']} m/s "
+                       f"({alarm['direction']}) — {calibrator.alarm_count} alarmas desde el arranque")
+
+        resolution, label = render_resolution_selector()
+        if resolution is None:
+            render_charts(history_df)
+        else:
+            render_rollup_charts(st.session_state.rollups.frame(resolution), label)
     else:
         st.info("Esperando datos de Simulink... (Servidor escuchando en puerto 30001)")
 
@@ -0,0 +1 @@
+"""Benchmarks y arneses de medición"""
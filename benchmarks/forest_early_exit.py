@@ -0,0 +1,144 @@
+"""Salida anticipada del Isolation Forest frente a la evaluación completa.
+
+Puntúa features reales (data/*.parquet) y telemetría del gemelo sustituto con
+sklearn, con FlatForest completo y con salida anticipada a varias
+confianzas. Reporta árboles evaluados en promedio, tasa de acuerdo del
+estado (anomalía/normal) con la evaluación completa, error de score y tiempos.
+
+    python3 -m benchmarks.forest_early_exit
+    python3 -m benchmarks.forest_early_exit --confidence 0.99 0.999 0.9999 --json resultados/early_exit.json
+"""
+import argparse
+import glob
+import json
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from config.settings import file_player_config, ml_config
+from core.forest import FlatForest
+from core.ml_inference import MLInferenceEngine
+
+# Columnas del parquet equivalentes a las features de entrenamiento
+PARQUET_FEATURES = [
+    'WIND_Wind speed 10min-Aver',
+    'GEN_Generator speed-Aver',
+    'PWR_TotalActivePower-Aver',
+    'AIR_Air density-Aver',
+]
+
+
+def load_archive_features(data_dir: str = None) -> np.ndarray:
+    data_dir = data_dir or file_player_config.DATA_DIR
+    frames = [pd.read_parquet(p, columns=PARQUET_FEATURES)
+              for p in sorted(glob.glob(os.path.join(data_dir, '*.parquet')))]
+    if not frames:
+        return np.empty((0, 4))
+    return pd.concat(frames).dropna().to_numpy(np.float64)
+
+
+def simulated_features(n: int, seed: int = 0) -> np.ndarray:
+    """Frames del gemelo sustituto en las unidades del servidor TCP."""
+    from simulation import PMSGPlant
+
+    rng = np.random.default_rng(seed)
+    wind = rng.uniform(3.0, 16.0, n)
+    plant = PMSGPlant(n)
+    out = plant.settle(wind, 0.0, seconds=60.0)
+    rpm, kw = MLInferenceEngine.convert_units(out[:, 0], out[:, 1])
+    return np.column_stack([wind, rpm, kw, np.full(n, ml_config.AIR_DENSITY)])
+
+
+def _timed(fn, repeat: int = 3):
+    best = float('inf')
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return result, best
+
+
+def evaluate(name: str, X_scaled: np.ndarray, model, forest: FlatForest,
+             confidences, chunk: int, min_trees: int) -> list:
+    ref, t_sklearn = _timed(lambda: model.decision_function(X_scaled))
+    full, t_flat = _timed(lambda: forest.decision_function(X_scaled))
+    near = np.abs(ref) < 0.01
+
+    rows = [{
+        'dataset': name, 'mode': 'sklearn', 'samples': len(X_scaled),
+        'avg_trees': float(forest.n_trees), 'agreement': 1.0,
+        'max_score_err': 0.0, 'time_ms': t_sklearn * 1e3,
+    }, {
+        'dataset': name, 'mode': 'flat', 'samples': len(X_scaled),
+        'avg_trees': float(forest.n_trees),
+        'agreement': float(np.mean((full < 0) == (ref < 0))),
+        'max_score_err': float(np.abs(full - ref).max()), 'time_ms': t_flat * 1e3,
+    }]
+    for conf in confidences:
+        (early, used), t_early = _timed(
+            lambda: forest.decision_early(X_scaled, conf, chunk, min_trees))
+        exact = used == forest.n_trees
+        rows.append({
+            'dataset': name, 'mode': f'early@{conf}', 'samples': len(X_scaled),
+            'avg_trees': float(used.mean()),
+            'agreement': float(np.mean((early < 0) == (ref < 0))),
+            'max_score_err': float(np.abs(early - ref).max()),
+            'exact_near_boundary': float(exact[near].mean()) if near.any() else 1.0,
+            'time_ms': t_early * 1e3,
+        })
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Salida anticipada del Isolation Forest")
+    parser.add_argument('--confidence', type=float, nargs='+', default=[0.99, 0.999, 0.9999])
+    parser.add_argument('--chunk', type=int, default=ml_config.EARLY_EXIT_CHUNK)
+    parser.add_argument('--min-trees', type=int, default=ml_config.EARLY_EXIT_MIN_TREES)
+    parser.add_argument('--simulated', type=int, default=20000,
+                        help="Frames del gemelo sustituto a puntuar")
+    parser.add_argument('--json', help="Guardar resultados en un archivo JSON")
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore', category=UserWarning)
+    engine = MLInferenceEngine()
+    if not engine.is_active:
+        raise SystemExit("Modelos no disponibles")
+    # La referencia es siempre sklearn, aunque el motor haya cargado el artefacto
+    model = engine.model
+    if model is None:
+        import joblib
+
+        model = joblib.load(os.path.join(ml_config.MODEL_DIR, ml_config.MODEL_FILE))
+    forest = engine.forest or FlatForest.from_sklearn(model)
+
+    datasets = {
+        'archivo': load_archive_features(),
+        'gemelo': simulated_features(args.simulated),
+    }
+    rng = np.random.default_rng(1)
+    mixed = np.concatenate([d for d in datasets.values() if len(d)])
+    datasets['perturbado'] = mixed * rng.normal(1.0, 0.15, mixed.shape)
+
+    results = []
+    for name, X in datasets.items():
+        if len(X) == 0:
+            continue
+        X_scaled = engine.scaler.transform(X)
+        results += evaluate(name, X_scaled, model, forest,
+                            args.confidence, args.chunk, args.min_trees)
+
+    df = pd.DataFrame(results)
+    pd.set_option('display.width', 160)
+    print(df.to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or '.', exist_ok=True)
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
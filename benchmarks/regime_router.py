@@ -0,0 +1,171 @@
+"""Enrutador por régimen frente al Isolation Forest global.
+
+Entrena el enrutador (core/regime_router.py) y un bosque global de
+referencia con la misma partición de entrenamiento del archivo, y sobre la
+partición de prueba mide:
+
+- detección: tasa de falsos positivos en frames limpios y tasa de detección
+  y AUC frente a ataques FDI sobre el tacómetro y la potencia (los de
+  fdi_cybersecurity_experiment.py más sesgos hacia arriba), solo en frames
+  con el rotor girando;
+- costo: µs por frame con `predict` (un frame) y `predict_batch`, y árboles
+  evaluados por frame, con el motor en producción con y sin enrutador.
+
+    python3 -m benchmarks.regime_router
+    python3 -m benchmarks.regime_router --test-fraction 0.4 --json resultados/regime_router.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from config.settings import router_config
+from core.ml_inference import MLInferenceEngine
+from core.regime_router import RegimeRouter
+
+
+def attacks(X: np.ndarray, rng: np.random.Generator) -> dict:
+    """Variantes atacadas de X (el atacante altera una sola señal)."""
+    rpm_std = X[:, 1].std()
+    out = {}
+
+    def with_column(j, values):
+        A = X.copy()
+        A[:, j] = values
+        return A
+
+    out['spike'] = with_column(1, X[:, 1] * 0.05)                      # Caída al 5 %
+    out['ramp'] = with_column(1, X[:, 1] * rng.uniform(0.05, 1.0, len(X)))
+    out['bias_down'] = with_column(1, np.maximum(X[:, 1] - rpm_std, 0.0))
+    out['bias_up'] = with_column(1, X[:, 1] * 1.3)
+    out['power_half'] = with_column(2, X[:, 2] * 0.5)
+    return out
+
+
+def _auc(clean: np.ndarray, attacked: np.ndarray) -> float:
+    # Probabilidad de que un frame atacado tenga menor score que uno limpio
+    from sklearn.metrics import roc_auc_score
+
+    y = np.r_[np.zeros(len(clean)), np.ones(len(attacked))]
+    return float(roc_auc_score(y, -np.r_[clean, attacked]))
+
+
+def detection(scorers: dict, X_clean: np.ndarray, attacked: dict) -> list:
+    rows = []
+    for name, score in scorers.items():
+        clean = score(X_clean)
+        rows.append({'model': name, 'set': 'limpio', 'detection': float(np.mean(clean < 0)),
+                     'auc': float('nan')})
+        for attack, X_att in attacked.items():
+            s = score(X_att)
+            rows.append({'model': name, 'set': attack, 'detection': float(np.mean(s < 0)),
+                         'auc': _auc(clean, s)})
+    return rows
+
+
+def cost(engine: MLInferenceEngine, X: np.ndarray, frames: int, batch: int) -> dict:
+    idx = np.random.default_rng(0).integers(0, len(X), frames)
+    engine.trees_evaluated = engine.samples_scored = 0
+    t0 = time.perf_counter()
+    for i in idx:
+        engine.predict(X[i, 0], X[i, 1], X[i, 2])
+    single = (time.perf_counter() - t0) / frames
+    trees = engine.average_trees()
+
+    B = X[np.resize(np.arange(len(X)), batch)]
+    best = float('inf')
+    for _ in range(5):
+        t0 = time.perf_counter()
+        engine.predict_batch(B[:, 0], B[:, 1], B[:, 2])
+        best = min(best, time.perf_counter() - t0)
+    return {'us_per_frame_single': single * 1e6, 'us_per_frame_batch': best / batch * 1e6,
+            'avg_trees': trees}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Enrutador por régimen vs. bosque global")
+    parser.add_argument('--data-dir')
+    parser.add_argument('--test-fraction', type=float, default=0.3)
+    parser.add_argument('--frames', type=int, default=2000, help="Frames del bucle de un frame")
+    parser.add_argument('--batch', type=int, default=1024)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="Guardar resultados en un archivo JSON")
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore', category=UserWarning)
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
+    from pipelines.train import SCALER_FEATURES, collect_sample
+
+    reservoir, _ = collect_sample(args.data_dir)
+    X = reservoir.sample()
+    rng = np.random.default_rng(args.seed)
+    order = rng.permutation(len(X))
+    n_test = int(len(X) * args.test_fraction)
+    X_test, X_train = X[order[:n_test]], X[order[n_test:]]
+
+    # Enrutador guardado y recargado: mismo camino (artefactos mapeados) que en producción
+    with tempfile.TemporaryDirectory() as tmp:
+        built = RegimeRouter.build(X_train, seed=args.seed)
+        built.save(os.path.join(tmp, 'router'))
+        router = RegimeRouter.load(os.path.join(tmp, 'router'))
+
+    scaler = StandardScaler().fit(pd.DataFrame(X_train, columns=SCALER_FEATURES))
+    refit = IsolationForest(n_estimators=100, contamination=router_config.CONTAMINATION,
+                            random_state=args.seed).fit(scaler.transform(pd.DataFrame(X_train, columns=SCALER_FEATURES)))
+
+    engine = MLInferenceEngine(calibrate=False)
+    if not engine.is_active:
+        raise SystemExit("Modelos no disponibles")
+
+    def score_router(A):
+        engine.router = router
+        try:
+            return engine._score(A, exact=True)
+        finally:
+            engine.router = None
+
+    scorers = {
+        'global (producción)': lambda A: engine._score(A, exact=True),
+        'global (mismo split)': lambda A: refit.decision_function(
+            scaler.transform(pd.DataFrame(A, columns=SCALER_FEATURES))),
+        'enrutador': score_router,
+    }
+    # Ataques al tacómetro solo con el rotor girando (en reposo no cambian nada)
+    spinning = X_test[X_test[:, 1] > 0.1 * X_test[:, 1].max()]
+    results = detection(scorers, X_test, attacks(spinning, rng))
+    df = pd.DataFrame(results)
+    pd.set_option('display.width', 160)
+    print(f"Entrenamiento {len(X_train)} filas, prueba {len(X_test)} ({len(spinning)} con rotor girando)")
+    print("Nota: el modelo en producción se entrenó con todo el archivo (incluye la prueba)\n")
+    print(df.pivot(index='set', columns='model', values='detection')
+            .to_string(float_format=lambda v: f"{v:.3f}"))
+    print("\nAUC (ataque vs. limpio):")
+    print(df[df['set'] != 'limpio'].pivot(index='set', columns='model', values='auc')
+            .to_string(float_format=lambda v: f"{v:.3f}"))
+
+    costs = {'global': cost(engine, X_test, args.frames, args.batch)}
+    engine.router = router
+    costs['enrutador'] = cost(engine, X_test, args.frames, args.batch)
+    print("\nCosto:")
+    print(pd.DataFrame(costs).T.to_string(float_format=lambda v: f"{v:.1f}"))
+    print("\nRegímenes:")
+    print(router.to_frame().to_string(index=False))
+
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or '.', exist_ok=True)
+        with open(args.json, 'w') as f:
+            json.dump({'detection': results, 'cost': costs,
+                       'regimes': router.to_frame().to_dict('records'),
+                       'nodes': {'global': int(len(engine.forest.value)) if engine.forest else None,
+                                 'router': int(sum(len(f.value) for f in router.forests))}},
+                      f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""Prueba de resistencia (soak) del servidor con detección de crecimiento de memoria.
+
+Levanta en un solo proceso lo mismo que `get_global_server_resources` (cola
+compartida, motor de IA, agregados, historiador, checkpoint, stream Arrow y
+servidor TCP). Contra eso corren:
+
+- la planta sustituta por el protocolo v2, tan rápido como se pueda (tiempo
+  acelerado);
+- N sesiones de UI simuladas, que hacen lo mismo que una pasada de
+  `app.main` sin Streamlit: `process_queue`, `save_to_csv` y `to_frame`.
+  Cada --churn segundos una sesión se cierra y se abre otra, con historial y
+  CSV nuevos como en `initialize_session_state`, y se pulsa PLAY/PAUSA/
+  REINICIAR en un FilePlayerManager.
+
+Cada --sample segundos se registran la memoria rastreada por tracemalloc, el
+RSS, los hilos, los descriptores abiertos, la profundidad de la cola y los CSV
+de sesión. Cada --snapshot segundos se toma un snapshot de tracemalloc y se
+guardan los sitios de asignación que más crecieron desde el final del
+calentamiento. Al terminar se ajusta una recta a cada serie (después del
+calentamiento). Si alguna pendiente supera su límite por hora y la serie
+creció en neto (último tercio frente al primero), termina con código 1.
+
+Los CSV, agregados, segmentos del historiador y el checkpoint van a una
+carpeta temporal que se borra al final (--keep para conservarla).
+
+    python3 -m benchmarks.soak --duration 3600 --json resultados/soak.json
+    python3 -m benchmarks.soak --duration 600 --sessions 4 --churn 5 --max-traced-slope 512
+"""
+import argparse
+import gc
+import glob
+import json
+import os
+import queue
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+from config.settings import file_player_config, network_config, storage_config, ui_config
+from core import ControlState, MLInferenceEngine, TCPServerManager
+from core.arrow_stream import ArrowStreamServer
+from core.file_player import FilePlayerManager
+from core.power_curve import PowerCurveIndex
+from simulation.gateway_client import GatewayClient
+from simulation.pmsg_plant import PMSGPlant
+from storage import CheckpointManager, HistorianCompressor, RollupEngine
+from utils import DataProcessor
+
+# Series muestreadas y su límite de pendiente por defecto (unidades por hora)
+SERIES = {
+    'traced_kib': 1024.0,   # Memoria Python rastreada por tracemalloc
+    'rss_kib': 4096.0,
+    'threads': 0.5,
+    'fds': 0.5,
+    'queue': 100.0,
+}
+_IGNORE = (tracemalloc.__file__, __file__, '<frozen importlib._bootstrap>', '<unknown>')
+
+
+def _rss_kib() -> float:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # Pico, no actual (macOS/Windows)
+
+
+def _fd_count() -> int:
+    for path in ('/proc/self/fd', '/dev/fd'):
+        if os.path.isdir(path):
+            return len(os.listdir(path))
+    return -1
+
+
+def slope_per_hour(t: np.ndarray, y: np.ndarray) -> float:
+    """Pendiente de mínimos cuadrados de y(t) con t en segundos, por hora."""
+    if len(t) < 3 or np.ptp(t) == 0:
+        return 0.0
+    return float(np.polyfit(t, y, 1)[0] * 3600.0)
+
+
+def net_growth(y: np.ndarray) -> float:
+    """Mediana del último tercio menos la del primero (robusta a oscilaciones)."""
+    if len(y) < 3:
+        return 0.0
+    third = len(y) // 3
+    return float(np.median(y[-third:]) - np.median(y[:third]))
+
+
+class UISession:
+    """Sesión de dashboard sin Streamlit: el estado de `initialize_session_state`."""
+
+    def __init__(self, data_queue: queue.Queue, controls: ControlState, parquet: str,
+                 play_interval: float):
+        self.data_queue = data_queue
+        self.history = DataProcessor.initialize_history()
+        self.csv_filepath = DataProcessor.create_csv_file()
+        self.file_player = FilePlayerManager(controls=controls, interval=play_interval)
+        self.parquet = parquet
+
+    def rerun(self) -> int:
+        """Una pasada de `app.main`: drenar cola, CSV y DataFrame de visualización."""
+        block = DataProcessor.process_queue(self.data_queue, self.history)
+        if block is None:
+            return 0
+        DataProcessor.save_to_csv(self.csv_filepath, block)
+        self.history.to_frame()
+        return len(block)
+
+    def press(self, rng: random.Random) -> None:
+        # Botones del reproductor como en ui/sidebar.py
+        fp = self.file_player
+        action = rng.choice(('play', 'play', 'pause', 'reset'))
+        if action == 'play' and not fp.is_playing and self.parquet:
+            if fp.df is None:
+                fp.load_file(self.parquet)
+            fp.start()
+        elif action == 'pause' and fp.is_playing:
+            fp.pause()
+        elif action == 'reset':
+            fp.reset()
+
+    def close(self) -> None:
+        # Cerrar la pestaña no detiene el reproductor en la app: aquí sí, para no
+        # confundir hilos que terminan solos con hilos filtrados
+        self.file_player.stop()
+
+
+class SoakRun:
+    """Servidor + planta sustituta + sesiones simuladas en hilos del mismo proceso."""
+
+    def __init__(self, args, workdir: str):
+        self.args = args
+        self.workdir = workdir
+        self.stop_event = threading.Event()
+        self.frames_sent = 0
+        self.frames_rendered = 0
+        self.sessions_opened = 0
+        self.errors = []
+
+        storage_config.LOG_DIR = os.path.join(workdir, 'data_logs')
+        storage_config.HISTORIAN_DIR = os.path.join(workdir, 'historian')
+        storage_config.CAPTURE_ENABLED = False
+        network_config.TRANSPORT = 'tcp'
+        network_config.PORT = args.port
+
+        self.queue = queue.Queue()
+        self.controls = ControlState(v=ui_config.WIND_SPEED_DEFAULT, p=ui_config.PITCH_ANGLE_DEFAULT)
+        self.ml = MLInferenceEngine()
+        self.rollups = RollupEngine()
+        self.checkpoint = CheckpointManager(self.rollups, self.ml, interval=args.checkpoint_interval,
+                                            history_rows=args.retention)
+        self.stream = ArrowStreamServer(port=args.stream_port, retention_rows=args.retention)
+        sinks = [self.rollups, HistorianCompressor(segment_seconds=args.segment_seconds),
+                 self.checkpoint, self.stream]
+        self.server = TCPServerManager(self.queue, self.controls, self.ml, sinks=sinks,
+                                       power_curve=PowerCurveIndex.load_default())
+        parquets = sorted(glob.glob(os.path.join(file_player_config.DATA_DIR, '*.parquet')))
+        self.parquet = parquets[0] if parquets else None
+
+    def _gateway(self) -> None:
+        client = GatewayClient(port=self.args.port, version=2, block=self.args.block)
+        try:
+            client.connect()
+            plant = PMSGPlant(1)
+            while not self.stop_event.is_set():
+                stats = client.run(plant, self.args.block * 4)
+                self.frames_sent += stats['steps']
+                if self.args.frame_sleep:
+                    time.sleep(self.args.frame_sleep)
+        except Exception as e:
+            self.errors.append(f"gateway: {e}")
+        finally:
+            client.close()
+
+    def _sessions(self) -> None:
+        rng = random.Random(self.args.seed)
+        sessions = []
+        try:
+            for _ in range(self.args.sessions):
+                sessions.append(self._open_session())
+            last_churn = time.monotonic()
+            while not self.stop_event.is_set():
+                for s in sessions:
+                    self.frames_rendered += s.rerun()
+                if self.args.churn and time.monotonic() - last_churn >= self.args.churn:
+                    last_churn = time.monotonic()
+                    if sessions:
+                        sessions.pop(rng.randrange(len(sessions))).close()
+                        sessions.append(self._open_session())
+                    rng.choice(sessions).press(rng)
+                time.sleep(self.args.rerun_interval)
+        except Exception as e:
+            self.errors.append(f"sesiones: {e}")
+        finally:
+            for s in sessions:
+                s.close()
+
+    def _open_session(self) -> UISession:
+        self.sessions_opened += 1
+        return UISession(self.queue, self.controls, self.parquet, self.args.play_interval)
+
+    def start(self) -> None:
+        self.server.start()
+        self.stream.start()
+        self.checkpoint.start()
+        for target in (self._gateway, self._sessions):
+            threading.Thread(target=target, name=f"soak{target.__name__}", daemon=True).start()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        time.sleep(max(self.args.rerun_interval, 0.2) * 2)
+        self.server.stop()
+        self.stream.stop()
+        self.checkpoint.stop()
+
+    def sample(self, t: float) -> dict:
+        csvs = glob.glob(os.path.join(storage_config.LOG_DIR, '*.csv'))
+        return {
+            't': t,
+            'traced_kib': tracemalloc.get_traced_memory()[0] / 1024,
+            'rss_kib': _rss_kib(),
+            'threads': threading.active_count(),
+            'fds': _fd_count(),
+            'queue': self.queue.qsize(),
+            'frames_sent': self.frames_sent,
+            'frames_rendered': self.frames_rendered,
+            'csv_files': len(csvs),
+            'csv_mib': sum(os.path.getsize(p) for p in csvs) / 2**20,
+        }
+
+
+def _top_growth(snapshot, baseline, top: int) -> list:
+    diff = snapshot.compare_to(baseline, 'lineno')
+    return [{'site': f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+             'size_diff_kib': s.size_diff / 1024, 'size_kib': s.size / 1024,
+             'count_diff': s.count_diff}
+            for s in diff[:top] if s.size_diff > 0]
+
+
+def _filtered_snapshot():
+    return tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, pattern) for pattern in _IGNORE])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Soak del servidor con detección de fugas")
+    parser.add_argument('--duration', type=float, default=3600.0, help="s de reloj")
+    parser.add_argument('--warmup', type=float, default=60.0,
+                        help="s iniciales excluidos de las pendientes (caches, buffers llenándose)")
+    parser.add_argument('--sample', type=float, default=5.0, help="s entre muestras")
+    parser.add_argument('--snapshot', type=float, default=120.0,
+                        help="s entre snapshots de tracemalloc")
+    parser.add_argument('--top', type=int, default=10, help="Sitios de asignación por snapshot")
+    parser.add_argument('--frames', type=int, default=1,
+                        help="Frames de traceback por asignación (más frames, más lento)")
+    parser.add_argument('--sessions', type=int, default=2)
+    parser.add_argument('--churn', type=float, default=10.0,
+                        help="s entre cerrar/abrir una sesión (0 = sin rotación)")
+    parser.add_argument('--rerun-interval', type=float, default=0.1)
+    parser.add_argument('--play-interval', type=float, default=0.01,
+                        help="s simulados entre filas del reproductor")
+    parser.add_argument('--block', type=int, default=50, help="Pasos por mensaje v2")
+    parser.add_argument('--frame-sleep', type=float, default=0.0,
+                        help="s de espera entre lotes de la planta (0 = lo más rápido posible)")
+    parser.add_argument('--retention', type=int, default=2000,
+                        help="Frames retenidos por checkpoint y stream Arrow: buffers acotados "
+                             "más chicos que en producción para que se llenen durante el calentamiento")
+    parser.add_argument('--segment-seconds', type=float, default=60.0)
+    parser.add_argument('--checkpoint-interval', type=float, default=10.0)
+    parser.add_argument('--port', type=int, default=network_config.PORT + 100)
+    parser.add_argument('--stream-port', type=int, default=network_config.STREAM_PORT + 100)
+    parser.add_argument('--seed', type=int, default=0)
+    for name, default in SERIES.items():
+        parser.add_argument(f"--max-{name.replace('_kib', '').replace('_', '-')}-slope",
+                            dest=f"max_{name}", type=float, default=default,
+                            help=f"Límite de pendiente de {name} por hora")
+    parser.add_argument('--json', help="Guardar el reporte en un archivo JSON")
+    parser.add_argument('--keep', action='store_true', help="Conservar la carpeta de trabajo")
+    args = parser.parse_args()
+
+    warnings.filterwarnings('ignore', category=UserWarning)
+    workdir = tempfile.mkdtemp(prefix='aeolus_soak_')
+    tracemalloc.start(args.frames)
+    run = SoakRun(args, workdir)
+    run.start()
+
+    samples, sites = [], []
+    baseline = None
+    t0 = time.monotonic()
+    next_snapshot = t0 + args.warmup
+    try:
+        while (t := time.monotonic() - t0) < args.duration and not run.errors:
+            time.sleep(args.sample)
+            gc.collect()
+            s = run.sample(time.monotonic() - t0)
+            samples.append(s)
+            print(f"{s['t']:7.0f} s | traced {s['traced_kib']:9.0f} KiB | RSS {s['rss_kib']:9.0f} KiB | "
+                  f"hilos {s['threads']:3d} | fds {s['fds']:4d} | cola {s['queue']:6d} | "
+                  f"frames {s['frames_sent']:9d} | CSV {s['csv_files']:4d}")
+            if time.monotonic() >= next_snapshot:
+                next_snapshot += args.snapshot
+                snapshot = _filtered_snapshot()
+                if baseline is None:
+                    baseline = snapshot
+                else:
+                    sites.append({'t': s['t'], 'top': _top_growth(snapshot, baseline, args.top)})
+    except KeyboardInterrupt:
+        pass
+    finally:
+        run.stop()
+        tracemalloc.stop()
+
+    steady = [s for s in samples if s['t'] >= args.warmup]
+    t = np.array([s['t'] for s in steady])
+    slopes, growth, failures = {}, {}, []
+    for name in SERIES:
+        y = np.array([s[name] for s in steady], dtype=float)
+        slopes[name], growth[name] = slope_per_hour(t, y), net_growth(y)
+        limit = getattr(args, f"max_{name}")
+        # Hilos y descriptores oscilan (reproductores que terminan): exigir crecimiento neto
+        if slopes[name] > limit and growth[name] > 0:
+            failures.append(f"{name}: {slopes[name]:+.1f}/h > {limit:g}/h "
+                            f"(crecimiento neto {growth[name]:+.1f})")
+    failures += run.errors
+    elapsed = samples[-1]['t'] if samples else 0.0
+
+    print(f"\n{run.frames_sent} frames en {elapsed:.0f} s "
+          f"({run.frames_sent / max(elapsed, 1e-9):.0f} frames/s), "
+          f"{run.sessions_opened} sesiones abiertas")
+    print("Pendientes (por hora, después del calentamiento): "
+          + ", ".join(f"{k} {v:+.1f}" for k, v in slopes.items()))
+    if sites:
+        print(f"\nSitios con más crecimiento desde t={args.warmup:.0f} s (último snapshot):")
+        for site in sites[-1]['top']:
+            print(f"  {site['size_diff_kib']:+9.1f} KiB {site['count_diff']:+7d}  {site['site']}")
+
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or '.', exist_ok=True)
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'frames_sent': run.frames_sent,
+                       'sessions_opened': run.sessions_opened, 'slopes_per_hour': slopes,
+                       'net_growth': growth,
+                       'failures': failures, 'samples': samples, 'top_sites': sites},
+                      f, indent=2)
+
+    if args.keep:
+        print(f"Carpeta de trabajo: {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if failures:
+        print("\nFALLA:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\nSin crecimiento por encima de los límites.")
+
+
+if __name__ == "__main__":
+    main()
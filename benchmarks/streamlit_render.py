@@ -0,0 +1,367 @@
+"""Costo del camino de render del dashboard por tamaño de historial y sesiones.
+
+Ejecuta `app.py` completo sin navegador (`AppTest.from_file`): configuración
+de página, CSS, encabezado, barra lateral, drenado de la cola y CSV,
+`TelemetryBuffer.to_frame`, métricas y gráficas de la vista elegida. Los
+recursos globales se crean sin efectos fuera del proceso (`_app_patches`: el
+servidor TCP no abre el puerto; stream Arrow, historiador y checkpoint
+apagados). `st.rerun` y las esperas de `app.main` se anulan en el hilo del
+script. El estado de sesión se precarga con historial lleno, agregados y una
+cola propia por sesión, que el benchmark alimenta entre pasadas con telemetría
+sintética al ritmo pedido, como hace el servidor TCP. Por cada combinación de
+historial × sesiones × vista mide:
+
+- por pasada: tiempo de pared y CPU (p50/p95) y bytes de payload totales;
+- por componente (`COMPONENTS`): tiempo, memoria asignada (pico de
+  tracemalloc, en una pasada aparte para no inflar los tiempos) y bytes de
+  payload que viajan al navegador (tamaño de los protobuf de sus elementos,
+  datos Arrow de las gráficas incluidos).
+
+Las sesiones se ejecutan una tras otra en el mismo proceso: el costo de N
+espectadores por ciclo es la suma, como en el servidor de Streamlit que
+corre un hilo de script por sesión bajo el mismo GIL.
+
+    python3 -m benchmarks.streamlit_render
+    python3 -m benchmarks.streamlit_render --history 500 5000 50000 --sessions 1 4 --json resultados/render.json
+    python3 -m benchmarks.streamlit_render --baseline resultados/render.json --tolerance 0.25
+
+Corrida de referencia (Streamlit 1.66, Python 3.11, 1 CPU, 20 frames/s,
+pasada cada 0.5 s, 10 pasadas por sesión; p50 por pasada y % del ciclo de
+todas las sesiones):
+
+    vista        historial  1 sesión          4 sesiones        charts (payload)   to_frame
+    tiempo real        500  362 ms  ( 85 %)   469 ms  (442 %)   272 ms (58 KiB)      3 ms
+    tiempo real       5000  415 ms  ( 96 %)   419 ms  (392 %)   292 ms (480 KiB)    30 ms
+    tiempo real      50000  611 ms  (135 %)   667 ms  (596 %)   297 ms (4.6 MiB)   238 ms
+    1 s                500  395 ms  ( 90 %)   431 ms  (396 %)   303 ms (1.2 MiB)     3 ms
+    1 s              50000  714 ms  (156 %)   787 ms  (648 %)   332 ms (1.2 MiB)   287 ms
+    1 min              500  338 ms  ( 78 %)   385 ms  (359 %)   262 ms (36 KiB)      3 ms
+    1 min            50000  634 ms  (137 %)   726 ms  (677 %)   311 ms (36 KiB)    230 ms
+
+Las gráficas dominan la pasada y las métricas suman ~55-90 ms. La barra
+lateral, el drenado de la cola con el CSV y el resto de `app.main` quedan
+en ~3 ms cada uno. Con historial de 50 000 filas `to_frame` suma ~250 ms y
+una sola sesión ya no entra en el ciclo de 0.5 s.
+"""
+import argparse
+import contextlib
+import gc
+import json
+import logging
+import os
+import queue
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from core.telemetry import TELEMETRY_DTYPE, StatusCode, TelemetryBuffer
+from storage.rollups import RollupEngine
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+COMPONENTS = ('sidebar', 'ingest', 'to_frame', 'metrics', 'charts')
+# Vista -> opción del selector de resolución (ui.charts.RESOLUTION_OPTIONS)
+VIEWS = {'tiempo real': 'Tiempo real', '1 s': '1 s', '1 min': '1 min'}
+
+
+def _measured(name: str, fn, container: bool = True):
+    # Envoltura de una función que llama app.py: tiempo y memoria asignada en
+    # session_state.bench_timings; con `container` sus elementos quedan en un
+    # bloque con clave para medir su payload
+    import streamlit as st
+
+    def wrapper(*args, **kwargs):
+        timings = st.session_state.setdefault('bench_timings', {})
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        t0 = time.perf_counter()
+        if container:
+            with st.container(key=f"bench_{name}"):
+                out = fn(*args, **kwargs)
+        else:
+            out = fn(*args, **kwargs)
+        t = timings.setdefault(name, {'wall': 0.0, 'alloc': 0})
+        t['wall'] += time.perf_counter() - t0
+        if tracing:
+            t['alloc'] = max(t['alloc'], tracemalloc.get_traced_memory()[1] - base)
+        return out
+    return wrapper
+
+
+@contextlib.contextmanager
+def _app_patches():
+    """Entorno para ejecutar app.py sin red ni esperas.
+
+    - recursos globales sin efectos fuera del proceso: el servidor TCP no abre
+      el puerto, sin stream Arrow, historiador ni checkpoint;
+    - `st.rerun` y `time.sleep` no hacen nada en el hilo del script (AppTest
+      repetiría la pasada sin fin y las esperas de `app.main` no son render);
+      AppTest sigue esperando en el hilo principal;
+    - componentes medidos con `_measured`.
+    """
+    import streamlit as st
+
+    import ui
+    from config import network_config, storage_config
+    from core import TCPServerManager
+    from utils import DataProcessor
+
+    real_sleep = time.sleep
+
+    def sleep(seconds):
+        if threading.current_thread() is threading.main_thread():
+            real_sleep(seconds)
+
+    patches = [
+        (network_config, 'STREAM_ENABLED', False),
+        (storage_config, 'HISTORIAN_ENABLED', False),
+        (storage_config, 'CHECKPOINT_ENABLED', False),
+        (TCPServerManager, 'start', lambda self: None),
+        (st, 'rerun', lambda *args, **kwargs: None),
+        (time, 'sleep', sleep),
+        # process_data_updates: drenar la cola y escribir el CSV suman en 'ingest'
+        (DataProcessor, 'process_queue',
+         staticmethod(_measured('ingest', DataProcessor.process_queue, container=False))),
+        (DataProcessor, 'save_to_csv',
+         staticmethod(_measured('ingest', DataProcessor.save_to_csv, container=False))),
+        (TelemetryBuffer, 'to_frame', _measured('to_frame', TelemetryBuffer.to_frame, container=False)),
+        (ui, 'render_sidebar', _measured('sidebar', ui.render_sidebar)),
+        (ui, 'render_metrics_panel', _measured('metrics', ui.render_metrics_panel)),
+        (ui, 'render_charts', _measured('charts', ui.render_charts)),
+        (ui, 'render_rollup_charts', _measured('charts', ui.render_rollup_charts)),
+    ]
+    saved = [(obj, attr, obj.__dict__[attr] if isinstance(obj, type) else getattr(obj, attr))
+             for obj, attr, _ in patches]
+    try:
+        for obj, attr, value in patches:
+            setattr(obj, attr, value)
+        yield
+    finally:
+        for obj, attr, value in saved:
+            setattr(obj, attr, value)
+
+
+def synthetic_block(n: int, t0_ns: int, rate: float, rng: np.random.Generator) -> np.ndarray:
+    """n frames de telemetría plausibles a `rate` frames/s desde t0_ns."""
+    block = np.zeros(n, dtype=TELEMETRY_DTYPE)
+    block['t_ns'] = t0_ns + (np.arange(n) * (1e9 / rate)).astype(np.int64)
+    block['v'] = 10.0 + rng.normal(0, 0.5, n)
+    block['p'] = 2.0
+    block['wm'] = 1.8 + rng.normal(0, 0.02, n)
+    block['P'] = 1500.0 + rng.normal(0, 30.0, n)
+    block['V'] = 0.69 + rng.normal(0, 0.002, n)
+    block['S'] = 1550.0 + rng.normal(0, 30.0, n)
+    block['score'] = 0.08 + rng.normal(0, 0.03, n)
+    block['status'] = np.where(block['score'] < 0, StatusCode.ANOMALY, StatusCode.NORMAL)
+    block['phys_status'] = StatusCode.NORMAL
+    block['attr_v'] = block['attr_wm'] = block['attr_P'] = block['attr_rho'] = 0.25
+    return block
+
+
+def _payload(node) -> int:
+    # Bytes de los protobuf de un nodo del árbol de AppTest y sus descendientes
+    proto = getattr(node, 'proto', None)
+    size = proto.ByteSize() if proto is not None else 0
+    for child in getattr(node, 'children', {}).values():
+        size += _payload(child)
+    return size
+
+
+def _find_block(node, key: str):
+    # Bloque de `st.container(key=key)` dentro del árbol de AppTest
+    proto = getattr(node, 'proto', None)
+    if proto is not None and getattr(proto, 'id', '').endswith(f"-{key}"):
+        return node
+    for child in getattr(node, 'children', {}).values():
+        found = _find_block(child, key)
+        if found is not None:
+            return found
+    return None
+
+
+def run_case(history_size: int, sessions: int, view: str, rate: float, interval: float,
+             ticks: int, workdir: str, seed: int = 0) -> dict:
+    """Una combinación: `ticks` ciclos de alimentar datos + una pasada de app.py por sesión."""
+    from streamlit.testing.v1 import AppTest
+
+    from ui.charts import RESOLUTION_OPTIONS
+
+    rng = np.random.default_rng(seed)
+    per_tick = max(1, int(rate * interval))
+    resolution = RESOLUTION_OPTIONS[VIEWS[view]]
+
+    # Historial lleno desde el inicio (y una hora de agregados), como tras un arranque en caliente
+    rollups = RollupEngine(path=os.devnull, save_interval=0)
+    n_warm = max(history_size, int(3600 * rate) if resolution else 0)
+    warm = synthetic_block(n_warm, time.time_ns() - int(n_warm / rate * 1e9), rate, rng)
+    rollups.push(warm)
+    t_ns = int(warm['t_ns'][-1]) + int(1e9 / rate)
+
+    # Estado de sesión precargado: initialize_session_state respeta lo que ya existe.
+    # Cada sesión tiene su cola para que todas dibujen datos nuevos en cada pasada
+    apps, queues = [], []
+    for i in range(sessions):
+        history = TelemetryBuffer(history_size)
+        history.extend(warm)
+        csv_filepath = os.path.join(workdir, f"sesion_{i}.csv")
+        open(csv_filepath, 'w').close()
+        at = AppTest.from_file(APP_PATH, default_timeout=60)
+        at.session_state['history'] = history
+        at.session_state['rollups'] = rollups
+        at.session_state['data_queue'] = queue.Queue()
+        at.session_state['csv_filepath'] = csv_filepath
+        at.session_state['chart_resolution'] = VIEWS[view]
+        apps.append(at)
+        queues.append(at.session_state['data_queue'])
+
+    walls, cpus, tick_walls = [], [], []
+    components = {name: [] for name in COMPONENTS}
+    for tick in range(ticks + 1):
+        block = synthetic_block(per_tick, t_ns, rate, rng)
+        t_ns += per_tick * int(1e9 / rate)
+        rollups.push(block)
+        for q in queues:
+            q.put(block)
+
+        t_tick = time.perf_counter()
+        for at in apps:
+            at.session_state['bench_timings'] = {}
+            gc.collect()
+            c0, t0 = time.process_time(), time.perf_counter()
+            at.run()
+            wall, cpu = time.perf_counter() - t0, time.process_time() - c0
+            if at.exception:
+                raise RuntimeError(f"Error en app.py: {at.exception[0].message}")
+            if tick == 0:
+                continue  # Primera pasada: imports, recursos globales y caches de Streamlit
+            walls.append(wall)
+            cpus.append(cpu)
+            timings = at.session_state['bench_timings']
+            for name in COMPONENTS:
+                components[name].append(timings.get(name, {'wall': 0.0})['wall'])
+        if tick > 0:
+            tick_walls.append(time.perf_counter() - t_tick)
+
+    # Payload: barra lateral completa y un bloque con clave por componente del área principal
+    payload = {'sidebar': _payload(apps[0].sidebar)}
+    for name in ('metrics', 'charts'):
+        payload[name] = _payload(_find_block(apps[0].main, f"bench_{name}"))
+    rerun_payload = _payload(apps[0].main) + payload['sidebar']
+
+    # Asignaciones en una pasada aparte (tracemalloc multiplica los tiempos)
+    tracemalloc.start()
+    try:
+        apps[0].session_state['bench_timings'] = {}
+        apps[0].run()
+        alloc = {name: t.get('alloc', 0) for name, t in apps[0].session_state['bench_timings'].items()}
+        run_peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    ms = lambda values, q: float(np.percentile(values, q) * 1e3)
+    return {
+        'history': history_size,
+        'sessions': sessions,
+        'view': view,
+        'rate_hz': rate,
+        'rerun_wall_ms_p50': ms(walls, 50),
+        'rerun_wall_ms_p95': ms(walls, 95),
+        'rerun_cpu_ms_p50': ms(cpus, 50),
+        'tick_wall_ms_p50': ms(tick_walls, 50),
+        'tick_budget_fraction': float(np.median(tick_walls) / interval),
+        'rerun_alloc_peak_kib': run_peak / 1024,
+        'rerun_payload_kib': rerun_payload / 1024,
+        'components': {
+            name: {'wall_ms_p50': ms(components[name], 50),
+                   'alloc_kib': alloc.get(name, 0) / 1024,
+                   'payload_kib': payload.get(name, 0) / 1024}
+            for name in COMPONENTS
+        },
+    }
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """Combinaciones cuyo p50 por pasada empeoró más de `tolerance` frente a la línea base."""
+    key = lambda r: (r['history'], r['sessions'], r['view'])
+    base = {key(r): r for r in baseline}
+    regressions = []
+    for r in results:
+        b = base.get(key(r))
+        if b and r['rerun_wall_ms_p50'] > b['rerun_wall_ms_p50'] * (1 + tolerance):
+            regressions.append({'case': key(r), 'baseline_ms': b['rerun_wall_ms_p50'],
+                                'current_ms': r['rerun_wall_ms_p50']})
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Costo del render del dashboard (AppTest)")
+    parser.add_argument('--history', type=int, nargs='+', default=[500, 2000, 10000, 50000],
+                        help="Tamaños de historial (MAX_HISTORY_SIZE)")
+    parser.add_argument('--sessions', type=int, nargs='+', default=[1, 4, 16],
+                        help="Sesiones (espectadores) abiertas")
+    parser.add_argument('--views', nargs='+', choices=list(VIEWS), default=list(VIEWS))
+    parser.add_argument('--rate', type=float, default=20.0, help="Frames/s de telemetría")
+    parser.add_argument('--interval', type=float, default=0.5,
+                        help="s entre pasadas (app.main duerme 0.1-0.5 s)")
+    parser.add_argument('--ticks', type=int, default=20, help="Pasadas medidas por sesión")
+    parser.add_argument('--json', help="Guardar resultados en un archivo JSON")
+    parser.add_argument('--baseline', help="JSON de una corrida anterior para comparar")
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help="Empeoramiento relativo tolerado frente a --baseline")
+    args = parser.parse_args()
+    try:
+        import streamlit.testing.v1  # noqa: F401
+    except ImportError:
+        raise SystemExit("streamlit_render necesita Streamlit con streamlit.testing "
+                         "(pip install -r requirements.txt)")
+    # Las llamadas de AppTest fuera del hilo del script y los avisos de
+    # deprecación de la barra lateral se repiten en cada pasada.
+    # Filtro y no nivel: Streamlit reajusta el nivel de sus loggers
+    logging.getLogger('streamlit.runtime.scriptrunner_utils.script_run_context').addFilter(
+        lambda record: 'missing ScriptRunContext' not in record.getMessage())
+    logging.getLogger('streamlit.deprecation_util').addFilter(
+        lambda record: 'use_container_width' not in record.getMessage())
+
+    results = []
+    with _app_patches(), tempfile.TemporaryDirectory() as workdir:
+        for view in args.views:
+            for history_size in args.history:
+                for sessions in args.sessions:
+                    r = run_case(history_size, sessions, view, args.rate,
+                                 args.interval, args.ticks, workdir)
+                    results.append(r)
+                    c = r['components']
+                    print(f"{view:>11} | historial {history_size:>6} | sesiones {sessions:>3} | "
+                          f"pasada {r['rerun_wall_ms_p50']:7.1f} ms (p95 {r['rerun_wall_ms_p95']:7.1f}) | "
+                          f"ciclo {r['tick_budget_fraction'] * 100:5.1f} % | "
+                          + " ".join(f"{n} {c[n]['wall_ms_p50']:.1f} ms/{c[n]['payload_kib']:.0f} KiB"
+                                     for n in COMPONENTS))
+
+    df = pd.json_normalize(results)
+    pd.set_option('display.width', 200)
+    print()
+    print(df.drop(columns=['rate_hz']).to_string(index=False, float_format=lambda v: f"{v:.1f}"))
+
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or '.', exist_ok=True)
+        with open(args.json, 'w') as f:
+            json.dump({'rate_hz': args.rate, 'interval_s': args.interval, 'ticks': args.ticks,
+                       'results': results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f)['results'], args.tolerance)
+        for reg in regressions:
+            print(f"REGRESIÓN {reg['case']}: {reg['baseline_ms']:.1f} -> {reg['current_ms']:.1f} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Latencia de ida y vuelta por transporte del gateway (tcp / unix / shm).
+
+Levanta en un proceso aparte un servidor eco que usa los mismos listeners y
+conexiones que TCPServerManager (core/transports.py) y mide el RTT de un
+frame lock-step '<4d' -> '<2d', sin inferencia ML de por medio.
+
+    python3 -m benchmarks.transport_rtt --steps 20000
+    python3 -m benchmarks.transport_rtt --transports shm --json resultados/rtt.json
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import struct
+import time
+
+import numpy as np
+
+from config.settings import network_config
+from core import transports
+
+
+def _echo_server(transport: str, port: int, ready) -> None:
+    # Responde un '<2d' por cada '<4d' recibido, como el camino v1
+    network_config.PORT = port
+    sz_in = struct.calcsize(network_config.FORMAT_IN)
+    reply = struct.pack(network_config.FORMAT_OUT, 8.0, 0.0)
+    with transports.create_listener(transport) as listener:
+        ready.set()
+        conn, _ = listener.accept()
+        transports.prepare_connection(conn, transport)
+        buf = bytearray(sz_in * 64)
+        view = memoryview(buf)
+        filled = 0
+        with conn:
+            while True:
+                n = conn.recv_into(view[filled:])
+                if n == 0:
+                    break
+                filled += n
+                n_frames = filled // sz_in
+                if n_frames:
+                    conn.sendall(reply * n_frames)
+                    rest = filled - n_frames * sz_in
+                    buf[:rest] = buf[n_frames * sz_in:filled]
+                    filled = rest
+
+
+def measure(transport: str, steps: int, port: int = 30199) -> dict:
+    """RTT por paso (µs) de un transporte."""
+    ready = mp.Event()
+    server = mp.Process(target=_echo_server, args=(transport, port, ready), daemon=True)
+    server.start()
+    ready.wait(10)
+
+    frame = struct.pack(network_config.FORMAT_IN, 1.5, 1e6, 690.0, 1.1e6)
+    sz_out = struct.calcsize(network_config.FORMAT_OUT)
+    reply = bytearray(sz_out)
+    rtt = np.empty(steps)
+
+    conn = transports.connect(transport, port=port)
+    try:
+        for k in range(steps):
+            t0 = time.perf_counter_ns()
+            conn.sendall(frame)
+            got = 0
+            while got < sz_out:
+                n = conn.recv_into(memoryview(reply)[got:])
+                if n == 0:
+                    raise ConnectionError("Servidor eco cerró la conexión")
+                got += n
+            rtt[k] = time.perf_counter_ns() - t0
+    finally:
+        conn.close()
+        server.join(5)
+
+    rtt = rtt[steps // 10:] / 1000.0  # Descarta el calentamiento
+    return {
+        'transport': transport,
+        'steps': steps,
+        'rtt_mean_us': float(rtt.mean()),
+        'rtt_p50_us': float(np.percentile(rtt, 50)),
+        'rtt_p99_us': float(np.percentile(rtt, 99)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="RTT lock-step por transporte del gateway")
+    parser.add_argument('--transports', nargs='+', choices=transports.TRANSPORTS,
+                        default=list(transports.TRANSPORTS))
+    parser.add_argument('--steps', type=int, default=20000)
+    parser.add_argument('--json', help="Guardar resultados en un archivo JSON")
+    args = parser.parse_args()
+
+    results = []
+    for transport in args.transports:
+        r = measure(transport, args.steps)
+        results.append(r)
+        print(f"{transport:5s} | medio {r['rtt_mean_us']:7.1f} us | "
+              f"p50 {r['rtt_p50_us']:7.1f} us | p99 {r['rtt_p99_us']:7.1f} us")
+
+    if args.json:
+        os.makedirs(os.path.dirname(args.json) or '.', exist_ok=True)
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,31 @@
 from .settings import (
     network_config,
     ml_config,
+    power_curve_config,
+    router_config,
+    calibration_config,
     ui_config,
     physics_config,
-    file_player_config
+    plant_config,
+    control_config,
+    file_player_config,
+    storage_config,
+    pipeline_config,
+    profiler_config
 )
 
 __all__ = [
     'network_config',
     'ml_config',
+    'power_curve_config',
+    'router_config',
+    'calibration_config',
     'ui_config',
     'physics_config',
-    'file_player_config'
+    'plant_config',
+    'control_config',
+    'file_player_config',
+    'storage_config',
+    'pipeline_config',
+    'profiler_config'
 ]
@@ -1,5 +1,5 @@
-from dataclasses import dataclass
-from typing import Tuple
+from dataclasses import dataclass, field
+from typing import Dict, Tuple
 
 
 @dataclass
@@ -10,6 +10,25 @@ class NetworkConfig:
     TIMEOUT: float = 2.0
     FORMAT_IN: str = '<4d'  # wm, P, V, S
     FORMAT_OUT: str = '<2d'  # Viento, Pitch
+    RECV_BATCH_FRAMES: int = 256  # Frames máximos decodificados por lectura
+    MAX_BLOCK_STEPS: int = 1024  # Pasos máximos por mensaje del protocolo v2
+    
+    # Transporte: 'tcp' (S-Function), 'unix' o 'shm' (simulador en el mismo host)
+    TRANSPORT: str = 'tcp'
+    TCP_NODELAY: bool = True  # Desactiva Nagle en las respuestas lock-step
+    UNIX_PATH: str = '/tmp/aeolus_gateway.sock'
+    SHM_NAME: str = 'aeolus_gateway'  # Prefijo del segmento por conexión
+    SHM_RING_BYTES: int = 1 << 20  # Capacidad de cada anillo
+    SHM_SPIN: int = 20000  # Iteraciones de sondeo antes de bloquear en eventfd
+    SHM_POLL_INTERVAL: float = 50e-6  # Espera entre sondeos sin eventfd (s)
+
+    # Stream Arrow IPC para clientes externos (TCP o WebSocket, core/arrow_stream.py)
+    STREAM_ENABLED: bool = True
+    STREAM_HOST: str = '127.0.0.1'  # Solo local
+    STREAM_PORT: int = 30002
+    STREAM_BATCH_INTERVAL: float = 0.2  # s entre lotes enviados
+    STREAM_RETENTION_ROWS: int = 36_000  # Frames retenidos para reanudar por seq
+    STREAM_MAX_PENDING: int = 256  # Lotes en cola por suscriptor antes de desconectarlo
 
 
 @dataclass
@@ -18,7 +37,67 @@ class MLConfig:
     MODEL_DIR: str = 'modelos_exportados'
     SCALER_FILE: str = 'scaler_turbina_v1.pkl'
     MODEL_FILE: str = 'iso_forest_turbina_v1.pkl'
+    ARTIFACT_DIR: str = 'turbina_v1'     # Artefacto .npy mapeable (core/model_artifact.py)
+    ARTIFACT_VERIFY: bool = True         # sha256 de arreglos y .pkl de origen al cargar
     AIR_DENSITY: float = 1.03  # kg/m³
+    
+    # Evaluación del Isolation Forest: 'flat' (core/forest.py) o 'sklearn'
+    FOREST_BACKEND: str = 'flat'
+    EARLY_EXIT: bool = True               # Salida anticipada por bloques de árboles
+    EARLY_EXIT_CONFIDENCE: float = 0.999  # Prob. de decidir el mismo lado que el bosque completo
+    EARLY_EXIT_CHUNK: int = 10            # Árboles por bloque
+    EARLY_EXIT_MIN_TREES: int = 20        # Árboles mínimos antes de salir
+    EARLY_EXIT_MIN_BATCH: int = 32        # Lotes menores se evalúan completos (más barato)
+    EARLY_EXIT_EXACT_BAND: float = 0.02   # |score| menor a esto siempre se evalúa completo
+    FLAT_MAX_BATCH: int = 4096            # Lotes mayores usan sklearn si está cargado
+    ATTRIBUTION: bool = True              # Atribución por feature en el mismo recorrido del score
+
+
+@dataclass
+class CalibrationConfig:
+    # Calibración en línea del umbral de score (core/calibration.py)
+    ENABLED: bool = True            # Estimar cuantiles y deriva del score
+    APPLY: bool = False             # Decidir ANOMALÍA con el umbral calibrado por régimen
+    QUANTILE: float = 0.04          # = contamination del entrenamiento
+    BIN_WIDTH: float = 2.0          # m/s por régimen de viento
+    BINS: int = 8                   # El último régimen es abierto (>= 14 m/s)
+    MIN_SAMPLES: int = 500          # Muestras antes de sustituir el umbral 0
+    MAX_SHIFT: float = 0.05         # |umbral calibrado| máximo
+    MAX_UPDATES_PER_BATCH: int = 256  # Muestreo con paso fijo en lotes grandes
+    FREEZE_WINDOW: int = 50         # Muestras de la media móvil de la tasa de anomalías
+    FREEZE_RATE: float = 0.15       # Tasa reciente sobre la cual se congelan los cuantiles
+    DRIFT_DELTA: float = 0.01       # Page-Hinkley: tolerancia de la media
+    DRIFT_LAMBDA: float = 1.0       # Page-Hinkley: umbral de alarma
+    DRIFT_MIN_SAMPLES: int = 100
+    MAX_ALARMS: int = 100           # Alarmas de deriva retenidas
+
+
+@dataclass
+class RouterConfig:
+    # Enrutador por régimen viento × rpm con bosques pequeños (core/regime_router.py)
+    ENABLED: bool = False           # Puntuar con el bosque del régimen en lugar del global
+    DIR: str = 'regimes_v1'         # En MLConfig.MODEL_DIR
+    WIND_WIDTH: float = 3.0         # m/s por franja de viento
+    WIND_BINS: int = 4              # 0-3 arranque, 3-6 y 6-9 carga parcial, >= 9 nominal
+    RPM_BINS: int = 2
+    RPM_WIDTH: float = 0.0          # 0 = percentil 95 de la rpm de entrenamiento / RPM_BINS
+    N_ESTIMATORS: int = 50          # Árboles por régimen (el global usa 100)
+    MAX_SAMPLES: int = 128          # Submuestra por árbol
+    CONTAMINATION: float = 0.04
+    MIN_SAMPLES: int = 60           # Muestras mínimas para entrenar un bosque de celda
+
+
+@dataclass
+class PowerCurveConfig:
+    # Índice de referencia viento -> potencia/rpm (core/power_curve.py)
+    ENABLED: bool = True
+    INDEX_FILE: str = 'modelos_exportados/power_curve_v1.npz'
+    BIN_WIDTH: float = 0.5                           # m/s por bin
+    QUANTILES: Tuple[float, float] = (0.05, 0.95)    # Banda de referencia por bin
+    MIN_COUNT: int = 8                               # Muestras mínimas para tener referencia
+    THRESHOLD: float = 1.0                           # |residuo| en anchos de banda para ANOMALÍA
+    RPM_FLOOR: float = 0.5                           # Ancho mínimo de banda (rpm)
+    POWER_FLOOR: float = 50.0                        # Ancho mínimo de banda (kW)
 
 
 @dataclass
@@ -51,18 +130,136 @@ class PhysicsConfig:
     V_TO_KV: float = 1000.0
 
 
+@dataclass
+class PlantConfig:
+    # Parámetros del gemelo sustituto (parametros_aerogenerador.m)
+    RHO: float = 1.225            # Densidad del aire (kg/m^3)
+    R: float = 42.0               # Radio de la turbina (m)
+    C1: float = 0.5176            # Coeficientes de Cp(lambda, beta)
+    C2: float = 116.0
+    C3: float = 0.4
+    C4: float = 5.0
+    C5: float = 21.0
+    C6: float = 0.0068
+    PN: float = 2e6               # Potencia nominal (W)
+    RS: float = 0.008             # Resistencia de estator (Ohm)
+    LD: float = 0.0003            # Inductancia eje d (H)
+    LQ: float = 0.0003            # Inductancia eje q (H)
+    LAMBDA_PM: float = 3.86       # Flujo de imanes permanentes (Wb)
+    POLE_PAIRS: int = 60
+    J: float = 8000.0             # Inercia (kg.m^2)
+    BM: float = 0.00001349        # Fricción viscosa (N.m.s/rad)
+    SOLVER_DT: float = 0.002      # Paso fijo del integrador RK4 (s)
+    OMEGA_MAX: float = 6.0        # Límite de velocidad del rotor (rad/s)
+
+
+@dataclass
+class ControlConfig:
+    # Consignas de control hacia la simulación
+    SIM_STEP: float = 0.05        # s simulados por paso lock-step (20 Hz)
+    MAX_WIND_RATE: float = 0.0    # m/s por s simulado (0 = sin límite)
+    MAX_PITCH_RATE: float = 0.0   # deg por s simulado (0 = sin límite)
+
+
 @dataclass
 class FilePlayerConfig:
     # Configuración del reproductor de archivos parquet
-    DEFAULT_INTERVAL: float = 2.0   # segundos entre filas
+    DEFAULT_INTERVAL: float = 2.0   # segundos de simulación entre filas
     MIN_INTERVAL: float = 0.5
     MAX_INTERVAL: float = 10.0
     DATA_DIR: str = 'data'
 
 
+@dataclass
+class PipelineConfig:
+    # Ingesta de reportes diarios del fabricante (pipelines/ingest.py)
+    INGEST_ROOTS: Tuple[str, ...] = ('0 REPORTES DIARIOS 2024', '1 REPORTES DIARIOS 2025')
+    INGEST_MANIFEST: str = 'ingest_manifest.json'   # En la carpeta de salida (DATA_DIR)
+    INGEST_CHUNK_BYTES: int = 1 << 20               # Bloque de lectura CSV en streaming
+    POWER_LIMIT_KW: float = 5000.0                  # Filtro físico de la potencia reconstruida
+
+    # Reentrenamiento (pipelines/train.py)
+    TRAIN_RESERVOIR: int = 200_000          # Filas máximas en memoria para el ajuste
+    TRAIN_CHUNK_ROWS: int = 65_536          # Filas por chunk de lectura
+    TRAIN_INCLUDE_LOGS: bool = True         # Sumar filas NORMAL de data_logs/
+    TRAIN_N_ESTIMATORS: int = 100
+    TRAIN_CONTAMINATION: float = 0.04
+    TRAIN_N_JOBS: int = -1                  # Procesos para ajustar los árboles
+    TRAIN_VALIDATION_FRACTION: float = 0.2
+    TRAIN_SEED: int = 42
+
+    # Caché de resultados del experimento FDI (utils/result_cache.py)
+    RESULT_CACHE_DIR: str = 'resultados/cache'
+    RESULT_CACHE_KEEP: int = 8              # Claves retenidas por etapa
+
+
+@dataclass
+class StorageConfig:
+    # Configuración de persistencia de telemetría
+    LOG_DIR: str = 'data_logs'        # CSV por sesión
+    STORE_DIR: str = 'data_store'     # Almacén de series temporales
+    BLOCK_ROWS: int = 8192            # Filas por bloque del almacén
+
+    # Agregados en línea: {resolución [s]: intervalos retenidos}
+    # 1 s -> 1 h, 1 min -> 24 h, 10 min -> 30 días
+    ROLLUP_RESOLUTIONS: Dict[int, int] = field(
+        default_factory=lambda: {1: 3600, 60: 1440, 600: 4320}
+    )
+    ROLLUP_FILE: str = 'rollups.npz'  # Persistido junto a los logs
+    ROLLUP_SAVE_INTERVAL: float = 60.0  # segundos
+
+    # Historiador comprimido: {señal: (método, tolerancia)} en unidades del registro
+    HISTORIAN_ENABLED: bool = True
+    HISTORIAN_DIR: str = 'data_store/historian'
+    HISTORIAN_TOLERANCES: Dict[str, Tuple[str, float]] = field(
+        default_factory=lambda: {
+            'v': ('deadband', 0.0),           # Consignas: solo cambios
+            'p': ('deadband', 0.0),
+            'wm': ('swinging_door', 0.005),   # rad/s
+            'P': ('swinging_door', 5.0),      # kW
+            'V': ('swinging_door', 0.002),    # kV
+            'S': ('swinging_door', 5.0),      # kVA
+            'score': ('swinging_door', 0.005),
+            'status': ('deadband', 0.0),
+            'phys': ('swinging_door', 0.05),  # Residuo físico (anchos de banda)
+            'phys_status': ('deadband', 0.0),
+        }
+    )
+    HISTORIAN_MAX_GAP: float = 300.0          # s máximos sin guardar un punto
+    HISTORIAN_SEGMENT_SECONDS: float = 600.0  # s entre segmentos en disco
+
+    # Captura binaria del tráfico del gateway (una por conexión)
+    CAPTURE_ENABLED: bool = False
+    CAPTURE_DIR: str = 'captures'
+    CAPTURE_PREALLOC: int = 64 * 1024 * 1024  # bytes preasignados por archivo
+
+    # Checkpoint de arranque en caliente: historial, agregados y calibración
+    CHECKPOINT_ENABLED: bool = True
+    CHECKPOINT_FILE: str = 'checkpoint.bin'   # Junto a los logs
+    CHECKPOINT_INTERVAL: float = 30.0         # s entre instantáneas
+    CHECKPOINT_HISTORY_ROWS: int = 36_000     # Frames crudos retenidos (~1 h a 10 Hz)
+
+
+@dataclass
+class ProfilerConfig:
+    # Perfilador de muestreo y trazas del camino caliente (core/profiler.py)
+    INTERVAL: float = 0.01          # s entre muestras de pilas (100 Hz)
+    MAX_DEPTH: int = 64             # Marcos por pila
+    SPAN_BUFFER: int = 100_000      # Spans retenidos (los más viejos se descartan)
+    OUT_DIR: str = 'resultados/profiles'
+
+
 # Instancias globales de configuración
 network_config = NetworkConfig()
 ml_config = MLConfig()
+power_curve_config = PowerCurveConfig()
+router_config = RouterConfig()
+calibration_config = CalibrationConfig()
 ui_config = UIConfig()
 physics_config = PhysicsConfig()
+plant_config = PlantConfig()
+control_config = ControlConfig()
 file_player_config = FilePlayerConfig()
+storage_config = StorageConfig()
+profiler_config = ProfilerConfig()
+pipeline_config = PipelineConfig()
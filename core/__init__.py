@@ -2,5 +2,15 @@
 from .ml_inference import MLInferenceEngine
 from .tcp_server import TCPServerManager
 from .file_player import FilePlayerManager
+from .telemetry import StatusCode, TelemetryRecord, TelemetryBuffer
+from .control_state import ControlState
 
-__all__ = ['MLInferenceEngine', 'TCPServerManager', 'FilePlayerManager']
+__all__ = [
+    'MLInferenceEngine',
+    'TCPServerManager',
+    'FilePlayerManager',
+    'StatusCode',
+    'TelemetryRecord',
+    'TelemetryBuffer',
+    'ControlState'
+]
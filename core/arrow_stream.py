@@ -0,0 +1,454 @@
+"""Flujo de telemetría en vivo como Arrow IPC para clientes externos.
+
+Endpoint local (historiador, dashboards externos, notebooks) que sirve el
+flujo de telemetría como record batches de Arrow en formato IPC stream,
+sobre TCP plano o WebSocket en el mismo puerto.
+
+Se registra como sink de TCPServerManager. Los frames recibidos se numeran
+con una secuencia global y cada STREAM_BATCH_INTERVAL segundos se arma un
+lote. El lote se codifica una sola vez por combinación (columnas,
+decimación) pedida, y se reparten los mismos bytes a todos los suscriptores
+con esa combinación: N suscriptores cuestan N envíos, no N codificaciones.
+Los últimos STREAM_RETENTION_ROWS frames se retienen para reanudar desde un
+número de secuencia.
+
+Suscripción por TCP: una línea JSON y luego el stream IPC
+
+    {"from_seq": 1200, "columns": ["wm", "P", "score"], "decimate": 10}
+    <- {"ok": true, "next_seq": 5400, "columns": ["seq", "t_ns", "wm", "P", "score"]}
+    <- esquema, lotes..., fin de stream al cerrar
+
+Por WebSocket: GET /?from=1200&columns=wm,P,score&decimate=10. Cada mensaje
+binario es un mensaje IPC (el primero, el esquema). El servidor responde los
+ping con pong y un frame de cierre del cliente da de baja la suscripción.
+
+Sin `from_seq` se reciben solo los frames nuevos. `decimate=k` conserva los
+frames con seq % k == 0, así dos clientes con la misma k ven los mismos
+frames. `seq` y `t_ns` van siempre; `status`/`phys_status` son StatusCode.
+
+    python3 -m core.arrow_stream tail --columns wm,P,score --decimate 10
+    python3 -m core.arrow_stream tail --from 0 --host 127.0.0.1
+"""
+import argparse
+import base64
+import hashlib
+import json
+import queue
+import socket
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pyarrow as pa
+
+from config.settings import network_config
+from core.telemetry import TELEMETRY_DTYPE, TelemetryRecord, records_to_block
+
+STREAM_COLUMNS = TELEMETRY_DTYPE.names
+ALWAYS = ('seq', 't_ns')
+END_OF_STREAM = b'\xff\xff\xff\xff\x00\x00\x00\x00'
+_WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC11B65'
+_MAX_REQUEST = 8192
+
+# Opcodes de WebSocket (RFC 6455)
+_WS_BINARY = 0x2
+_WS_CLOSE = 0x8
+_WS_PING = 0x9
+_WS_PONG = 0xA
+
+
+def _ws_frame(payload: bytes, opcode: int = _WS_BINARY) -> bytes:
+    # Frame final sin máscara (servidor -> cliente, RFC 6455)
+    n = len(payload)
+    if n < 126:
+        head = bytes((0x80 | opcode, n))
+    elif n < 1 << 16:
+        head = bytes((0x80 | opcode, 126)) + n.to_bytes(2, 'big')
+    else:
+        head = bytes((0x80 | opcode, 127)) + n.to_bytes(8, 'big')
+    return head + payload
+
+
+def _recv_exact(conn: socket.socket, n: int) -> bytes:
+    data = b''
+    while len(data) < n:
+        chunk = conn.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("Conexión cerrada por el cliente")
+        data += chunk
+    return data
+
+
+def _ws_read_frame(conn: socket.socket) -> Tuple[int, bytes]:
+    # (opcode, payload) de un frame del cliente (enmascarado por protocolo)
+    b0, b1 = _recv_exact(conn, 2)
+    n = b1 & 0x7F
+    if n == 126:
+        n = int.from_bytes(_recv_exact(conn, 2), 'big')
+    elif n == 127:
+        n = int.from_bytes(_recv_exact(conn, 8), 'big')
+    mask = _recv_exact(conn, 4) if b1 & 0x80 else None
+    payload = _recv_exact(conn, n)
+    if mask:
+        payload = bytes(b ^ mask[i & 3] for i, b in enumerate(payload))
+    return b0 & 0x0F, payload
+
+
+class Subscription:
+    """Opciones de un suscriptor: columnas, decimación y secuencia inicial."""
+
+    def __init__(self, columns: Optional[Sequence[str]] = None, decimate: int = 1,
+                 from_seq: Optional[int] = None):
+        columns = list(columns or STREAM_COLUMNS)
+        unknown = [c for c in columns if c not in STREAM_COLUMNS and c != 'seq']
+        if unknown:
+            raise ValueError(f"Columnas desconocidas: {unknown} (opciones: {list(STREAM_COLUMNS)})")
+        if int(decimate) < 1:
+            raise ValueError("decimate debe ser >= 1")
+        self.columns = tuple(ALWAYS) + tuple(c for c in columns if c not in ALWAYS)
+        self.decimate = int(decimate)
+        self.from_seq = None if from_seq is None else int(from_seq)
+
+    @property
+    def key(self) -> Tuple[Tuple[str, ...], int]:
+        return self.columns, self.decimate
+
+    @classmethod
+    def from_json(cls, line: bytes) -> 'Subscription':
+        req = json.loads(line or b'{}')
+        return cls(req.get('columns'), req.get('decimate', 1), req.get('from_seq'))
+
+    @classmethod
+    def from_query(cls, target: str) -> 'Subscription':
+        q = {k: v[-1] for k, v in parse_qs(urlparse(target).query).items()}
+        columns = q['columns'].split(',') if q.get('columns') else None
+        return cls(columns, int(q.get('decimate', 1)),
+                   int(q['from']) if 'from' in q else None)
+
+
+class _Subscriber:
+    def __init__(self, conn: socket.socket, sub: Subscription, websocket: bool, max_pending: int):
+        self.conn = conn
+        self.sub = sub
+        self.websocket = websocket
+        self.queue: queue.Queue = queue.Queue(max_pending)
+        self.closed = False  # Cierre WebSocket ya enviado
+        # Lotes (hilo del suscriptor) y pong/cierre (hilo lector) comparten el socket
+        self._send_lock = threading.Lock()
+
+    def send(self, message: bytes, opcode: int = _WS_BINARY) -> None:
+        with self._send_lock:
+            if self.closed:
+                return
+            self.conn.sendall(_ws_frame(message, opcode) if self.websocket else message)
+            self.closed = opcode == _WS_CLOSE
+
+
+class ArrowStreamServer:
+    """Servidor de suscripciones Arrow IPC alimentado por el flujo de telemetría.
+
+    Args:
+        host, port: Dirección de escucha (por defecto NetworkConfig.STREAM_*)
+        batch_interval: Segundos entre lotes enviados
+        retention_rows: Frames retenidos para reanudar por secuencia
+        max_pending: Lotes en cola por suscriptor; un cliente más lento se
+                     desconecta y puede reanudar desde su último seq
+    """
+
+    def __init__(self, host: str = None, port: int = None, batch_interval: float = None,
+                 retention_rows: int = None, max_pending: int = None):
+        self.host = host or network_config.STREAM_HOST
+        self.port = network_config.STREAM_PORT if port is None else port
+        self.batch_interval = batch_interval or network_config.STREAM_BATCH_INTERVAL
+        self.retention_rows = retention_rows or network_config.STREAM_RETENTION_ROWS
+        self.max_pending = max_pending or network_config.STREAM_MAX_PENDING
+        self.next_seq = 0
+        self.batches_sent = 0
+        self.encodings = 0
+        self._pending: List[np.ndarray] = []
+        self._retained: deque = deque()   # (seq inicial, bloque)
+        self._retained_rows = 0
+        self._subscribers: List[_Subscriber] = []
+        self._schemas: Dict[Tuple[str, ...], pa.Schema] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    # ------------------------------------------------------------------
+    # Entrada (hilo del servidor TCP)
+    # ------------------------------------------------------------------
+
+    def push(self, item: Union[TelemetryRecord, np.ndarray]) -> None:
+        """Incorpora un registro o bloque del flujo de telemetría."""
+        rows = item if isinstance(item, np.ndarray) else records_to_block((item,))
+        if len(rows):
+            with self._lock:
+                self._pending.append(rows.copy())
+
+    # ------------------------------------------------------------------
+    # Codificación
+    # ------------------------------------------------------------------
+
+    def _schema(self, columns: Tuple[str, ...]) -> pa.Schema:
+        schema = self._schemas.get(columns)
+        if schema is None:
+            types = {'seq': pa.int64()}
+            types.update({name: pa.from_numpy_dtype(TELEMETRY_DTYPE[name]) for name in STREAM_COLUMNS})
+            schema = self._schemas[columns] = pa.schema([(c, types[c]) for c in columns])
+        return schema
+
+    def _encode(self, rows: np.ndarray, seq0: int, sub: Subscription,
+                start_seq: int = 0) -> Optional[bytes]:
+        # Mensaje IPC de un lote con las columnas y decimación pedidas
+        seq = np.arange(seq0, seq0 + len(rows), dtype=np.int64)
+        keep = seq >= start_seq
+        if sub.decimate > 1:
+            keep &= seq % sub.decimate == 0
+        if not keep.all():
+            rows, seq = rows[keep], seq[keep]
+        if len(rows) == 0:
+            return None
+        arrays = [pa.array(seq) if c == 'seq' else pa.array(np.ascontiguousarray(rows[c]))
+                  for c in sub.columns]
+        self.encodings += 1
+        batch = pa.RecordBatch.from_arrays(arrays, schema=self._schema(sub.columns))
+        return batch.serialize().to_pybytes()
+
+    # ------------------------------------------------------------------
+    # Reparto (hilo de lotes)
+    # ------------------------------------------------------------------
+
+    def _flush(self) -> None:
+        with self._lock:
+            if not self._pending:
+                return
+            rows = self._pending[0] if len(self._pending) == 1 else np.concatenate(self._pending)
+            self._pending = []
+            seq0 = self.next_seq
+            self.next_seq += len(rows)
+
+            self._retained.append((seq0, rows))
+            self._retained_rows += len(rows)
+            while self._retained_rows - len(self._retained[0][1]) >= self.retention_rows:
+                self._retained_rows -= len(self._retained.popleft()[1])
+
+            # Una codificación por combinación de opciones, compartida
+            encoded: Dict[tuple, Optional[bytes]] = {}
+            for s in self._subscribers:
+                key = s.sub.key
+                if key not in encoded:
+                    encoded[key] = self._encode(rows, seq0, s.sub)
+                message = encoded[key]
+                if message is None:
+                    continue
+                try:
+                    s.queue.put_nowait(message)
+                except queue.Full:
+                    print(f"Suscriptor Arrow lento desconectado (seq {seq0})")
+                    self._drop(s)
+            self.batches_sent += 1
+
+    def _drop(self, s: _Subscriber) -> None:
+        # Llamar con el lock tomado
+        if s in self._subscribers:
+            self._subscribers.remove(s)
+        try:
+            s.queue.put_nowait(None)
+        except queue.Full:
+            s.conn.close()
+
+    def _run_batches(self) -> None:
+        while not self._stop.wait(self.batch_interval):
+            try:
+                self._flush()
+            except Exception as e:
+                print(f"Error en stream Arrow: {e}")
+
+    # ------------------------------------------------------------------
+    # Suscriptores
+    # ------------------------------------------------------------------
+
+    def _read_request(self, conn: socket.socket) -> Tuple[bool, bytes]:
+        # WebSocket si empieza con 'GET '; si no, una línea JSON
+        data = b''
+        while len(data) < _MAX_REQUEST:
+            chunk = conn.recv(1024)
+            if not chunk:
+                break
+            data += chunk
+            if data.startswith(b'GET '):
+                if b'\r\n\r\n' in data:
+                    return True, data
+            elif b'\n' in data:
+                return False, data.split(b'\n', 1)[0]
+        raise ValueError("Solicitud de suscripción incompleta")
+
+    def _subscribe(self, conn: socket.socket) -> Optional[_Subscriber]:
+        conn.settimeout(network_config.TIMEOUT)
+        websocket, request = self._read_request(conn)
+        try:
+            if websocket:
+                lines = request.decode('latin-1').split('\r\n')
+                headers = {k.strip().lower(): v.strip()
+                           for k, _, v in (line.partition(':') for line in lines[1:] if line)}
+                sub = Subscription.from_query(lines[0].split(' ')[1])
+            else:
+                sub = Subscription.from_json(request)
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            if websocket:
+                conn.sendall(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n')
+            else:
+                conn.sendall(json.dumps({'ok': False, 'error': str(e)}).encode() + b'\n')
+            return None
+        conn.settimeout(None)
+
+        s = _Subscriber(conn, sub, websocket, self.max_pending)
+        with self._lock:
+            # Atrasados y registro bajo el mismo lock: sin huecos ni duplicados con los lotes vivos
+            backlog = []
+            if sub.from_seq is not None:
+                for seq0, rows in self._retained:
+                    if seq0 + len(rows) > sub.from_seq:
+                        message = self._encode(rows, seq0, sub, start_seq=sub.from_seq)
+                        if message is not None:
+                            backlog.append(message)
+            first_seq = (self.next_seq if sub.from_seq is None
+                         else max(sub.from_seq, self._retained[0][0] if self._retained else self.next_seq))
+            self._subscribers.append(s)
+
+        if websocket:
+            accept = base64.b64encode(hashlib.sha1(
+                headers['sec-websocket-key'].encode() + _WS_GUID).digest()).decode()
+            conn.sendall(('HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n'
+                          'Connection: Upgrade\r\n'
+                          f'Sec-WebSocket-Accept: {accept}\r\n\r\n').encode())
+        else:
+            conn.sendall(json.dumps({'ok': True, 'next_seq': first_seq,
+                                     'columns': list(sub.columns)}).encode() + b'\n')
+        s.send(self._schema(sub.columns).serialize().to_pybytes())
+        for message in backlog:
+            s.send(message)
+        return s
+
+    def _read_websocket(self, s: _Subscriber) -> None:
+        # Frames del cliente: ping -> pong; cierre o desconexión -> baja
+        try:
+            while True:
+                opcode, payload = _ws_read_frame(s.conn)
+                if opcode == _WS_PING:
+                    s.send(payload, _WS_PONG)
+                elif opcode == _WS_CLOSE:
+                    s.send(payload[:2], _WS_CLOSE)  # Eco del código de estado
+                    break
+        except (OSError, ValueError):
+            pass
+        with self._lock:
+            self._drop(s)
+
+    def _serve(self, conn: socket.socket) -> None:
+        s = None
+        try:
+            s = self._subscribe(conn)
+            if s is not None and s.websocket:
+                threading.Thread(target=self._read_websocket, args=(s,), daemon=True).start()
+            while s is not None and not self._stop.is_set():
+                message = s.queue.get()
+                if message is None:
+                    break
+                s.send(message)
+            if s is not None:
+                if s.websocket:
+                    s.send((1001).to_bytes(2, 'big'), _WS_CLOSE)  # Servidor detenido
+                else:
+                    s.send(END_OF_STREAM)
+        except (OSError, ValueError, KeyError):
+            pass
+        finally:
+            if s is not None:
+                with self._lock:
+                    if s in self._subscribers:
+                        self._subscribers.remove(s)
+            try:
+                conn.shutdown(socket.SHUT_RDWR)  # Despierta al hilo lector
+            except OSError:
+                pass
+            conn.close()
+
+    def _run_listener(self) -> None:
+        try:
+            with socket.create_server((self.host, self.port)) as srv:
+                srv.settimeout(network_config.TIMEOUT)
+                while not self._stop.is_set():
+                    try:
+                        conn, _ = srv.accept()
+                    except socket.timeout:
+                        continue
+                    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+        except OSError as e:
+            print(f"Error en stream Arrow: {e}")
+
+    def start(self) -> None:
+        """Lanza el hilo de escucha y el de lotes."""
+        self._stop.clear()
+        threading.Thread(target=self._run_listener, name='arrow-listen', daemon=True).start()
+        threading.Thread(target=self._run_batches, name='arrow-batches', daemon=True).start()
+
+    def stop(self) -> None:
+        """Envía lo pendiente y cierra los suscriptores."""
+        self._flush()
+        self._stop.set()
+        with self._lock:
+            for s in list(self._subscribers):
+                self._drop(s)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+
+def subscribe(host: str = None, port: int = None, columns: Optional[Sequence[str]] = None,
+              decimate: int = 1, from_seq: Optional[int] = None) -> Iterator[pa.RecordBatch]:
+    """Cliente TCP: itera los record batches del stream (p. ej. desde un notebook).
+
+    Para reanudar tras una desconexión, pasar from_seq = último seq recibido + 1.
+    """
+    host = host or network_config.STREAM_HOST
+    port = network_config.STREAM_PORT if port is None else port
+    with socket.create_connection((host, port)) as sock:
+        request = {'columns': list(columns) if columns else None, 'decimate': decimate,
+                   'from_seq': from_seq}
+        sock.sendall(json.dumps(request).encode() + b'\n')
+        with sock.makefile('rb') as f:
+            reply = json.loads(f.readline())
+            if not reply.get('ok'):
+                raise ValueError(reply.get('error'))
+            yield from pa.ipc.open_stream(f)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Suscriptor del stream Arrow de telemetría")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_tail = sub.add_parser('tail', help="Imprimir lotes recibidos")
+    p_tail.add_argument('--host', default=network_config.STREAM_HOST)
+    p_tail.add_argument('--port', type=int, default=network_config.STREAM_PORT)
+    p_tail.add_argument('--columns', help="Lista separada por comas (por defecto todas)")
+    p_tail.add_argument('--decimate', type=int, default=1)
+    p_tail.add_argument('--from', dest='from_seq', type=int, help="Reanudar desde este seq")
+    args = parser.parse_args()
+
+    columns = args.columns.split(',') if args.columns else None
+    try:
+        for batch in subscribe(args.host, args.port, columns, args.decimate, args.from_seq):
+            seq = batch.column('seq')
+            last = batch.slice(batch.num_rows - 1).to_pylist()[0]
+            print(f"{time.strftime('%H:%M:%S')} seq {seq[0]}..{seq[-1]} ({batch.num_rows} filas) "
+                  f"último: {last}")
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""Calibración en línea del umbral de score con memoria constante.
+
+El umbral fijo `decision_function < 0` viene de `contamination=0.04` en el
+entrenamiento. Aquí se estiman en línea, por régimen de viento, los
+cuantiles del score con el algoritmo P² (Jain & Chlamtac, 1985: cinco
+marcadores por cuantil, sin guardar muestras) y se deriva un umbral por
+régimen, acotado a ±MAX_SHIFT alrededor de 0. Un detector Page-Hinkley de
+dos lados por régimen dispara alarmas de deriva cuando la media del score
+se desplaza.
+
+Los cuantiles se congelan mientras la tasa reciente de anomalías del régimen
+(media móvil de FREEZE_WINDOW muestras frente al umbral vigente) supera
+FREEZE_RATE: una anomalía sostenida en un punto de operación fijo no debe
+convertirse en el 4 % inferior de su propio régimen y pasar a NORMAL. En
+operación normal (~QUANTILE de anomalías) se incorporan todos los scores,
+cola incluida, para no sesgar el cuantil.
+
+Memoria: bins × (cuantiles × 5 marcadores + estado Page-Hinkley), fija
+desde la construcción; nunca se recorre el historial.
+"""
+import math
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config.settings import calibration_config
+
+
+class P2Quantile:
+    """Estimador P² de un cuantil p en O(1) memoria y tiempo por muestra."""
+
+    __slots__ = ('p', 'count', '_q', '_n', '_np', '_dn')
+
+    def __init__(self, p: float):
+        self.p = p
+        self.count = 0
+        self._q: List[float] = []                       # Alturas de los marcadores
+        self._n = [0, 1, 2, 3, 4]                       # Posiciones actuales
+        self._np = [0.0, 2 * p, 4 * p, 2 + 2 * p, 4.0]  # Posiciones deseadas
+        self._dn = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+
+    def update(self, x: float) -> None:
+        self.count += 1
+        q = self._q
+        if self.count <= 5:
+            q.append(x)
+            if self.count == 5:
+                q.sort()
+            return
+
+        n = self._n
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        desired = self._np
+        for i in range(5):
+            desired[i] += self._dn[i]
+
+        # Ajuste de los marcadores centrales (parabólico o lineal)
+        for i in (1, 2, 3):
+            d = desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                qp = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < qp < q[i + 1]:
+                    qp = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = qp
+                n[i] += d
+
+    def value(self) -> float:
+        """Estimación actual del cuantil (NaN sin muestras)."""
+        if self.count == 0:
+            return math.nan
+        if self.count < 5:
+            ordered = sorted(self._q)
+            return ordered[min(int(self.p * len(ordered)), len(ordered) - 1)]
+        return self._q[2]
+
+
+class PageHinkley:
+    """Page-Hinkley de dos lados sobre la media de un flujo."""
+
+    __slots__ = ('delta', 'threshold', 'min_samples', 'count', 'mean',
+                 '_up', '_up_min', '_down', '_down_min')
+
+    def __init__(self, delta: float, threshold: float, min_samples: int):
+        self.delta = delta
+        self.threshold = threshold
+        self.min_samples = min_samples
+        self.reset()
+
+    def reset(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self._up = self._up_min = 0.0
+        self._down = self._down_min = 0.0
+
+    def update(self, x: float) -> int:
+        """Incorpora una muestra. Returns: +1 deriva al alza, -1 a la baja, 0 nada."""
+        self.count += 1
+        self.mean += (x - self.mean) / self.count
+        self._up += x - self.mean - self.delta
+        self._up_min = min(self._up_min, self._up)
+        self._down += self.mean - x - self.delta
+        self._down_min = min(self._down_min, self._down)
+        if self.count < self.min_samples:
+            return 0
+        if self._up - self._up_min > self.threshold:
+            return 1
+        if self._down - self._down_min > self.threshold:
+            return -1
+        return 0
+
+
+class _Regime:
+    """Estado de un bin de viento: cuantiles P² y detector de deriva."""
+
+    __slots__ = ('quantiles', 'drift', 'samples', 'threshold', 'anomaly_rate')
+
+    def __init__(self, probs, cfg):
+        self.quantiles = {p: P2Quantile(p) for p in probs}
+        self.drift = PageHinkley(cfg.DRIFT_DELTA, cfg.DRIFT_LAMBDA, cfg.DRIFT_MIN_SAMPLES)
+        self.samples = 0              # Scores incorporados a los cuantiles
+        self.threshold = 0.0
+        self.anomaly_rate = cfg.QUANTILE  # Media móvil de score < umbral
+
+
+class ScoreCalibrator:
+    """Umbral de anomalía por régimen de viento, calibrado en línea.
+
+    `thresholds(wind)` da el umbral vigente (score < umbral => ANOMALÍA);
+    hasta reunir MIN_SAMPLES en un régimen se usa 0, el umbral del
+    entrenamiento. `update(wind, scores)` incorpora scores nuevos.
+    """
+
+    def __init__(self, quantile: float = None, bin_width: float = None, n_bins: int = None):
+        cfg = calibration_config
+        self.quantile = cfg.QUANTILE if quantile is None else quantile
+        self.bin_width = bin_width or cfg.BIN_WIDTH
+        self.n_bins = n_bins or cfg.BINS
+        self.min_samples = cfg.MIN_SAMPLES
+        self.max_shift = cfg.MAX_SHIFT
+        self.max_updates = cfg.MAX_UPDATES_PER_BATCH
+        self.rate_alpha = 1.0 / max(cfg.FREEZE_WINDOW, 1)
+        self.freeze_rate = cfg.FREEZE_RATE
+        probs = sorted({self.quantile, 0.5})
+        self.regimes = [_Regime(probs, cfg) for _ in range(self.n_bins)]
+        self._thresholds = np.zeros(self.n_bins)
+        # Últimas alarmas de deriva (acotado)
+        self.alarms = deque(maxlen=cfg.MAX_ALARMS)
+        self.alarm_count = 0
+
+    def bin_of(self, wind):
+        """Régimen de cada velocidad de viento (el último bin es abierto)."""
+        b = np.floor(np.asarray(wind, dtype=np.float64) / self.bin_width).astype(np.int64)
+        return np.clip(b, 0, self.n_bins - 1)
+
+    def thresholds(self, wind) -> np.ndarray:
+        return self._thresholds[self.bin_of(wind)]
+
+    def threshold_one(self, wind: float) -> float:
+        b = min(max(int(wind // self.bin_width), 0), self.n_bins - 1)
+        return float(self._thresholds[b])
+
+    def _feed(self, b: int, values) -> None:
+        regime = self.regimes[b]
+        sketches = regime.quantiles.values()
+        threshold, alpha, fed = regime.threshold, self.rate_alpha, 0
+        for x in values:
+            # La deriva ve todos los scores; los cuantiles, solo fuera de un episodio de anomalías
+            regime.anomaly_rate += ((x < threshold) - regime.anomaly_rate) * alpha
+            if regime.anomaly_rate <= self.freeze_rate:
+                for sketch in sketches:
+                    sketch.update(x)
+                fed += 1
+            direction = regime.drift.update(x)
+            if direction:
+                self._alarm(b, direction, regime.drift.mean)
+                regime.drift.reset()
+        regime.samples += fed
+        if fed and regime.samples >= self.min_samples:
+            q = regime.quantiles[self.quantile].value()
+            regime.threshold = min(max(q, -self.max_shift), self.max_shift)
+            self._thresholds[b] = regime.threshold
+
+    def _alarm(self, b: int, direction: int, mean: float) -> None:
+        lo = b * self.bin_width
+        label = f"{lo:g}+" if b == self.n_bins - 1 else f"{lo:g}-{lo + self.bin_width:g}"
+        event = {'t_ns': time.time_ns(), 'regime': label,
+                 'direction': 'alza' if direction > 0 else 'baja', 'mean': mean}
+        self.alarms.append(event)
+        self.alarm_count += 1
+        print(f"Deriva del score en régimen {label} m/s ({event['direction']}, media {mean:.4f})")
+
+    def update_one(self, wind: float, score: float) -> None:
+        b = min(max(int(wind // self.bin_width), 0), self.n_bins - 1)
+        self._feed(b, (score,))
+
+    def update(self, wind, scores: np.ndarray) -> None:
+        """Incorpora un lote; en lotes grandes se toma una muestra con paso fijo."""
+        scores = np.asarray(scores, dtype=np.float64)
+        bins = np.broadcast_to(self.bin_of(wind), scores.shape)
+        step = max(1, math.ceil(len(scores) / self.max_updates)) if self.max_updates else 1
+        if step > 1:
+            scores, bins = scores[::step], bins[::step]
+        for b in np.unique(bins):
+            self._feed(int(b), scores[bins == b].tolist())
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Estado por régimen: muestras, cuantiles estimados y umbral vigente."""
+        out = {}
+        for b, regime in enumerate(self.regimes):
+            if not regime.samples:
+                continue
+            lo = b * self.bin_width
+            label = f"{lo:g}+" if b == self.n_bins - 1 else f"{lo:g}-{lo + self.bin_width:g}"
+            row = {'samples': regime.samples, 'threshold': float(self._thresholds[b]),
+                   'anomaly_rate': regime.anomaly_rate,
+                   'frozen': regime.anomaly_rate > self.freeze_rate}
+            row.update({f'q{p:g}': sk.value() for p, sk in regime.quantiles.items()})
+            out[label] = row
+        return out
+
+    def last_alarm(self) -> Optional[dict]:
+        return self.alarms[-1] if self.alarms else None
+
+    # ------------------------------------------------------------------
+    # Estado para checkpoints (storage/checkpoint.py)
+    # ------------------------------------------------------------------
+
+    def state_arrays(self) -> Dict[str, np.ndarray]:
+        """Estado completo en arreglos float64 de forma fija.
+
+        sketch (bins, cuantiles, 16): count, 5 alturas, 5 posiciones, 5 deseadas;
+        drift (bins, 6): count, media y acumulados Page-Hinkley;
+        regime (bins, 3): muestras, umbral vigente y tasa reciente de anomalías.
+        """
+        probs = sorted(self.regimes[0].quantiles)
+        sketch = np.full((self.n_bins, len(probs), 16), np.nan)
+        drift = np.zeros((self.n_bins, 6))
+        regime_state = np.zeros((self.n_bins, 3))
+        for b, regime in enumerate(self.regimes):
+            for j, p in enumerate(probs):
+                sk = regime.quantiles[p]
+                q = list(sk._q)  # Copia: el hilo del servidor puede estar actualizando
+                sketch[b, j, 0] = len(q) if len(q) < 5 else sk.count
+                sketch[b, j, 1:1 + len(q)] = q
+                sketch[b, j, 6:11] = sk._n
+                sketch[b, j, 11:16] = sk._np
+            d = regime.drift
+            drift[b] = (d.count, d.mean, d._up, d._up_min, d._down, d._down_min)
+            regime_state[b] = (regime.samples, regime.threshold, regime.anomaly_rate)
+        return {'sketch': sketch, 'drift': drift, 'regime': regime_state,
+                'probs': np.asarray(probs), 'alarm_count': np.array([self.alarm_count])}
+
+    def restore_arrays(self, arrays) -> bool:
+        """Restaura desde state_arrays(); False si los regímenes o cuantiles no coinciden."""
+        probs = sorted(self.regimes[0].quantiles)
+        sketch, drift, regime_state = arrays['sketch'], arrays['drift'], arrays['regime']
+        if sketch.shape != (self.n_bins, len(probs), 16) or list(arrays['probs']) != probs:
+            return False
+        for b, regime in enumerate(self.regimes):
+            for j, p in enumerate(probs):
+                sk = regime.quantiles[p]
+                sk.count = int(sketch[b, j, 0])
+                sk._q = [float(x) for x in sketch[b, j, 1:1 + min(sk.count, 5)]]
+                sk._n = [int(x) for x in sketch[b, j, 6:11]]
+                sk._np = [float(x) for x in sketch[b, j, 11:16]]
+            d = regime.drift
+            d.count = int(drift[b, 0])
+            d.mean, d._up, d._up_min, d._down, d._down_min = (float(x) for x in drift[b, 1:])
+            regime.samples = int(regime_state[b, 0])
+            regime.threshold = float(regime_state[b, 1])
+            if regime_state.shape[1] > 2:  # Checkpoints anteriores no guardaban la tasa
+                regime.anomaly_rate = float(regime_state[b, 2])
+            self._thresholds[b] = regime.threshold
+        self.alarm_count = int(arrays['alarm_count'][0])
+        return True
@@ -0,0 +1,554 @@
+import io
+import mmap
+import os
+import queue
+import struct
+import time
+from collections import deque
+from datetime import datetime
+from typing import Iterator, NamedTuple, Optional
+
+import numpy as np
+
+from config.settings import network_config, storage_config
+from core.control_state import ControlState
+from core.telemetry import TELEMETRY_DTYPE
+
+# ----------------------------------------------------------------------
+# Captura binaria del tráfico del gateway
+#
+# Cabecera de archivo (32 bytes): magic, versión, reservado, creación [ns
+# de reloj de pared] y fin de datos (se actualiza en cada registro, de modo
+# que una captura interrumpida sigue siendo legible).
+#
+# Registro: cabecera de 16 bytes (dirección, reservado, longitud, t_ns
+# monotónico) + bytes crudos, alineado a 8 bytes.
+#
+# Los registros DIR_TELEMETRY guardan lo que el servidor publicó para cada
+# frame (PUBLISHED_DTYPE, sin el timestamp de pared) y permiten comparar en
+# el replay los scores y diagnósticos, no solo los bytes de respuesta.
+#
+# Versión 2: un registro DIR_STATE al abrir la conexión (comando aplicado y
+# estado de la calibración, .npz) y un DIR_CONTROL por respuesta con los
+# comandos que devolvió ControlState.step para cada paso (COMMAND_DTYPE),
+# incluidas las consignas programadas y la limitación de pendiente. En la
+# versión 1, DIR_CONTROL era la consigna publicada '<2d' al recibir.
+# ----------------------------------------------------------------------
+
+MAGIC = b'AEOCAP1\x00'
+VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+FILE_HEADER = struct.Struct('<8sIIqQ')
+RECORD_HEADER = struct.Struct('<BBHIq')
+_END_OFFSET = 24  # Posición del campo 'fin de datos' en la cabecera
+
+DIR_IN = 0        # Cliente -> servidor (telemetría)
+DIR_OUT = 1       # Servidor -> cliente (comandos)
+DIR_CONTROL = 2   # Comandos por paso (COMMAND_DTYPE); v1: consigna '<2d' al recibir
+DIR_TELEMETRY = 3  # Registros publicados (PUBLISHED_DTYPE), uno por frame
+DIR_STATE = 4     # Estado al abrir la conexión (.npz)
+
+DIRECTION_NAMES = {DIR_IN: 'in', DIR_OUT: 'out', DIR_CONTROL: 'control',
+                   DIR_TELEMETRY: 'telemetry', DIR_STATE: 'state'}
+
+_CONTROL = struct.Struct('<2d')
+COMMAND_DTYPE = np.dtype([('t_sim', '<f8'), ('v', '<f8'), ('p', '<f8')])
+
+# Campos deterministas de la telemetría publicada (t_ns es de reloj de pared)
+PUBLISHED_FIELDS = ('t_sim', 'v', 'p', 'score', 'status', 'phys', 'phys_status')
+PUBLISHED_DTYPE = np.dtype([(name, TELEMETRY_DTYPE[name]) for name in PUBLISHED_FIELDS])
+
+
+def published(item) -> np.ndarray:
+    """Campos deterministas de un TelemetryRecord o bloque TELEMETRY_DTYPE."""
+    if isinstance(item, np.ndarray):
+        out = np.empty(len(item), dtype=PUBLISHED_DTYPE)
+        for name in PUBLISHED_FIELDS:
+            out[name] = item[name]
+        return out
+    return np.array([tuple(getattr(item, name) for name in PUBLISHED_FIELDS)],
+                    dtype=PUBLISHED_DTYPE)
+
+
+class CaptureRecord(NamedTuple):
+    direction: int
+    t_ns: int
+    payload: bytes
+
+
+def new_capture_path(directory: str = None) -> str:
+    """Ruta única por conexión, p. ej. captures/capture_20260115_101500.cap"""
+    directory = directory or storage_config.CAPTURE_DIR
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+    return os.path.join(directory, f"capture_{stamp}.cap")
+
+
+class CaptureWriter:
+    """Escritor de capturas sobre un archivo preasignado y mapeado en memoria.
+
+    Cada registro es una copia dentro del mmap (sin llamadas al sistema en el
+    camino caliente). Si se llena, el archivo se duplica y se vuelve a mapear.
+    """
+
+    def __init__(self, path: str, prealloc: int = None):
+        self.path = path
+        size = max(prealloc or storage_config.CAPTURE_PREALLOC, FILE_HEADER.size + 4096)
+        self._file = open(path, 'w+b')
+        self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        self._size = size
+        self._pos = FILE_HEADER.size
+        self.records = 0
+        FILE_HEADER.pack_into(self._mm, 0, MAGIC, VERSION, 0, time.time_ns(), self._pos)
+
+    def write(self, direction: int, data) -> None:
+        n = len(data)
+        need = RECORD_HEADER.size + ((n + 7) & ~7)
+        if self._pos + need > self._size:
+            self._grow(self._pos + need)
+        mm, pos = self._mm, self._pos
+        RECORD_HEADER.pack_into(mm, pos, direction, 0, 0, n, time.monotonic_ns())
+        mm[pos + RECORD_HEADER.size:pos + RECORD_HEADER.size + n] = data
+        self._pos = pos + need
+        struct.pack_into('<Q', mm, _END_OFFSET, self._pos)
+        self.records += 1
+
+    def _grow(self, minimum: int) -> None:
+        size = self._size
+        while size < minimum:
+            size *= 2
+        self._mm.close()
+        self._file.truncate(size)
+        self._mm = mmap.mmap(self._file.fileno(), size)
+        self._size = size
+
+    def close(self) -> None:
+        if self._mm is None:
+            return
+        self._mm.flush()
+        self._mm.close()
+        self._mm = None
+        self._file.truncate(self._pos)  # Descarta la preasignación sobrante
+        self._file.close()
+
+
+class CapturingConnection:
+    """Envoltura de una conexión (TCP/Unix/shm) que registra el tráfico crudo.
+
+    El servidor registra además, a través de ella, el estado al abrir la
+    conexión (`record_state`), los comandos calculados por paso
+    (`record_commands`) y, como sink, la telemetría publicada (`push`).
+
+    Args:
+        conn: Conexión con interfaz de socket
+        writer: Destino de los registros
+    """
+
+    def __init__(self, conn, writer: CaptureWriter):
+        self.conn = conn
+        self.writer = writer
+
+    def recv_into(self, view, nbytes: int = 0) -> int:
+        n = self.conn.recv_into(view, nbytes) if nbytes else self.conn.recv_into(view)
+        if n:
+            self.writer.write(DIR_IN, memoryview(view)[:n])
+        return n
+
+    def record_state(self, applied, calibration: Optional[dict] = None) -> None:
+        # Comando aplicado y calibración (state_arrays) al abrir la conexión
+        arrays = {'applied': np.asarray(applied, dtype=np.float64)}
+        for name, arr in (calibration or {}).items():
+            arrays[f'calibration.{name}'] = arr
+        buf = io.BytesIO()
+        np.savez(buf, **arrays)
+        self.writer.write(DIR_STATE, buf.getvalue())
+
+    def record_commands(self, t_sim: np.ndarray, commands: np.ndarray) -> None:
+        # Salida de ControlState.step para cada paso de una respuesta
+        rows = np.empty(len(t_sim), dtype=COMMAND_DTYPE)
+        rows['t_sim'] = t_sim
+        rows['v'] = commands[:, 0]
+        rows['p'] = commands[:, 1]
+        self.writer.write(DIR_CONTROL, rows.tobytes())
+
+    def sendall(self, data) -> None:
+        self.writer.write(DIR_OUT, data)
+        self.conn.sendall(data)
+
+    def push(self, item) -> None:
+        # Sink de telemetría: registra lo publicado para los frames recibidos
+        self.writer.write(DIR_TELEMETRY, published(item).tobytes())
+
+    def close(self) -> None:
+        self.writer.close()
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class CaptureReader:
+    """Lectura secuencial de una captura (mmap de solo lectura)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, created_ns, end = FILE_HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"No es una captura del gateway: {path}")
+        if version not in SUPPORTED_VERSIONS:
+            raise ValueError(f"Versión de captura no soportada: {version}")
+        self.version = version
+        self.created_ns = created_ns
+        self.end = min(end, len(self._mm))
+
+    def records(self) -> Iterator[CaptureRecord]:
+        mm, pos = self._mm, FILE_HEADER.size
+        while pos + RECORD_HEADER.size <= self.end:
+            direction, _, _, n, t_ns = RECORD_HEADER.unpack_from(mm, pos)
+            start = pos + RECORD_HEADER.size
+            yield CaptureRecord(direction, t_ns, mm[start:start + n])
+            pos = start + ((n + 7) & ~7)
+
+    def stream(self, direction: int) -> bytes:
+        """Todos los bytes de una dirección concatenados."""
+        return b''.join(r.payload for r in self.records() if r.direction == direction)
+
+    def telemetry(self) -> np.ndarray:
+        """Telemetría publicada capturada, un registro PUBLISHED_DTYPE por frame."""
+        return np.frombuffer(self.stream(DIR_TELEMETRY), dtype=PUBLISHED_DTYPE)
+
+    def commands(self) -> np.ndarray:
+        """Comandos por paso en orden (COMMAND_DTYPE); vacío en capturas v1."""
+        if self.version < 2:
+            return np.empty(0, dtype=COMMAND_DTYPE)
+        return np.frombuffer(self.stream(DIR_CONTROL), dtype=COMMAND_DTYPE)
+
+    def state(self) -> dict:
+        """Estado al abrir la conexión ({} en capturas v1)."""
+        record = next((r for r in self.records() if r.direction == DIR_STATE), None)
+        if record is None:
+            return {}
+        with np.load(io.BytesIO(record.payload), allow_pickle=False) as data:
+            return {name: data[name] for name in data.files}
+
+    def summary(self) -> dict:
+        counts = {name: 0 for name in DIRECTION_NAMES.values()}
+        sizes = dict(counts)
+        t_first = t_last = None
+        for r in self.records():
+            name = DIRECTION_NAMES.get(r.direction, str(r.direction))
+            counts[name] = counts.get(name, 0) + 1
+            sizes[name] = sizes.get(name, 0) + len(r.payload)
+            t_first = r.t_ns if t_first is None else t_first
+            t_last = r.t_ns
+        return {
+            'path': self.path,
+            'version': self.version,
+            'created': datetime.fromtimestamp(self.created_ns / 1e9).isoformat(),
+            'records': counts,
+            'bytes': sizes,
+            'duration_s': 0.0 if t_first is None else (t_last - t_first) / 1e9,
+        }
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+class _ReplayControls(ControlState):
+    # Devuelve en orden los comandos capturados en lugar de derivarlos de las
+    # consignas: reproduce también lo programado en tiempo de simulación
+    def __init__(self, commands: np.ndarray, applied):
+        super().__init__(*applied)
+        self._recorded = deque(commands.tolist())
+
+    def step(self, t_sim: float):
+        if not self._recorded:
+            return super().step(t_sim)
+        _, v, p = self._recorded.popleft()
+        self._applied = (v, p)
+        self._last_t = t_sim
+        return v, p
+
+
+class _ReplayConnection:
+    # Conexión simulada: entrega los bytes entrantes capturados con la misma
+    # fragmentación y acumula las respuestas del servidor y, como sink, la
+    # telemetría que publica. En capturas v1 aplica las consignas capturadas
+    # a `controls`; en v2 los comandos llegan por _ReplayControls
+    def __init__(self, reader: CaptureReader, controls, realtime: bool):
+        self._records = reader.records()
+        self.controls = controls if reader.version < 2 else None
+        self.realtime = realtime
+        self.replies = bytearray()
+        self.published = []
+        self._pending = b''
+        self._t0_capture = None
+        self._t0_replay = None
+
+    def recv_into(self, view, nbytes: int = 0) -> int:
+        view = memoryview(view).cast('B')
+        if not self._pending:
+            for r in self._records:
+                if r.direction == DIR_CONTROL and self.controls is not None:
+                    v, p = _CONTROL.unpack(r.payload)
+                    self.controls.update({'v': v, 'p': p})
+                elif r.direction == DIR_IN:
+                    self._pace(r.t_ns)
+                    self._pending = r.payload
+                    break
+            else:
+                return 0
+        n = min(len(view), len(self._pending))
+        view[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def _pace(self, t_ns: int) -> None:
+        # Velocidad original: respeta los intervalos capturados
+        if not self.realtime:
+            return
+        now = time.monotonic_ns()
+        if self._t0_capture is None:
+            self._t0_capture, self._t0_replay = t_ns, now
+            return
+        delay = (t_ns - self._t0_capture) - (now - self._t0_replay)
+        if delay > 0:
+            time.sleep(delay / 1e9)
+
+    def sendall(self, data) -> None:
+        self.replies += data
+
+    def push(self, item) -> None:
+        self.published.append(published(item))
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _compare(expected: bytes, actual: bytes) -> dict:
+    n = min(len(expected), len(actual))
+    a = np.frombuffer(expected, dtype=np.uint8, count=n)
+    b = np.frombuffer(actual, dtype=np.uint8, count=n)
+    diff = np.flatnonzero(a != b)
+    first = int(diff[0]) if len(diff) else (n if len(expected) != len(actual) else -1)
+    return {
+        'identical': first < 0,
+        'expected_bytes': len(expected),
+        'replayed_bytes': len(actual),
+        'first_mismatch': first,
+    }
+
+
+def _compare_telemetry(expected: np.ndarray, actual: np.ndarray) -> dict:
+    # Comparación por frame y campo; NaN == NaN (score de ERR_ML)
+    n = min(len(expected), len(actual))
+    differs = np.zeros(n, dtype=bool)
+    fields = {}
+    for name in PUBLISHED_FIELDS:
+        a, b = expected[name][:n], actual[name][:n]
+        bad = a != b
+        if a.dtype.kind == 'f':
+            bad &= ~(np.isnan(a) & np.isnan(b))
+        if bad.any():
+            fields[name] = int(bad.sum())
+        differs |= bad
+    mismatch = np.flatnonzero(differs)
+    first = int(mismatch[0]) if len(mismatch) else (n if len(expected) != len(actual) else -1)
+    return {
+        'identical': first < 0,
+        'expected_frames': len(expected),
+        'replayed_frames': len(actual),
+        'first_mismatch': first,
+        'mismatched_fields': fields,
+    }
+
+
+def replay(path: str, server=None, realtime: bool = False) -> dict:
+    """Reproduce una captura dentro de un TCPServerManager, sin red.
+
+    Los bytes entrantes se entregan con la fragmentación original, por lo que
+    el servidor toma las mismas decisiones (frame único / lote / v2) y las
+    respuestas deben coincidir bit a bit con las capturadas. También se
+    compara, frame a frame, la telemetría publicada (consignas, t_sim,
+    score y diagnósticos) con la registrada en la captura.
+
+    En capturas v2 el servidor recibe los comandos capturados paso a paso
+    (no se recalculan desde las consignas) y la calibración del motor ML se
+    restaura al estado que tenía al abrirse la conexión capturada.
+
+    Args:
+        server: TCPServerManager destino (por defecto uno nuevo con el motor
+                ML y la curva de potencia por defecto, como en app.py). Su
+                calibración queda con el estado de la captura
+        realtime: True = velocidad original, False = máxima velocidad
+    Returns: Resultado de la comparación (respuestas y 'telemetry') y tiempos;
+             'identical' exige ambas. Las capturas sin telemetría registrada
+             solo comparan respuestas.
+    """
+    from core.ml_inference import MLInferenceEngine
+    from core.power_curve import PowerCurveIndex
+    from core.tcp_server import TCPServerManager
+
+    reader = CaptureReader(path)
+    try:
+        state = reader.state()
+        calibration = {name[len('calibration.'):]: arr for name, arr in state.items()
+                       if name.startswith('calibration.')}
+        if reader.version < 2:
+            first = next((r for r in reader.records() if r.direction == DIR_CONTROL), None)
+            applied = _CONTROL.unpack(first.payload) if first else (0.0, 0.0)
+        else:
+            applied = tuple(state.get('applied', (0.0, 0.0)))
+
+        if server is None:
+            engine = MLInferenceEngine(calibrate=bool(calibration) if reader.version >= 2 else None)
+            server = TCPServerManager(queue.Queue(), ControlState(*applied), engine,
+                                      power_curve=PowerCurveIndex.load_default())
+            server.capture_enabled = False
+
+        calibrator = getattr(server.ml_engine, 'calibrator', None)
+        restored = bool(calibration) and calibrator is not None and calibrator.restore_arrays(calibration)
+
+        original_controls = server.controls
+        if reader.version >= 2:
+            server.controls = _ReplayControls(reader.commands(), applied)
+        conn = _ReplayConnection(reader, server.controls, realtime)
+        server.sinks.append(conn)
+        t0 = time.perf_counter()
+        try:
+            server.handle_connection(conn)
+        finally:
+            server.sinks.remove(conn)
+            server.controls = original_controls
+        elapsed = time.perf_counter() - t0
+
+        result = _compare(reader.stream(DIR_OUT), bytes(conn.replies))
+        expected = reader.telemetry()
+        if len(expected):
+            actual = (np.concatenate(conn.published) if conn.published
+                      else np.empty(0, dtype=PUBLISHED_DTYPE))
+            telemetry = _compare_telemetry(expected, actual)
+            result['replies_identical'] = result['identical']
+            result['identical'] = result['identical'] and telemetry['identical']
+            result['telemetry'] = telemetry
+        result.update({
+            'elapsed_s': elapsed,
+            'capture_version': reader.version,
+            'calibration_restored': restored,
+            'protocol_version': server.protocol_version,
+            'steps': server.sim_step,
+        })
+        return result
+    finally:
+        reader.close()
+
+
+def replay_remote(path: str, transport: str = None, host: str = '127.0.0.1',
+                  port: Optional[int] = None, realtime: bool = False,
+                  controls=None) -> dict:
+    """Reproduce una captura contra un servidor en ejecución (como cliente).
+
+    Tras cada fragmento entrante espera tantos bytes de respuesta como los
+    capturados antes del siguiente fragmento. Los comandos no pueden
+    inyectarse en otro servidor: las respuestas coinciden solo si sus
+    consignas (y su calibración) reproducen las de la captura. Con el
+    ControlState del servidor (mismo proceso) se aplican las consignas de
+    una captura v1 o el comando inicial de una v2. La telemetría publicada
+    queda en el otro proceso: solo se comparan las respuestas.
+    """
+    from core import transports
+
+    reader = CaptureReader(path)
+    conn = transports.connect(transport, host, port)
+    replies = bytearray()
+    try:
+        records = list(reader.records())
+        t0_capture = next((r.t_ns for r in records if r.direction == DIR_IN), 0)
+        if controls is not None and reader.version >= 2:
+            v, p = reader.state().get('applied', controls.applied())
+            controls.update({'v': v, 'p': p})
+        t0 = time.perf_counter()
+        expected = 0
+        for i, r in enumerate(records):
+            if r.direction == DIR_CONTROL and controls is not None and reader.version < 2:
+                v, p = _CONTROL.unpack(r.payload)
+                controls.update({'v': v, 'p': p})
+            if r.direction != DIR_IN:
+                continue
+            if realtime:
+                delay = (r.t_ns - t0_capture) / 1e9 - (time.perf_counter() - t0)
+                if delay > 0:
+                    time.sleep(delay)
+            conn.sendall(r.payload)
+            # Respuestas capturadas antes del próximo fragmento entrante
+            for nxt in records[i + 1:]:
+                if nxt.direction == DIR_IN:
+                    break
+                if nxt.direction == DIR_OUT:
+                    expected += len(nxt.payload)
+            while len(replies) < expected:
+                chunk = conn.recv(expected - len(replies))
+                if not chunk:
+                    raise ConnectionError("Servidor cerró la conexión")
+                replies += chunk
+        elapsed = time.perf_counter() - t0
+        result = _compare(reader.stream(DIR_OUT), bytes(replies))
+        result['elapsed_s'] = elapsed
+        return result
+    finally:
+        conn.close()
+        reader.close()
+
+
+def main() -> None:
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Capturas binarias del gateway")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_info = sub.add_parser('info', help="Resumen de una captura")
+    p_info.add_argument('path')
+
+    p_replay = sub.add_parser('replay', help="Reproducir una captura y comparar respuestas")
+    p_replay.add_argument('path')
+    p_replay.add_argument('--speed', choices=('max', 'original'), default='max')
+    p_replay.add_argument('--remote', action='store_true',
+                          help="Enviar a un servidor en ejecución en lugar de uno local")
+    p_replay.add_argument('--transport', default=network_config.TRANSPORT)
+    p_replay.add_argument('--host', default='127.0.0.1')
+    p_replay.add_argument('--port', type=int, default=network_config.PORT)
+    args = parser.parse_args()
+
+    if args.command == 'info':
+        reader = CaptureReader(args.path)
+        print(json.dumps(reader.summary(), indent=2))
+        reader.close()
+        return
+
+    realtime = args.speed == 'original'
+    if args.remote:
+        result = replay_remote(args.path, args.transport, args.host, args.port, realtime)
+    else:
+        result = replay(args.path, realtime=realtime)
+    print(json.dumps(result, indent=2))
+    if not result['identical']:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
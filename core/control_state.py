@@ -0,0 +1,243 @@
+import heapq
+import itertools
+import threading
+from collections import deque
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.settings import control_config
+
+
+class ControlSnapshot(NamedTuple):
+    # Consigna publicada (inmutable): viento [m/s], pitch [deg], versión
+    v: float
+    p: float
+    version: int
+
+
+# Traza por paso del camino de respuesta
+TRACE_DTYPE = np.dtype([
+    ('t_sim', '<f8'), ('v', '<f8'), ('p', '<f8'), ('version', '<i8')
+])
+
+
+class ControlState:
+    """Consignas de control compartidas entre la UI, el file player y el servidor.
+
+    Los escritores (hilo de Streamlit, file player) publican una instantánea
+    inmutable nueva y la intercambian como referencia única (doble buffer:
+    frente publicado / instantánea anterior). El hilo TCP solo lee esa
+    referencia, sin bloqueo, por lo que nunca ve un viento de una versión y
+    un pitch de otra.
+
+    El camino de respuesta (`step`) avanza con el tiempo de simulación:
+    aplica las consignas programadas que ya vencieron y limita la pendiente
+    de viento/pitch por segundo simulado. Con las mismas consignas y los
+    mismos tiempos de simulación la traza resultante es idéntica.
+
+    La cola de consignas programadas es una sola deque que se modifica en
+    sitio y siempre bajo `_write_lock`, también al consumirla en `step`; el
+    hilo TCP solo toma el bloqueo cuando hay consignas pendientes.
+
+    Mantiene la interfaz de diccionario ('v', 'p') usada por la UI.
+    """
+
+    def __init__(self, v: float, p: float,
+                 max_wind_rate: Optional[float] = None,
+                 max_pitch_rate: Optional[float] = None):
+        self.max_wind_rate = (control_config.MAX_WIND_RATE
+                              if max_wind_rate is None else max_wind_rate)
+        self.max_pitch_rate = (control_config.MAX_PITCH_RATE
+                               if max_pitch_rate is None else max_pitch_rate)
+        self._versions = itertools.count(1)
+        self._write_lock = threading.Lock()  # Solo entre escritores
+        self._front = ControlSnapshot(float(v), float(p), 0)
+        self._back = self._front
+
+        # Consignas programadas en tiempo de simulación: (t_sim, orden, cambios).
+        # Nunca se reasigna: se modifica en sitio bajo _write_lock
+        self._events: deque = deque()
+        self._event_order = itertools.count()
+
+        # Estado del camino de respuesta (solo lo toca el hilo TCP)
+        self._applied: Tuple[float, float] = (float(v), float(p))
+        self._last_t: Optional[float] = None
+        # Tiempo de simulación acumulado de conexiones anteriores
+        self._clock_offset = 0.0
+        self._trace: Optional[np.ndarray] = None
+        self._trace_len = 0
+
+    # ------------------------------------------------------------------
+    # Escritores
+    # ------------------------------------------------------------------
+
+    def _publish(self, changes: Dict[str, float]) -> ControlSnapshot:
+        with self._write_lock:
+            return self._publish_locked(changes)
+
+    def _publish_locked(self, changes: Dict[str, float]) -> ControlSnapshot:
+        # Requiere _write_lock tomado
+        current = self._front
+        v = float(changes.get('v', current.v))
+        p = float(changes.get('p', current.p))
+        if v == current.v and p == current.p:
+            return current  # Sin cambios: no se crea versión nueva
+        snapshot = ControlSnapshot(v, p, next(self._versions))
+        self._back = current
+        self._front = snapshot  # Intercambio atómico de referencia
+        return snapshot
+
+    def update(self, changes: Dict[str, float]) -> ControlSnapshot:
+        """Publica viento y/o pitch en una sola versión."""
+        return self._publish({k: changes[k] for k in ('v', 'p') if k in changes})
+
+    def __setitem__(self, key: str, value: float) -> None:
+        if key not in ('v', 'p'):
+            raise KeyError(key)
+        self._publish({key: value})
+
+    def schedule(self, t_sim: float, v: Optional[float] = None,
+                 p: Optional[float] = None) -> None:
+        """Programa una consigna para el instante de simulación t_sim [s]."""
+        changes = {k: val for k, val in (('v', v), ('p', p)) if val is not None}
+        self._insert([(float(t_sim), next(self._event_order), changes)])
+
+    def schedule_profile(self, t0: float, dt: float, values: Sequence[float],
+                         key: str = 'v') -> None:
+        """Programa un perfil completo (p. ej. viento de un parquet) cada dt [s] simulados."""
+        if key not in ('v', 'p'):
+            raise KeyError(key)
+        self._insert([(t0 + i * dt, next(self._event_order), {key: float(value)})
+                      for i, value in enumerate(values)])
+
+    def _insert(self, events: list) -> None:
+        # `events` ya viene ordenado por (t_sim, orden)
+        if not events:
+            return
+        with self._write_lock:
+            queue = self._events
+            if not queue or queue[-1][0] <= events[0][0]:
+                queue.extend(events)
+            else:
+                merged = list(heapq.merge(queue, events))
+                queue.clear()
+                queue.extend(merged)
+
+    def clear_schedule(self) -> None:
+        """Descarta las consignas programadas que aún no vencieron."""
+        with self._write_lock:
+            self._events.clear()
+
+    # ------------------------------------------------------------------
+    # Lectores
+    # ------------------------------------------------------------------
+
+    def snapshot(self) -> ControlSnapshot:
+        """Consigna publicada actual (lectura sin bloqueo)."""
+        return self._front
+
+    def __getitem__(self, key: str) -> float:
+        if key not in ('v', 'p'):
+            raise KeyError(key)
+        return getattr(self._front, key)
+
+    def get(self, key: str, default: float = None) -> float:
+        return getattr(self._front, key) if key in ('v', 'p') else default
+
+    def previous(self) -> ControlSnapshot:
+        """Instantánea publicada antes de la actual."""
+        return self._back
+
+    @property
+    def version(self) -> int:
+        return self._front.version
+
+    def applied(self) -> Tuple[float, float]:
+        """Último (viento, pitch) efectivamente enviado a la simulación."""
+        return self._applied
+
+    def sim_time(self) -> Optional[float]:
+        """Último instante de simulación [s] atendido por `step` (None sin simulación)."""
+        return self._last_t
+
+    def sim_elapsed(self) -> Tuple[Optional[float], float]:
+        """(sim_time, desfase): tiempo continuo entre conexiones = sim_time + desfase.
+
+        Ambos valores se leen juntos para no mezclar los de antes y después de
+        un `reset_clock`.
+        """
+        with self._write_lock:
+            return self._last_t, self._clock_offset
+
+    # ------------------------------------------------------------------
+    # Camino de respuesta (hilo TCP)
+    # ------------------------------------------------------------------
+
+    def step(self, t_sim: float) -> Tuple[float, float]:
+        """Calcula el comando para el instante de simulación t_sim.
+
+        Costo constante por paso (más las consignas programadas que vencen).
+        Returns: (viento, pitch) con límites de pendiente aplicados
+        """
+        events = self._events
+        if events:
+            with self._write_lock:
+                while events and events[0][0] <= t_sim:
+                    self._publish_locked(events.popleft()[2])
+
+        target = self._front
+        v, p = self._applied
+        dt = 0.0 if self._last_t is None else max(0.0, t_sim - self._last_t)
+        self._last_t = t_sim
+
+        v = _slew(v, target.v, self.max_wind_rate * dt) if self.max_wind_rate > 0 else target.v
+        p = _slew(p, target.p, self.max_pitch_rate * dt) if self.max_pitch_rate > 0 else target.p
+        self._applied = (v, p)
+
+        if self._trace is not None:
+            i = self._trace_len % len(self._trace)
+            self._trace[i] = (t_sim, v, p, target.version)
+            self._trace_len += 1
+
+        return v, p
+
+    def reset_clock(self) -> None:
+        """Reinicia la referencia de tiempo (nueva conexión / nueva simulación).
+
+        La simulación nueva vuelve a t_sim = 0: las consignas pendientes se
+        adelantan en el tiempo ya simulado para que sigan donde iban, en vez
+        de esperar a que la nueva simulación alcance el tiempo anterior.
+        """
+        with self._write_lock:
+            shift = self._last_t or 0.0
+            if shift and self._events:
+                events = [(t - shift, order, changes) for t, order, changes in self._events]
+                self._events.clear()
+                self._events.extend(events)
+            self._clock_offset += shift
+            self._last_t = None
+
+    def enable_trace(self, capacity: int = 100_000) -> None:
+        """Activa el registro circular de comandos por paso."""
+        self._trace = np.zeros(capacity, dtype=TRACE_DTYPE)
+        self._trace_len = 0
+
+    def trace(self) -> np.ndarray:
+        """Traza registrada en orden cronológico."""
+        if self._trace is None:
+            return np.empty(0, dtype=TRACE_DTYPE)
+        n, cap = self._trace_len, len(self._trace)
+        if n <= cap:
+            return self._trace[:n].copy()
+        i = n % cap
+        return np.concatenate((self._trace[i:], self._trace[:i]))
+
+
+def _slew(current: float, target: float, max_delta: float) -> float:
+    # Limita el cambio por paso a +/- max_delta
+    if target > current + max_delta:
+        return current + max_delta
+    if target < current - max_delta:
+        return current - max_delta
+    return target
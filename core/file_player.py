@@ -1,22 +1,30 @@
-import threading
 import pandas as pd
-from typing import Dict, Tuple, Optional
+from typing import Tuple, Optional
+
+from core.control_state import ControlState
+
+WIND_COLUMN = 'WIND_Wind speed 1s-Aver'
 
 
 class FilePlayerManager:
     """Reproduce datos de un archivo parquet fila por fila,
-    actualizando la velocidad de viento en los controles compartidos."""
+    programando la velocidad de viento en los controles compartidos.
+
+    Las filas se programan con `ControlState.schedule_profile` cada `interval`
+    segundos de simulación, a partir del tiempo de simulación actual: el
+    perfil avanza al ritmo de Simulink (se detiene si la simulación se
+    detiene) y no depende del reloj de pared ni de un hilo propio. El
+    progreso se mide en tiempo continuo (`ControlState.sim_elapsed`), así que
+    una reconexión que reinicia t_sim a 0 no lo hace retroceder."""
 
-    def __init__(self, controls: Dict[str, float], interval: float = 2.0):
+    def __init__(self, controls: ControlState, interval: float = 2.0):
         self.controls = controls
-        self.interval = interval
+        self._interval = float(interval)
         self.df: Optional[pd.DataFrame] = None
         self.current_row = 0
-        self.is_playing = False
-        self._paused = threading.Event()
-        self._paused.set()  # No pausado por defecto
-        self._stop_event = threading.Event()
-        self._thread: Optional[threading.Thread] = None
+        self._playing = False
+        self._t0 = 0.0   # Tiempo continuo (sim_time + desfase) de la fila _row0
+        self._row0 = 0
 
     def load_file(self, filepath: str) -> int:
         """Carga un archivo parquet. Retorna el numero de filas."""
@@ -24,46 +32,70 @@ class FilePlayerManager:
         self.current_row = 0
         return len(self.df)
 
+    @property
+    def interval(self) -> float:
+        """Segundos de simulación entre filas."""
+        return self._interval
+
+    @interval.setter
+    def interval(self, value: float) -> None:
+        # Cambiar el intervalo en reproducción reprograma las filas restantes
+        value = float(value)
+        if value == self._interval:
+            return
+        playing = self.is_playing
+        if playing:
+            self.pause()
+        self._interval = value
+        if playing:
+            self.start()
+
     def start(self) -> None:
-        """Inicia la reproduccion en un hilo daemon."""
+        """Programa las filas restantes desde el tiempo de simulación actual."""
         if self.df is None or self.df.empty:
             return
-        self._stop_event.clear()
-        self._paused.set()
-        self.is_playing = True
-        self._thread = threading.Thread(target=self._play_loop, daemon=True)
-        self._thread.start()
-
-    def _play_loop(self) -> None:
-        """Loop principal: lee fila, actualiza wind speed, espera intervalo."""
-        while not self._stop_event.is_set() and self.current_row < len(self.df):
-            self._paused.wait()  # Se bloquea si esta pausado
-
-            if self._stop_event.is_set():
-                break
-
-            row = self.df.iloc[self.current_row]
-            wind_speed = row['WIND_Wind speed 1s-Aver']
-            self.controls['v'] = float(wind_speed)
-
-            self.current_row += 1
-            self._stop_event.wait(self.interval)
+        self._sync()
+        if self.current_row >= len(self.df):
+            return
+        # Sin simulación en curso el perfil empieza en t_sim = 0
+        t_now, offset = self.controls.sim_elapsed()
+        t_sim = 0.0 if t_now is None else t_now
+        self._t0 = t_sim + offset
+        self._row0 = self.current_row
+        self.controls.clear_schedule()
+        self.controls.schedule_profile(t_sim, self._interval,
+                                       self.df[WIND_COLUMN].to_numpy()[self._row0:], key='v')
+        self._playing = True
+
+    def _sync(self) -> int:
+        # Filas ya aplicadas según el tiempo de simulación
+        if self._playing and self.df is not None:
+            t_now, offset = self.controls.sim_elapsed()
+            if t_now is not None and t_now + offset >= self._t0:
+                due = int((t_now + offset - self._t0) // self._interval) + 1
+                self.current_row = min(len(self.df), self._row0 + due)
+            if self.current_row >= len(self.df):
+                self._playing = False
+        return self.current_row
 
-        self.is_playing = False
+    @property
+    def is_playing(self) -> bool:
+        self._sync()
+        return self._playing
 
     def pause(self) -> None:
-        """Pausa la reproduccion."""
-        self._paused.clear()
+        """Pausa la reproduccion: descarta las filas aún no aplicadas."""
+        self._sync()
+        self.controls.clear_schedule()
+        self._playing = False
 
     def resume(self) -> None:
-        """Reanuda la reproduccion."""
-        self._paused.set()
+        """Reanuda la reproduccion desde la fila actual."""
+        self.start()
 
     def stop(self) -> None:
         """Detiene la reproduccion completamente."""
-        self._stop_event.set()
-        self._paused.set()  # Desbloquear si esta pausado para que el hilo termine
-        self.is_playing = False
+        self.pause()
 
     def reset(self) -> None:
         """Detiene y reinicia al inicio del archivo."""
@@ -74,11 +106,12 @@ class FilePlayerManager:
     def progress(self) -> Tuple[int, int]:
         """Retorna (fila_actual, total_filas)."""
         total = len(self.df) if self.df is not None else 0
-        return self.current_row, total
+        return self._sync(), total
 
     @property
     def current_time(self) -> str:
         """Retorna el timestamp de la fila actual del parquet."""
+        self._sync()
         if self.df is None or self.current_row == 0:
             return "--:--"
         idx = min(self.current_row - 1, len(self.df) - 1)
@@ -0,0 +1,291 @@
+from statistics import NormalDist
+from typing import Optional, Tuple
+
+import numpy as np
+
+from config.settings import ml_config
+
+# Celdas (muestra × árbol) por bloque al trazar caminos para la atribución
+_TRACE_CELLS = 16384
+
+
+def average_path_length(n) -> np.ndarray:
+    """c(n): longitud media de una búsqueda fallida en un BST de n nodos."""
+    n = np.asarray(n, dtype=np.float64)
+    out = np.zeros_like(n)
+    out[n == 2] = 1.0
+    big = n > 2
+    out[big] = 2.0 * (np.log(n[big] - 1.0) + np.euler_gamma) - 2.0 * (n[big] - 1.0) / n[big]
+    return out
+
+
+class FlatForest:
+    """Isolation Forest aplanado en arreglos NumPy contiguos.
+
+    Todos los árboles comparten arreglos de nodos (hijos con índice global,
+    feature, umbral y valor de hoja = profundidad + c(n_muestras_hoja)), de
+    modo que se recorren vectorizados sobre (muestras × árboles) sin sklearn.
+    Las entradas se convierten a float32 como hace sklearn, así que las
+    hojas alcanzadas y los scores coinciden con `decision_function`.
+
+    El modo de salida anticipada evalúa los árboles por bloques y se detiene,
+    por muestra, cuando la media parcial de longitudes de camino queda a un
+    lado del umbral con la confianza pedida:
+
+        anomalía  <=>  decision < 0  <=>  E[h(x)] < h* = -c(psi) * log2(-offset_)
+    """
+
+    def __init__(self, left: np.ndarray, right: np.ndarray, feature: np.ndarray,
+                 threshold: np.ndarray, value: np.ndarray, roots: np.ndarray,
+                 max_samples: int, offset: float, max_depth: int,
+                 children: Optional[np.ndarray] = None):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.roots = roots
+        self.n_trees = len(roots)
+        self.max_samples = max_samples
+        self.offset = float(offset)
+        self.max_depth = int(max_depth)
+        self.c_norm = float(average_path_length([max_samples])[0])
+        # Longitud media de camino en el umbral de decisión
+        self.h_star = -self.c_norm * np.log2(-self.offset)
+        # Hijos intercalados [izq, der] por nodo; las hojas apuntan a sí
+        # mismas, así el recorrido son max_depth pasos sin máscaras.
+        # Un artefacto mapeado en memoria ya los trae precalculados.
+        if children is None:
+            is_leaf = left < 0
+            own = np.arange(len(left), dtype=np.int32)
+            children = np.column_stack([np.where(is_leaf, own, left),
+                                        np.where(is_leaf, own, right)]).ravel()
+        self._children = children
+        self._gains = None  # Ganancias por arista para la atribución (diferidas)
+
+    @classmethod
+    def from_sklearn(cls, model) -> 'FlatForest':
+        """Aplana un IsolationForest entrenado de sklearn."""
+        lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+        base = 0
+        max_depth = 0
+        for tree, feats in zip(model.estimators_, model.estimators_features_):
+            t = tree.tree_
+            feats = np.asarray(feats)
+            is_leaf = t.children_left < 0
+            depth = t.compute_node_depths() - 1  # Aristas desde la raíz
+
+            lefts.append(np.where(is_leaf, -1, t.children_left + base))
+            rights.append(np.where(is_leaf, -1, t.children_right + base))
+            # Índice de feature del espacio de entrada (submuestreo de features)
+            features.append(np.where(is_leaf, 0, feats[np.maximum(t.feature, 0)]))
+            thresholds.append(t.threshold)
+            values.append(depth + average_path_length(t.n_node_samples))
+            roots.append(base)
+            base += t.node_count
+            max_depth = max(max_depth, int(depth.max()))
+
+        return cls(
+            left=np.concatenate(lefts).astype(np.int32),
+            right=np.concatenate(rights).astype(np.int32),
+            feature=np.concatenate(features).astype(np.int32),
+            threshold=np.concatenate(thresholds).astype(np.float64),
+            value=np.concatenate(values).astype(np.float64),
+            roots=np.asarray(roots, dtype=np.int32),
+            max_samples=int(model.max_samples_),
+            offset=float(model.offset_),
+            max_depth=max_depth,
+        )
+
+    # ------------------------------------------------------------------
+    # Recorrido
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _prepare(X) -> np.ndarray:
+        # Misma precisión que sklearn (float32) comparada contra umbrales float64
+        return np.ascontiguousarray(np.asarray(X, dtype=np.float32).reshape(-1, np.shape(X)[-1]))
+
+    def _edge_gains(self) -> np.ndarray:
+        """Ganancia de aislamiento de cada arista, intercalada como `_children`.
+
+        c(n_padre) - c(n_hijo): cuánto acorta el corte la longitud esperada
+        de camino restante. Un corte equilibrado aporta ~1.4; uno que separa
+        la muestra del grueso de los datos, casi c(n_padre). Las hojas tienen
+        ganancia 0. c(n) = valor - profundidad para cualquier nodo, así que
+        sale de los arreglos del bosque sin más datos del modelo.
+        """
+        if self._gains is None:
+            n_nodes = len(self.value)
+            own = np.arange(n_nodes)
+            left, right = self._children[0::2], self._children[1::2]
+            internal = left != own
+            depth = np.zeros(n_nodes)
+            for _ in range(self.max_depth):
+                depth[left[internal]] = depth[internal] + 1
+                depth[right[internal]] = depth[internal] + 1
+            c = self.value - depth
+            gains = np.zeros((n_nodes, 2))
+            gains[internal, 0] = c[internal] - c[left[internal]]
+            gains[internal, 1] = c[internal] - c[right[internal]]
+            self._gains = gains.ravel()
+        return self._gains
+
+    def _leaves(self, X: np.ndarray, trees: np.ndarray,
+                trace: Optional[Tuple[np.ndarray, np.ndarray]] = None) -> np.ndarray:
+        """Nodo hoja alcanzado por cada muestra en cada árbol, forma (S, K).
+
+        Con `trace` = (features, ganancias), arreglos (max_depth, S, K), guarda
+        en el mismo recorrido la feature cortada y la ganancia de cada paso.
+        """
+        n_features = X.shape[1]
+        flat_x = X.ravel()
+        row_offset = (np.arange(len(X), dtype=np.int64) * n_features)[:, None]
+        node = np.broadcast_to(self.roots[trees], (len(X), len(trees))).copy()
+        gains = None if trace is None else self._edge_gains()
+        for depth in range(self.max_depth):
+            feature = self.feature[node]
+            x = flat_x[row_offset + feature]
+            edge = 2 * node + (x > self.threshold[node])
+            if gains is not None:
+                trace[0][depth] = feature
+                np.take(gains, edge, out=trace[1][depth])
+            node = self._children[edge]
+        return node
+
+    def _attribution_terms(self, X: np.ndarray, trees: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # (h por muestra y árbol, ganancia de aislamiento por feature sumada sobre árboles)
+        S, K, F = len(X), len(trees), X.shape[1]
+        features = np.empty((self.max_depth, S, K), dtype=np.int32)
+        gains = np.empty((self.max_depth, S, K))
+        h = self.value[self._leaves(X, trees, (features, gains))]
+        index = features + (np.arange(S, dtype=np.int32) * F)[None, :, None]
+        terms = np.bincount(index.ravel(), gains.ravel(), minlength=S * F)
+        return h, terms.reshape(S, F)
+
+    @staticmethod
+    def _normalize(attribution: np.ndarray) -> np.ndarray:
+        total = attribution.sum(axis=1, keepdims=True)
+        return np.divide(attribution, total, out=np.zeros_like(attribution), where=total > 0)
+
+    def path_lengths(self, X, trees: Optional[np.ndarray] = None) -> np.ndarray:
+        """h(x) por muestra y árbol, forma (S, K)."""
+        X = self._prepare(X)
+        trees = np.arange(self.n_trees) if trees is None else np.asarray(trees)
+        return self.value[self._leaves(X, trees)]
+
+    def _decision_from_mean(self, mean_path: np.ndarray) -> np.ndarray:
+        return -(2.0 ** (-mean_path / self.c_norm)) - self.offset
+
+    def score_samples(self, X) -> np.ndarray:
+        """Igual que IsolationForest.score_samples (todos los árboles)."""
+        return -(2.0 ** (-self.path_lengths(X).mean(axis=1) / self.c_norm))
+
+    def decision_function(self, X) -> np.ndarray:
+        """Igual que IsolationForest.decision_function (todos los árboles)."""
+        return self._decision_from_mean(self.path_lengths(X).mean(axis=1))
+
+    def decision_attribution(self, X) -> Tuple[np.ndarray, np.ndarray]:
+        """decision_function y atribución por feature en un solo recorrido.
+
+        Cada corte del camino de aislamiento suma a la feature que corta su
+        ganancia c(n_padre) - c(n_hijo) (ver `_edge_gains`): en una anomalía
+        domina el corte que la separa del resto. La suma sobre árboles se
+        normaliza por muestra, así que cada fila suma 1.
+
+        Returns: (decision, atribución (S, n_features))
+        """
+        X = self._prepare(X)
+        # Bloques de árboles de ~16k (muestra, árbol): las trazas caben en caché
+        chunk = max(1, min(self.n_trees, _TRACE_CELLS // max(len(X), 1)))
+        total = np.zeros(len(X))
+        attribution = np.zeros(X.shape)
+        for start in range(0, self.n_trees, chunk):
+            h, terms = self._attribution_terms(X, np.arange(start, min(start + chunk, self.n_trees)))
+            total += h.sum(axis=1)
+            attribution += terms
+        return self._decision_from_mean(total / self.n_trees), self._normalize(attribution)
+
+    def decision_early(self, X, confidence: float = None, chunk: int = None,
+                       min_trees: int = None, exact: bool = False,
+                       exact_band: float = None,
+                       attribute: bool = False, threshold=0.0) -> Tuple[np.ndarray, ...]:
+        """Score con salida anticipada por muestra.
+
+        Tras cada bloque de árboles, una muestra se da por decidida si
+        |media parcial - h_t| supera la cota z * s / sqrt(m) * sqrt(1 - m/T)
+        (aproximación normal con corrección de población finita) y su score
+        parcial está fuera de la banda |decision - t| < exact_band, donde t
+        es el umbral de decisión y h_t la longitud media de camino que le
+        corresponde (h* para t = 0). Las muestras cercanas al umbral
+        recorren todos los árboles y obtienen el score exacto; las decididas
+        reportan el score de su media parcial.
+
+        Args:
+            confidence: Probabilidad de decidir el mismo lado que el bosque completo
+            chunk: Árboles evaluados por bloque
+            min_trees: Árboles mínimos antes de permitir la salida
+            exact: Evaluar todos los árboles para todas las muestras
+            exact_band: Semiancho de la banda de score siempre exacta
+            attribute: Acumular también la atribución por feature de los
+                       árboles evaluados (ver `decision_attribution`)
+            threshold: Umbral de decisión: escalar, (S,) por muestra o (k, S)
+                       si la muestra debe quedar del lado correcto de k umbrales
+        Returns: (decision, árboles evaluados por muestra[, atribución])
+        """
+        X = self._prepare(X)
+        n, T = len(X), self.n_trees
+        # En lotes pequeños el costo por bloque supera al de los árboles ahorrados
+        if exact or n < max(1, ml_config.EARLY_EXIT_MIN_BATCH):
+            used = np.full(n, T, dtype=np.int32)
+            if attribute:
+                scores, attribution = self.decision_attribution(X)
+                return scores, used, attribution
+            return self.decision_function(X), used
+
+        confidence = ml_config.EARLY_EXIT_CONFIDENCE if confidence is None else confidence
+        chunk = chunk or ml_config.EARLY_EXIT_CHUNK
+        min_trees = ml_config.EARLY_EXIT_MIN_TREES if min_trees is None else min_trees
+        exact_band = ml_config.EARLY_EXIT_EXACT_BAND if exact_band is None else exact_band
+        z = NormalDist().inv_cdf(0.5 + confidence / 2.0)
+        # Umbrales (k, n) y su longitud media de camino: decision(h_t) = t
+        thresholds = np.atleast_2d(np.asarray(threshold, dtype=np.float64))
+        thresholds = np.broadcast_to(thresholds, (len(thresholds), n))
+        h_t = -self.c_norm * np.log2(-(self.offset + thresholds))
+
+        total = np.zeros(n)
+        total_sq = np.zeros(n)
+        used = np.zeros(n, dtype=np.int32)
+        attribution = np.zeros(X.shape) if attribute else None
+        active = np.arange(n)
+
+        for start in range(0, T, chunk):
+            trees = np.arange(start, min(start + chunk, T))
+            if attribute:
+                h, terms = self._attribution_terms(X[active], trees)
+                attribution[active] += terms
+            else:
+                h = self.value[self._leaves(X[active], trees)]
+            total[active] += h.sum(axis=1)
+            total_sq[active] += (h * h).sum(axis=1)
+            used[active] += len(trees)
+
+            m = float(used[active[0]])  # Todas las activas llevan los mismos árboles
+            if m >= T:
+                break
+            if m < min_trees:
+                continue
+            mean = total[active] / m
+            var = np.maximum(total_sq[active] / m - mean * mean, 0.0) * m / max(m - 1.0, 1.0)
+            margin = z * np.sqrt(var / m) * np.sqrt(1.0 - m / T)
+            undecided = ((np.abs(mean - h_t[:, active]) <= margin).any(axis=0)
+                         | (np.abs(self._decision_from_mean(mean) - thresholds[:, active])
+                            < exact_band).any(axis=0))
+            active = active[undecided]
+            if len(active) == 0:
+                break
+
+        scores = self._decision_from_mean(total / used)
+        if attribute:
+            return scores, used, self._normalize(attribution)
+        return scores, used
@@ -1,45 +1,185 @@
 import os
 #from tkinter.font import NORMAL
-import joblib
 import numpy as np
 from typing import Tuple, Optional
 
-from config.settings import ml_config, physics_config
+from config.settings import calibration_config, ml_config, physics_config, router_config
+from core.calibration import ScoreCalibrator
+from core.forest import FlatForest
+from core.profiler import traced
+from core.telemetry import StatusCode
+
+# Orden de las features del modelo (y de la atribución por feature)
+FEATURE_LABELS = ('Viento', 'RPM', 'Potencia', 'Densidad')
+
+
+# Umbrales de decisión de un subconjunto de muestras (última dimensión)
+def _select(points, index):
+    return points if np.ndim(points) == 0 else np.asarray(points)[..., index]
 
 
 class MLInferenceEngine:
     # Motor de inferencia ML para detección de anomalías en turbinas
     
-    def __init__(self):
+    # Args:
+    #     calibrate: Calibración en línea del umbral por régimen de viento
+    #                (None = CalibrationConfig.ENABLED). Los barridos offline la
+    #                desactivan para que el resultado no dependa del orden.
+    def __init__(self, calibrate: Optional[bool] = None):
         self.scaler = None
         self.model = None
+        self.forest: Optional[FlatForest] = None
         self.is_active = False
+        # Árboles evaluados / muestras puntuadas (salida anticipada)
+        self.trees_evaluated = 0
+        self.samples_scored = 0
+        if calibrate is None:
+            calibrate = calibration_config.ENABLED
+        self.calibrator: Optional[ScoreCalibrator] = ScoreCalibrator() if calibrate else None
         self._load_models()
+        # Bosques por régimen delante del global (None = solo el global)
+        self.router = None
+        if router_config.ENABLED and self.is_active:
+            from core.regime_router import RegimeRouter  # Diferido: permite `python -m core.regime_router`
+            self.router = RegimeRouter.load_default()
     
     def _load_models(self) -> None:
         # Carga los modelos ML desde disco
         try:
+            if ml_config.FOREST_BACKEND == 'flat' and self._load_artifact():
+                self.is_active = True
+                print("Modelos de IA cargados correctamente (artefacto).")
+                return
+            
+            # Respaldo: .pkl de sklearn (importa sklearn y deserializa el modelo)
+            import joblib
+            
             scaler_path = os.path.join(ml_config.MODEL_DIR, ml_config.SCALER_FILE)
             model_path = os.path.join(ml_config.MODEL_DIR, ml_config.MODEL_FILE)
             
             self.scaler = joblib.load(scaler_path)
             self.model = joblib.load(model_path)
+            if ml_config.FOREST_BACKEND == 'flat':
+                self.forest = FlatForest.from_sklearn(self.model)
             self.is_active = True
             print("Modelos de IA cargados correctamente.")
         except Exception as e:
             self.is_active = False
             print(f"No se cargó la IA (Error: {e}). Modo monitoreo activado.")
     
+    # Abre el artefacto mapeado en memoria si existe y corresponde a los .pkl
+    # Returns: True si se cargó; False para caer a joblib
+    def _load_artifact(self) -> bool:
+        from core import model_artifact  # Diferido: permite `python -m core.model_artifact`
+        
+        path = model_artifact.default_path()
+        if not os.path.exists(os.path.join(path, model_artifact.MANIFEST)):
+            return False
+        try:
+            if ml_config.ARTIFACT_VERIFY and model_artifact.is_stale(path):
+                print(f"Artefacto {path} desactualizado respecto a los .pkl; se usa joblib.")
+                return False
+            artifact = model_artifact.load_artifact(path, verify=ml_config.ARTIFACT_VERIFY)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Artefacto {path} inválido ({e}); se usa joblib.")
+            return False
+        self.scaler = artifact.scaler
+        self.forest = artifact.forest
+        return True
+    
+    # Score del bosque para features ya normalizadas (N, 4)
+    # Args:
+    #     features_scaled: Features normalizadas
+    #     exact: Evaluar todos los árboles aunque esté activa la salida anticipada
+    #     attribution: Arreglo (N, 4) a llenar con la atribución por feature,
+    #                  calculada en el mismo recorrido (queda en 0 con sklearn)
+    #     points: Umbral(es) de decisión para la salida anticipada: escalar,
+    #             (N,) o (k, N); ver FlatForest.decision_early
+    # Returns: decision_function (< 0 = anomalía)
+    def _decision(self, features_scaled: np.ndarray, exact: bool = False,
+                  attribution: Optional[np.ndarray] = None, points=0.0) -> np.ndarray:
+        n = len(features_scaled)
+        # Lotes grandes: el recorrido compilado de sklearn es más rápido
+        if self.forest is None or (self.model is not None and n > ml_config.FLAT_MAX_BATCH):
+            scores = self.model.decision_function(features_scaled)
+            used = len(self.model.estimators_) * len(scores)
+        elif n > ml_config.FLAT_MAX_BATCH:
+            # Sin sklearn (artefacto): por tramos para acotar la memoria (S × árboles)
+            step = ml_config.FLAT_MAX_BATCH
+            return np.concatenate([
+                self._decision(features_scaled[i:i + step], exact,
+                               None if attribution is None else attribution[i:i + step],
+                               _select(points, slice(i, i + step)))
+                for i in range(0, n, step)])
+        elif ml_config.EARLY_EXIT and not exact:
+            if attribution is None:
+                scores, trees = self.forest.decision_early(features_scaled, threshold=points)
+            else:
+                scores, trees, attribution[:] = self.forest.decision_early(
+                    features_scaled, attribute=True, threshold=points)
+            used = int(trees.sum())
+        else:
+            if attribution is None:
+                scores = self.forest.decision_function(features_scaled)
+            else:
+                scores, attribution[:] = self.forest.decision_attribution(features_scaled)
+            used = self.forest.n_trees * len(scores)
+        self.trees_evaluated += used
+        self.samples_scored += len(scores)
+        return scores
+    
+    # Score de features crudas (N, 4): bosque del régimen si hay enrutador,
+    # y el global para los frames sin régimen
+    def _score(self, features: np.ndarray, exact: bool = False,
+               attribution: Optional[np.ndarray] = None, points=0.0) -> np.ndarray:
+        if self.router is None:
+            return self._decision(self.scaler.transform(features), exact, attribution, points)
+        
+        if len(features) == 1:
+            regime = self.router.route_one(features[0, 0], features[0, 1])
+            if regime < 0:
+                return self._decision(self.scaler.transform(features), exact, attribution)
+            self.trees_evaluated += int(self.router.n_trees[regime])
+            self.samples_scored += 1
+            return self.router.decision(features, np.array([regime]), attribution)
+        
+        regimes = self.router.route(features[:, 0], features[:, 1])
+        scores = np.empty(len(features))
+        routed = regimes >= 0
+        for mask, is_routed in ((~routed, False), (routed, True)):
+            if not mask.any():
+                continue
+            part = None if attribution is None else np.zeros((int(mask.sum()), features.shape[1]))
+            if is_routed:
+                scores[mask] = self.router.decision(features[mask], regimes[mask], part)
+                self.trees_evaluated += int(self.router.n_trees[regimes[mask]].sum())
+                self.samples_scored += int(mask.sum())
+            else:
+                scores[mask] = self._decision(self.scaler.transform(features[mask]), exact, part,
+                                              _select(points, mask))
+            if part is not None:
+                attribution[mask] = part
+        return scores
+    
+    # Promedio de árboles evaluados por muestra desde el arranque
+    def average_trees(self) -> float:
+        return self.trees_evaluated / self.samples_scored if self.samples_scored else 0.0
+    
     # Predice si la operación es normal o anómala
     # Args:
     #     wind_speed: Velocidad del viento en m/s
     #     generator_rpm: Velocidad del generador en RPM
     #     power_kw: Potencia en kW
-    # Returns: Tupla (status, score)
-    def predict( self, wind_speed: float, generator_rpm: float, power_kw: float) -> Tuple[str, float]:
+    #     exact: Score exacto con todos los árboles
+    #     explain: Devolver también la atribución por feature (MLConfig.ATTRIBUTION)
+    # Returns: Tupla (status, score) con status como StatusCode; con explain,
+    #          (status, score, atribución (4,) viento/rpm/potencia/densidad, suma 1)
+    @traced('ml.predict')
+    def predict( self, wind_speed: float, generator_rpm: float, power_kw: float, exact: bool = False, explain: bool = False) -> Tuple:
+        attribution = np.zeros((1, len(FEATURE_LABELS)))
         
         if not self.is_active:
-            return "N/A", 0.0
+            return (StatusCode.NA, 0.0, attribution[0]) if explain else (StatusCode.NA, 0.0)
         
         try:
             # Preparar características
@@ -50,26 +190,80 @@ class MLInferenceEngine:
                 ml_config.AIR_DENSITY
             ]])
             
-            # Normalizar
-            features_scaled = self.scaler.transform(features)
+            # decision_function < 0 equivale a predict == -1 (anomalía)
+            out = attribution if explain and ml_config.ATTRIBUTION else None
+            # Un solo frame se evalúa siempre con todos los árboles (EARLY_EXIT_MIN_BATCH)
+            anomaly_score = float(self._score(features, exact, out)[0])
+            
+            threshold = 0.0
+            if self.calibrator is not None:
+                if calibration_config.APPLY:
+                    threshold = self.calibrator.threshold_one(wind_speed)
+                self.calibrator.update_one(wind_speed, anomaly_score)
+            
+            status = StatusCode.ANOMALY if anomaly_score < threshold else StatusCode.NORMAL
+            return (status, anomaly_score, attribution[0]) if explain else (status, anomaly_score)
+            
+        except Exception as e:
+            print(f"Error en inferencia ML: {e}")
+            return (StatusCode.ERROR, 0.0, np.zeros(len(FEATURE_LABELS))) if explain else (StatusCode.ERROR, 0.0)
+    
+    # Predice un lote de frames de una sola vez
+    # Args:
+    #     wind_speed, generator_rpm, power_kw: Arreglos de longitud N
+    #     exact: Scores exactos con todos los árboles
+    #     explain: Devolver también la atribución por feature (N, 4)
+    # Returns: Tupla (status, score) como arreglos (uint8 StatusCode, float64);
+    #          con explain, (status, score, atribución)
+    @traced('ml.predict_batch')
+    def predict_batch(self, wind_speed: np.ndarray, generator_rpm: np.ndarray, power_kw: np.ndarray, exact: bool = False, explain: bool = False) -> Tuple:
+        n = len(generator_rpm)
+        attribution = np.zeros((n, len(FEATURE_LABELS)))
+        
+        if not self.is_active:
+            status, anomaly_score = np.full(n, StatusCode.NA, dtype=np.uint8), np.zeros(n)
+            return (status, anomaly_score, attribution) if explain else (status, anomaly_score)
+        
+        try:
+            features = np.column_stack([
+                np.broadcast_to(wind_speed, (n,)),
+                generator_rpm,
+                power_kw,
+                np.full(n, ml_config.AIR_DENSITY)
+            ])
+            # Umbral vigente por régimen antes de incorporar el lote. La salida
+            # anticipada decide respecto del umbral aplicado y, si la calibración
+            # solo se estima, también del calibrado: así los cuantiles reciben
+            # scores del lado correcto de su propia estimación.
+            threshold, points = 0.0, 0.0
+            if self.calibrator is not None:
+                calibrated = self.calibrator.thresholds(features[:, 0])
+                if calibration_config.APPLY:
+                    threshold = points = calibrated
+                else:
+                    points = np.stack([np.zeros(n), calibrated])
             
-            # Predecir (-1: Anomalía, 1: Normal)
-            prediction = self.model.predict(features_scaled)[0]
-            anomaly_score = self.model.decision_function(features_scaled)[0]
+            # decision_function < 0 equivale a predict == -1
+            out = attribution if explain and ml_config.ATTRIBUTION else None
+            anomaly_score = self._score(features, exact, out, points)
+            if self.calibrator is not None:
+                self.calibrator.update(features[:, 0], anomaly_score)
             
-            status = "ANOMALÍA" if prediction == -1 else "NORMAL"
-            return status, anomaly_score
+            status = np.where(anomaly_score < threshold, StatusCode.ANOMALY, StatusCode.NORMAL).astype(np.uint8)
             
         except Exception as e:
             print(f"Error en inferencia ML: {e}")
-            return "ERR_ML", 0.0
+            status, anomaly_score = np.full(n, StatusCode.ERROR, dtype=np.uint8), np.zeros(n)
+            attribution[:] = 0.0
+        return (status, anomaly_score, attribution) if explain else (status, anomaly_score)
     
-    # Convierte unidades físicas para el modelo ML
+    # Convierte unidades físicas para el modelo ML (escalares o arreglos)
     # Args:
     #     wm_rad_s: Velocidad angular en rad/s
     #     p_watts: Potencia en Watts
     # Returns: Tupla (rpm, kw)
-    def convert_units(self, wm_rad_s: float, p_watts: float) -> Tuple[float, float]:
+    @staticmethod
+    def convert_units(wm_rad_s, p_watts):
         rpm = wm_rad_s * physics_config.RAD_TO_RPM
         kw = p_watts / physics_config.WATTS_TO_KW
         return rpm, kw
@@ -0,0 +1,260 @@
+"""Artefacto de modelo de carga rápida: scaler + bosque aplanado en .npy.
+
+Un directorio con un `.npy` por arreglo y un `manifest.json` con la versión
+del formato, dtype/forma y sha256 de cada arreglo, los parámetros escalares
+del bosque y el sha256 de los `.pkl` de origen. Se carga con
+`np.load(mmap_mode='r')`: sin sklearn ni unpickle, y los procesos que abren
+el mismo artefacto comparten las páginas del page cache en lugar de tener
+cada uno su copia del modelo.
+
+    python3 -m core.model_artifact export            # desde MLConfig
+    python3 -m core.model_artifact info modelos_exportados/turbina_v1
+    python3 -m core.model_artifact verify modelos_exportados/turbina_v1
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from config.settings import ml_config
+from core.forest import FlatForest
+
+FORMAT = 'aeolus-iforest'
+FORMAT_VERSION = 1
+MANIFEST = 'manifest.json'
+
+# Arreglos del artefacto: (nombre, dtype). Las hojas de `children` apuntan a sí mismas
+ARRAYS = (
+    ('scaler_mean', '<f8'),
+    ('scaler_scale', '<f8'),
+    ('children', '<i4'),
+    ('feature', '<i4'),
+    ('threshold', '<f8'),
+    ('value', '<f8'),
+    ('roots', '<i4'),
+)
+
+
+class ArrayScaler:
+    """StandardScaler sin sklearn: (X - mean) / scale.
+
+    Expone `mean_`, `scale_` y `feature_names_in_` como el scaler original
+    para que el código que los consulta no cambie.
+    """
+
+    def __init__(self, mean: np.ndarray, scale: np.ndarray,
+                 feature_names: Optional[List[str]] = None):
+        self.mean_ = mean
+        self.scale_ = scale
+        self.feature_names_in_ = np.asarray(feature_names or [], dtype=object)
+        self.n_features_in_ = len(mean)
+
+    def transform(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float64)
+        # Mismo orden de operaciones que StandardScaler (resta y luego división)
+        return (X - self.mean_) / self.scale_
+
+
+class ModelArtifact(NamedTuple):
+    scaler: ArrayScaler
+    forest: FlatForest
+    manifest: dict
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def default_path() -> str:
+    return os.path.join(ml_config.MODEL_DIR, ml_config.ARTIFACT_DIR)
+
+
+def source_paths() -> Dict[str, str]:
+    """Rutas de los .pkl de sklearn de los que sale el artefacto."""
+    return {
+        'scaler': os.path.join(ml_config.MODEL_DIR, ml_config.SCALER_FILE),
+        'model': os.path.join(ml_config.MODEL_DIR, ml_config.MODEL_FILE),
+    }
+
+
+def export_artifact(scaler, model, out_dir: str = None,
+                    sources: Optional[Dict[str, str]] = None) -> dict:
+    """Escribe el artefacto de un scaler + IsolationForest de sklearn.
+
+    El directorio se arma en una carpeta temporal y se reemplaza al final,
+    así un proceso que lo esté abriendo nunca ve un artefacto a medias.
+
+    Args:
+        scaler: StandardScaler entrenado
+        model: IsolationForest entrenado
+        out_dir: Directorio destino (por defecto MLConfig.ARTIFACT_DIR)
+        sources: {'scaler': ruta, 'model': ruta} de los .pkl para registrar su sha256
+    Returns: Manifiesto escrito
+    """
+    out_dir = out_dir or default_path()
+    forest = FlatForest.from_sklearn(model)
+    arrays = {
+        'scaler_mean': scaler.mean_,
+        'scaler_scale': scaler.scale_,
+        'children': forest._children,
+        'feature': forest.feature,
+        'threshold': forest.threshold,
+        'value': forest.value,
+        'roots': forest.roots,
+    }
+
+    tmp_dir = out_dir.rstrip(os.sep) + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    entries = {}
+    for name, dtype in ARRAYS:
+        arr = np.ascontiguousarray(arrays[name], dtype=dtype)
+        path = os.path.join(tmp_dir, name + '.npy')
+        np.save(path, arr)
+        entries[name] = {'dtype': dtype, 'shape': list(arr.shape), 'sha256': _sha256(path)}
+
+    manifest = {
+        'format': FORMAT,
+        'format_version': FORMAT_VERSION,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'feature_names': [str(f) for f in getattr(scaler, 'feature_names_in_', [])],
+        'forest': {
+            'n_trees': forest.n_trees,
+            'n_nodes': int(len(forest.value)),
+            'max_samples': forest.max_samples,
+            'offset': forest.offset,
+            'max_depth': forest.max_depth,
+            'contamination': getattr(model, 'contamination', None),
+        },
+        'arrays': entries,
+        'sources': {
+            key: {'file': os.path.basename(path), 'sha256': _sha256(path)}
+            for key, path in (sources or {}).items() if os.path.exists(path)
+        },
+    }
+    with open(os.path.join(tmp_dir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    old_dir = None
+    if os.path.exists(out_dir):
+        old_dir = out_dir.rstrip(os.sep) + '.old'
+        shutil.rmtree(old_dir, ignore_errors=True)
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    if old_dir:
+        shutil.rmtree(old_dir, ignore_errors=True)
+    return manifest
+
+
+def read_manifest(path: str) -> dict:
+    with open(os.path.join(path, MANIFEST)) as f:
+        manifest = json.load(f)
+    if manifest.get('format') != FORMAT:
+        raise ValueError(f"{path}: no es un artefacto {FORMAT}")
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"{path}: versión de formato {manifest.get('format_version')} "
+                         f"no soportada (se espera {FORMAT_VERSION})")
+    return manifest
+
+
+def verify_artifact(path: str, manifest: dict = None) -> None:
+    """Comprueba el sha256 de cada arreglo; ValueError si alguno no coincide."""
+    manifest = manifest or read_manifest(path)
+    for name, entry in manifest['arrays'].items():
+        if _sha256(os.path.join(path, name + '.npy')) != entry['sha256']:
+            raise ValueError(f"{path}: checksum de '{name}' no coincide")
+
+
+def is_stale(path: str, sources: Optional[Dict[str, str]] = None) -> bool:
+    """True si algún .pkl de origen cambió desde que se exportó el artefacto."""
+    manifest = read_manifest(path)
+    sources = source_paths() if sources is None else sources
+    for key, entry in manifest.get('sources', {}).items():
+        src = sources.get(key)
+        if src and os.path.exists(src) and _sha256(src) != entry['sha256']:
+            return True
+    return False
+
+
+def load_artifact(path: str = None, verify: bool = True) -> ModelArtifact:
+    """Abre el artefacto con los arreglos mapeados en memoria (solo lectura).
+
+    Args:
+        path: Directorio del artefacto (por defecto MLConfig.ARTIFACT_DIR)
+        verify: Comprobar el sha256 de los arreglos antes de mapearlos
+    Returns: ModelArtifact(scaler, forest, manifest)
+    """
+    path = path or default_path()
+    manifest = read_manifest(path)
+    if verify:
+        verify_artifact(path, manifest)
+
+    arrays = {}
+    for name, dtype in ARRAYS:
+        arr = np.load(os.path.join(path, name + '.npy'), mmap_mode='r', allow_pickle=False)
+        entry = manifest['arrays'][name]
+        if arr.dtype != np.dtype(dtype) or list(arr.shape) != entry['shape']:
+            raise ValueError(f"{path}: '{name}' con dtype/forma inesperados")
+        # Vista ndarray sobre el mismo mapeo: evita el overhead de np.memmap por operación
+        arrays[name] = arr.view(np.ndarray)
+
+    meta = manifest['forest']
+    children = arrays['children']
+    forest = FlatForest(
+        # Vistas de `children`: en las hojas apuntan al propio nodo en vez de -1
+        left=children[0::2], right=children[1::2],
+        feature=arrays['feature'], threshold=arrays['threshold'],
+        value=arrays['value'], roots=arrays['roots'],
+        max_samples=int(meta['max_samples']), offset=float(meta['offset']),
+        max_depth=int(meta['max_depth']), children=children,
+    )
+    scaler = ArrayScaler(arrays['scaler_mean'], arrays['scaler_scale'],
+                         manifest.get('feature_names'))
+    return ModelArtifact(scaler, forest, manifest)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Artefacto de modelo mapeable en memoria")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+
+    p_export = sub.add_parser('export', help="Exportar desde los .pkl de sklearn")
+    p_export.add_argument('--scaler', default=source_paths()['scaler'])
+    p_export.add_argument('--model', default=source_paths()['model'])
+    p_export.add_argument('--out', default=default_path())
+
+    for name in ('info', 'verify'):
+        p = sub.add_parser(name)
+        p.add_argument('path', nargs='?', default=default_path())
+    args = parser.parse_args()
+
+    if args.cmd == 'export':
+        import joblib
+
+        scaler, model = joblib.load(args.scaler), joblib.load(args.model)
+        manifest = export_artifact(scaler, model, args.out,
+                                   sources={'scaler': args.scaler, 'model': args.model})
+        size = sum(os.path.getsize(os.path.join(args.out, f)) for f in os.listdir(args.out))
+        print(f"Artefacto escrito en {args.out}: {manifest['forest']['n_trees']} árboles, "
+              f"{manifest['forest']['n_nodes']} nodos, {size / 1024:.0f} KiB")
+    elif args.cmd == 'info':
+        manifest = read_manifest(args.path)
+        print(json.dumps({k: manifest[k] for k in ('format_version', 'created', 'feature_names',
+                                                   'forest', 'sources')}, indent=2))
+        print(f"Desactualizado respecto a los .pkl: {'sí' if is_stale(args.path) else 'no'}")
+    else:
+        verify_artifact(args.path)
+        print(f"{args.path}: checksums correctos")
+
+
+if __name__ == "__main__":
+    main()
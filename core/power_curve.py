@@ -0,0 +1,251 @@
+"""Índice de referencia de la curva de potencia construido desde data/*.parquet.
+
+Bins uniformes de viento -> cuantiles de potencia activa y velocidad del
+generador observados en el archivo SCADA. En línea, cada frame se ubica en
+su bin con una resta y una multiplicación (O(1)) y se calcula el residuo
+físico respecto a la banda [q_bajo, q_alto] del bin:
+
+    r = 0                          si q_bajo <= x <= q_alto
+    r = (x - q_alto) / ancho       si x > q_alto   (ancho = max(q_alto - q_bajo, piso))
+    r = (x - q_bajo) / ancho       si x < q_bajo
+
+Es un segundo detector junto al Isolation Forest: el bosque solo ve las
+cuatro features por separado y no detecta, p. ej., un tacómetro falseado
+hacia arriba (fdi_cybersecurity_experiment.py), que aquí queda fuera de la
+banda de su bin de viento.
+
+    python3 -m core.power_curve build
+    python3 -m core.power_curve info
+"""
+import argparse
+import glob
+import math
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.settings import file_player_config, power_curve_config
+from core.telemetry import StatusCode
+
+# Columnas del parquet en las unidades de las features del modelo
+WIND_COLUMN = 'WIND_Wind speed 10min-Aver'
+RPM_COLUMN = 'GEN_Generator speed-Aver'
+POWER_COLUMN = 'PWR_TotalActivePower-Aver'
+
+
+def load_archive(data_dir: str = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(viento, rpm, kW) de todos los parquet del archivo, sin filas incompletas."""
+    data_dir = data_dir or file_player_config.DATA_DIR
+    columns = [WIND_COLUMN, RPM_COLUMN, POWER_COLUMN]
+    frames = [pd.read_parquet(p, columns=columns)
+              for p in sorted(glob.glob(os.path.join(data_dir, '*.parquet')))]
+    if not frames:
+        raise FileNotFoundError(f"No hay archivos .parquet en {data_dir}")
+    data = pd.concat(frames).dropna().to_numpy(np.float64)
+    return data[:, 0], data[:, 1], data[:, 2]
+
+
+class PowerCurveIndex:
+    """Cuantiles de potencia y rpm por bin de viento en arreglos compactos.
+
+    `rpm_band` y `p_band` tienen forma (bins, 3): cuantil bajo, mediana y
+    cuantil alto. Los bins con menos de `min_count` muestras no tienen
+    referencia (`covered` en False) y sus frames se reportan como N/A.
+    """
+
+    def __init__(self, v0: float, bin_width: float, counts: np.ndarray,
+                 rpm_band: np.ndarray, p_band: np.ndarray, quantiles: Tuple[float, float],
+                 min_count: int, rpm_floor: float, p_floor: float):
+        self.v0 = float(v0)
+        self.bin_width = float(bin_width)
+        self.counts = np.asarray(counts, dtype=np.int64)
+        self.rpm_band = np.asarray(rpm_band, dtype=np.float64)
+        self.p_band = np.asarray(p_band, dtype=np.float64)
+        self.quantiles = (float(quantiles[0]), float(quantiles[1]))
+        self.min_count = int(min_count)
+        self.rpm_floor = float(rpm_floor)
+        self.p_floor = float(p_floor)
+        self.n_bins = len(self.counts)
+        self.covered = self.counts >= self.min_count
+        self._inv_width = 1.0 / self.bin_width
+        # Ancho de banda por bin con piso (evita dividir por ~0 en bins sin dispersión)
+        self._rpm_scale = np.maximum(self.rpm_band[:, 2] - self.rpm_band[:, 0], self.rpm_floor)
+        self._p_scale = np.maximum(self.p_band[:, 2] - self.p_band[:, 0], self.p_floor)
+        # Tabla por bin en tipos de Python para el camino escalar (sin overhead de NumPy)
+        self._table = [
+            (lo_r, hi_r, s_r, lo_p, hi_p, s_p) if ok else None
+            for ok, lo_r, hi_r, s_r, lo_p, hi_p, s_p in zip(
+                self.covered.tolist(), self.rpm_band[:, 0].tolist(), self.rpm_band[:, 2].tolist(),
+                self._rpm_scale.tolist(), self.p_band[:, 0].tolist(), self.p_band[:, 2].tolist(),
+                self._p_scale.tolist())
+        ]
+
+    @classmethod
+    def build(cls, wind: np.ndarray, rpm: np.ndarray, power_kw: np.ndarray,
+              bin_width: float = None, quantiles: Tuple[float, float] = None,
+              min_count: int = None) -> 'PowerCurveIndex':
+        """Construye el índice a partir de muestras (viento, rpm, kW)."""
+        cfg = power_curve_config
+        bin_width = bin_width or cfg.BIN_WIDTH
+        quantiles = quantiles or cfg.QUANTILES
+        min_count = cfg.MIN_COUNT if min_count is None else min_count
+
+        v0 = np.floor(wind.min() / bin_width) * bin_width
+        bins = ((wind - v0) / bin_width).astype(np.int64)
+        n_bins = int(bins.max()) + 1
+        qs = (quantiles[0], 0.5, quantiles[1])
+
+        counts = np.bincount(bins, minlength=n_bins)
+        rpm_band = np.zeros((n_bins, 3))
+        p_band = np.zeros((n_bins, 3))
+        for b in np.flatnonzero(counts):
+            sel = bins == b
+            rpm_band[b] = np.quantile(rpm[sel], qs)
+            p_band[b] = np.quantile(power_kw[sel], qs)
+
+        return cls(v0, bin_width, counts, rpm_band, p_band, quantiles,
+                   min_count, cfg.RPM_FLOOR, cfg.POWER_FLOOR)
+
+    @classmethod
+    def from_archive(cls, data_dir: str = None, **kwargs) -> 'PowerCurveIndex':
+        return cls.build(*load_archive(data_dir), **kwargs)
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+
+    def save(self, path: str = None) -> str:
+        """Guarda el índice como .npz (escritura atómica)."""
+        path = path or default_path()
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, v0=self.v0, bin_width=self.bin_width, counts=self.counts,
+                 rpm_band=self.rpm_band, p_band=self.p_band,
+                 quantiles=np.asarray(self.quantiles), min_count=self.min_count,
+                 rpm_floor=self.rpm_floor, p_floor=self.p_floor)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load_default(cls) -> Optional['PowerCurveIndex']:
+        """Índice configurado o None si está deshabilitado o no existe."""
+        if not power_curve_config.ENABLED:
+            return None
+        try:
+            index = cls.load()
+            print(f"Curva de potencia de referencia cargada ({int(index.covered.sum())} bins).")
+            return index
+        except (OSError, KeyError, ValueError) as e:
+            print(f"No se cargó la curva de potencia (Error: {e}). Detector físico inactivo.")
+            return None
+
+    @classmethod
+    def load(cls, path: str = None) -> 'PowerCurveIndex':
+        with np.load(path or default_path(), allow_pickle=False) as data:
+            return cls(float(data['v0']), float(data['bin_width']), data['counts'],
+                       data['rpm_band'], data['p_band'], tuple(data['quantiles']),
+                       int(data['min_count']), float(data['rpm_floor']),
+                       float(data['p_floor']))
+
+    # ------------------------------------------------------------------
+    # Consulta en línea
+    # ------------------------------------------------------------------
+
+    def bin_of(self, wind):
+        """Índice de bin de cada velocidad de viento (-1 fuera del rango del índice)."""
+        b = np.floor((np.asarray(wind, dtype=np.float64) - self.v0) * self._inv_width).astype(np.int64)
+        return np.where((b >= 0) & (b < self.n_bins), b, -1)
+
+    @staticmethod
+    def _band_residual(x: np.ndarray, band: np.ndarray, scale: np.ndarray) -> np.ndarray:
+        above = (x - band[:, 2]) / scale
+        below = (x - band[:, 0]) / scale
+        return np.where(above > 0, above, np.where(below < 0, below, 0.0))
+
+    def residuals(self, wind, rpm, power_kw) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Residuos normalizados de rpm y potencia respecto a la banda del bin.
+
+        Returns: (r_rpm, r_p, covered); r = 0 donde no hay referencia
+        """
+        b = self.bin_of(wind)
+        covered = (b >= 0) & self.covered[np.maximum(b, 0)]
+        idx = np.where(covered, b, 0)
+        r_rpm = self._band_residual(np.asarray(rpm, dtype=np.float64),
+                                    self.rpm_band[idx], self._rpm_scale[idx])
+        r_p = self._band_residual(np.asarray(power_kw, dtype=np.float64),
+                                  self.p_band[idx], self._p_scale[idx])
+        return np.where(covered, r_rpm, 0.0), np.where(covered, r_p, 0.0), covered
+
+    def evaluate(self, wind, rpm, power_kw, threshold: float = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Diagnóstico físico por frame (arreglos de longitud N).
+
+        Returns: (status uint8 StatusCode, residuo de mayor magnitud con signo)
+        """
+        threshold = power_curve_config.THRESHOLD if threshold is None else threshold
+        r_rpm, r_p, covered = self.residuals(np.atleast_1d(wind), np.atleast_1d(rpm),
+                                             np.atleast_1d(power_kw))
+        residual = np.where(np.abs(r_rpm) >= np.abs(r_p), r_rpm, r_p)
+        status = np.where(~covered, StatusCode.NA,
+                          np.where(np.abs(residual) > threshold,
+                                   StatusCode.ANOMALY, StatusCode.NORMAL)).astype(np.uint8)
+        return status, residual
+
+    def evaluate_one(self, wind: float, rpm: float, power_kw: float,
+                     threshold: float = None) -> Tuple[int, float]:
+        """Igual que evaluate() para un solo frame, con aritmética escalar."""
+        threshold = power_curve_config.THRESHOLD if threshold is None else threshold
+        b = math.floor((wind - self.v0) * self._inv_width)
+        entry = self._table[b] if 0 <= b < self.n_bins else None
+        if entry is None:
+            return StatusCode.NA, 0.0
+        lo_r, hi_r, s_r, lo_p, hi_p, s_p = entry
+        r_rpm = (rpm - hi_r) / s_r if rpm > hi_r else ((rpm - lo_r) / s_r if rpm < lo_r else 0.0)
+        r_p = (power_kw - hi_p) / s_p if power_kw > hi_p else (
+            (power_kw - lo_p) / s_p if power_kw < lo_p else 0.0)
+        residual = r_rpm if abs(r_rpm) >= abs(r_p) else r_p
+        status = StatusCode.ANOMALY if abs(residual) > threshold else StatusCode.NORMAL
+        return status, residual
+
+    def to_frame(self) -> pd.DataFrame:
+        """Tabla legible del índice (un bin por fila)."""
+        lo, hi = self.quantiles
+        return pd.DataFrame({
+            'v_min': self.v0 + np.arange(self.n_bins) * self.bin_width,
+            'n': self.counts,
+            f'rpm_q{lo:g}': self.rpm_band[:, 0], 'rpm_med': self.rpm_band[:, 1],
+            f'rpm_q{hi:g}': self.rpm_band[:, 2],
+            f'P_q{lo:g}': self.p_band[:, 0], 'P_med': self.p_band[:, 1],
+            f'P_q{hi:g}': self.p_band[:, 2],
+            'ref': self.covered,
+        })
+
+
+def default_path() -> str:
+    return power_curve_config.INDEX_FILE
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Índice de referencia de la curva de potencia")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_build = sub.add_parser('build', help="Construir desde data/*.parquet")
+    p_build.add_argument('--data-dir', default=file_player_config.DATA_DIR)
+    p_build.add_argument('--bin-width', type=float, default=power_curve_config.BIN_WIDTH)
+    p_build.add_argument('--out', default=default_path())
+    p_info = sub.add_parser('info')
+    p_info.add_argument('path', nargs='?', default=default_path())
+    args = parser.parse_args()
+
+    if args.cmd == 'build':
+        index = PowerCurveIndex.from_archive(args.data_dir, bin_width=args.bin_width)
+        index.save(args.out)
+        print(f"Índice escrito en {args.out}: {index.n_bins} bins de {index.bin_width:g} m/s, "
+              f"{int(index.covered.sum())} con referencia")
+    else:
+        index = PowerCurveIndex.load(args.path)
+    pd.set_option('display.width', 160)
+    print(index.to_frame().to_string(index=False, float_format=lambda v: f"{v:.4g}"))
+
+
+if __name__ == "__main__":
+    main()
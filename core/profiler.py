@@ -0,0 +1,202 @@
+"""Perfilador de muestreo y trazas del camino caliente, activables en ejecución.
+
+Cuando baja la tasa de frames hay que saber en qué estaba cada hilo: el del
+servidor TCP, el del reproductor de archivos o el script runner de
+Streamlit. `SamplingProfiler` lanza un hilo que cada ProfilerConfig.INTERVAL
+segundos lee las pilas de todos los hilos (`sys._current_frames`) y las
+acumula como pilas plegadas (`hilo;func (archivo:línea);... N`), el formato
+de flamegraph.pl, speedscope e inferno.
+
+`traced(nombre)` marca funciones del camino caliente con un span. Con las
+trazas apagadas, el envoltorio solo lee una bandera y llama a la función
+(~0.1 µs por llamada frente a ~100 µs de `predict`). Encendidas, guardan
+(inicio, duración, hilo) en un buffer acotado que se exporta en formato
+Chrome trace (chrome://tracing, Perfetto).
+
+    from core.profiler import profiler
+    profiler.start(spans=True)
+    ...
+    profiler.stop()
+    profiler.dump()          # resultados/profiles/profile_<fecha>.folded / .trace.json
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import profiler_config
+
+_tracing = False  # Bandera global leída por cada span (sin lock: un bool)
+
+
+class SamplingProfiler:
+    """Muestreo periódico de las pilas de todos los hilos y registro de spans."""
+
+    def __init__(self, interval: float = None, max_depth: int = None, span_buffer: int = None):
+        self.interval = interval or profiler_config.INTERVAL
+        self.max_depth = max_depth or profiler_config.MAX_DEPTH
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.sample_seconds = 0.0  # Tiempo gastado muestreando (costo propio)
+        self.started: Optional[float] = None
+        self.spans: deque = deque(maxlen=span_buffer or profiler_config.SPAN_BUFFER)
+        self._labels: Dict[object, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    @property
+    def tracing(self) -> bool:
+        return _tracing
+
+    def start(self, spans: bool = False) -> None:
+        """Empieza a muestrear (y a registrar spans si `spans`)."""
+        global _tracing
+        _tracing = spans
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self.started = time.time()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Detiene muestreo y spans; lo acumulado se conserva hasta `reset()`."""
+        global _tracing
+        _tracing = False
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stacks.clear()
+            self.spans.clear()
+            self.samples = 0
+            self.sample_seconds = 0.0
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (f"{code.co_name} "
+                                          f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        return label
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        batch = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            batch.append(tuple(reversed(stack)))
+        with self._lock:
+            self.stacks.update(batch)
+            self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            t0 = time.perf_counter()
+            self._sample()
+            self.sample_seconds += time.perf_counter() - t0
+
+    # ------------------------------------------------------------------
+    # Spans
+    # ------------------------------------------------------------------
+
+    def record_span(self, name: str, start_ns: int, duration_ns: int) -> None:
+        # deque.append es atómico: sin lock en el camino caliente
+        self.spans.append((name, threading.get_ident(), start_ns, duration_ns))
+
+    def span_stats(self) -> List[dict]:
+        """Por span: llamadas, total, media y máximo en ms (orden por total)."""
+        acc: Dict[str, List[float]] = {}
+        for name, _, _, duration in list(self.spans):
+            a = acc.setdefault(name, [0, 0.0, 0.0])
+            a[0] += 1
+            a[1] += duration / 1e6
+            a[2] = max(a[2], duration / 1e6)
+        rows = [{'span': name, 'calls': n, 'total_ms': total, 'mean_ms': total / n, 'max_ms': peak}
+                for name, (n, total, peak) in acc.items()]
+        return sorted(rows, key=lambda r: -r['total_ms'])
+
+    # ------------------------------------------------------------------
+    # Exportación
+    # ------------------------------------------------------------------
+
+    def folded(self) -> str:
+        """Pilas plegadas, una por línea: 'hilo;raíz;...;hoja muestras'."""
+        with self._lock:
+            items = self.stacks.most_common()
+        return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in items)
+
+    def top_functions(self, n: int = 15) -> List[Tuple[str, str, int]]:
+        """(hilo, función, muestras) con la función en la cima de la pila."""
+        leaf: Counter = Counter()
+        with self._lock:
+            for stack, count in self.stacks.items():
+                leaf[(stack[0], stack[-1])] += count
+        return [(thread, func, count) for (thread, func), count in leaf.most_common(n)]
+
+    def chrome_trace(self) -> dict:
+        """Spans en formato Chrome trace ('X' = evento con duración, en µs)."""
+        names = {t.ident: t.name for t in threading.enumerate()}
+        events = [{'name': name, 'ph': 'X', 'pid': os.getpid(), 'tid': tid,
+                   'ts': start / 1e3, 'dur': duration / 1e3}
+                  for name, tid, start, duration in list(self.spans)]
+        events += [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid,
+                    'args': {'name': names.get(tid, f"thread-{tid}")}}
+                   for tid in {e['tid'] for e in events}]
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def overhead(self) -> float:
+        """Fracción de tiempo de pared gastada muestreando desde `start()`."""
+        if not self.started:
+            return 0.0
+        return self.sample_seconds / max(time.time() - self.started, 1e-9)
+
+    def dump(self, directory: str = None) -> Tuple[str, str]:
+        """Escribe .folded y .trace.json. Retorna las dos rutas."""
+        directory = directory or profiler_config.OUT_DIR
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        with open(stem + '.folded', 'w') as f:
+            f.write(self.folded())
+        with open(stem + '.trace.json', 'w') as f:
+            json.dump(self.chrome_trace(), f)
+        return stem + '.folded', stem + '.trace.json'
+
+
+# Instancia del proceso: la comparten el servidor, los hilos y todas las sesiones
+profiler = SamplingProfiler()
+
+
+def traced(name: str):
+    """Decorador: span `name` alrededor de la función cuando las trazas están activas."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _tracing:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profiler.record_span(name, t0, time.perf_counter_ns() - t0)
+        return wrapper
+    return decorator
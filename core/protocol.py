@@ -0,0 +1,130 @@
+import struct
+from typing import NamedTuple
+
+import numpy as np
+
+from config.settings import network_config
+
+# ----------------------------------------------------------------------
+# Protocolo v2 del gateway
+#
+# v1 (S-Function actual): frame '<4d' sin cabecera, respuesta '<2d' por paso.
+# v2: cada mensaje lleva una cabecera fija seguida de K pasos:
+#
+#   magic   4s  b'AEO2'
+#   version u16 2
+#   flags   u16 (respuesta: FLAG_GAP / FLAG_REORDER)
+#   k       u32 pasos en el mensaje
+#   seq     u64 número de secuencia del primer paso
+#   t_sim   f64 tiempo de simulación del primer paso [s]
+#   dt      f64 paso de simulación [s] (paso i en t_sim + i*dt)
+#
+# Solicitud: cabecera + K * '<4d' (wm, P, V, S)
+# Respuesta: cabecera (mismos seq/t_sim/dt/k) + K * '<2d' (viento, pitch),
+#            el comando i es para el paso i del bloque siguiente
+#            (t_sim + (K + i)*dt): el cliente avanza sus próximos K pasos con
+#            esta respuesta. Con K = 1, el paso siguiente a la salida.
+#
+# La versión se negocia con los primeros bytes de la conexión: si empiezan
+# con MAGIC se habla v2; en otro caso el flujo es v1.
+# ----------------------------------------------------------------------
+
+MAGIC = b'AEO2'
+VERSION = 2
+
+HEADER = struct.Struct('<4sHHIQdd')
+HEADER_SIZE = HEADER.size
+FRAME_IN_SIZE = struct.calcsize(network_config.FORMAT_IN)
+FRAME_OUT_SIZE = struct.calcsize(network_config.FORMAT_OUT)
+
+FLAG_GAP = 0x1       # Faltan pasos entre el mensaje anterior y este
+FLAG_REORDER = 0x2   # Secuencia repetida o anterior a la esperada
+
+
+class MessageHeader(NamedTuple):
+    version: int
+    flags: int
+    k: int
+    seq: int
+    t_sim: float
+    dt: float
+
+    def step_times(self) -> np.ndarray:
+        """Tiempo de simulación de cada paso del mensaje."""
+        return self.t_sim + self.dt * np.arange(self.k)
+
+
+def detect_version(prefix: bytes) -> int:
+    """Versión del protocolo según los primeros bytes de la conexión.
+
+    Returns: 2 si empiezan con MAGIC, 1 en otro caso, 0 si aún no hay bytes suficientes
+    """
+    if len(prefix) < len(MAGIC):
+        return 0
+    return VERSION if bytes(prefix[:len(MAGIC)]) == MAGIC else 1
+
+
+def unpack_header(data) -> MessageHeader:
+    magic, version, flags, k, seq, t_sim, dt = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError(f"Cabecera v2 inválida: {magic!r}")
+    if version != VERSION:
+        raise ValueError(f"Versión de protocolo no soportada: {version}")
+    if k > network_config.MAX_BLOCK_STEPS:
+        raise ValueError(f"Bloque demasiado grande: {k} pasos")
+    return MessageHeader(version, flags, k, seq, t_sim, dt)
+
+
+def pack_request(seq: int, t_sim: float, dt: float, frames: np.ndarray) -> bytes:
+    """Mensaje de telemetría con K pasos; frames de forma (K, 4)."""
+    frames = np.ascontiguousarray(frames, dtype='<f8').reshape(-1, 4)
+    return HEADER.pack(MAGIC, VERSION, 0, len(frames), seq, t_sim, dt) + frames.tobytes()
+
+
+def pack_reply(header: MessageHeader, commands: np.ndarray, flags: int = 0) -> bytes:
+    """Respuesta única a un mensaje; commands de forma (K, 2)."""
+    commands = np.ascontiguousarray(commands, dtype='<f8').reshape(-1, 2)
+    return (HEADER.pack(MAGIC, VERSION, flags, len(commands), header.seq,
+                        header.t_sim, header.dt)
+            + commands.tobytes())
+
+
+class SequenceTracker:
+    """Detecta pasos perdidos y mensajes fuera de orden por número de secuencia."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self) -> None:
+        self.expected = None
+        self.messages = 0
+        self.steps = 0
+        self.gaps = 0
+        self.lost_steps = 0
+        self.reordered = 0
+
+    def check(self, header: MessageHeader) -> int:
+        """Registra un mensaje y retorna los flags para la respuesta."""
+        flags = 0
+        if self.expected is not None:
+            if header.seq > self.expected:
+                flags |= FLAG_GAP
+                self.gaps += 1
+                self.lost_steps += header.seq - self.expected
+            elif header.seq < self.expected:
+                flags |= FLAG_REORDER
+                self.reordered += 1
+        if self.expected is None or header.seq + header.k > self.expected:
+            self.expected = header.seq + header.k
+        self.messages += 1
+        self.steps += header.k
+        return flags
+
+    def stats(self) -> dict:
+        return {
+            'messages': self.messages,
+            'steps': self.steps,
+            'gaps': self.gaps,
+            'lost_steps': self.lost_steps,
+            'reordered': self.reordered,
+        }
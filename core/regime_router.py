@@ -0,0 +1,316 @@
+"""Enrutador por régimen de operación con bosques pequeños especializados.
+
+El Isolation Forest global cubre arranque, carga parcial y operación nominal
+con una sola frontera. Aquí cada frame se asigna a una celda de una rejilla
+uniforme viento × rpm con dos divisiones enteras y una tabla (O(1)), y la
+celda indica qué bosque compacto lo puntúa:
+
+- celda con al menos MIN_SAMPLES muestras de entrenamiento: su propio bosque;
+- celda escasa (p. ej. rpm baja con viento alto): el bosque de su franja de
+  viento, que nunca vio esa combinación y la aísla rápido;
+- franja de viento escasa: -1, el motor usa el modelo global.
+
+Cada bosque se entrena con su propio StandardScaler y `contamination`, así
+que `decision < 0` conserva el significado de anomalía. En disco es un
+directorio con `router.json` y un artefacto de core/model_artifact.py por
+régimen.
+
+    python3 -m core.regime_router build
+    python3 -m core.regime_router info
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config.settings import ml_config, router_config
+from core import model_artifact
+
+ROUTER_FORMAT = 'aeolus-regime-router'
+ROUTER_VERSION = 1
+ROUTER_MANIFEST = 'router.json'
+
+
+class RegimeRouter:
+    """Tabla (bins de viento × bins de rpm) -> régimen y un bosque por régimen.
+
+    `table[wb, rb]` es el índice del régimen en `scalers`/`forests` o -1
+    (modelo global). `info` describe cada régimen (celdas, muestras, árboles).
+    """
+
+    def __init__(self, wind_width: float, wind_bins: int, rpm_width: float, rpm_bins: int,
+                 table: np.ndarray, scalers: list, forests: list, info: List[dict]):
+        self.wind_width = float(wind_width)
+        self.wind_bins = int(wind_bins)
+        self.rpm_width = float(rpm_width)
+        self.rpm_bins = int(rpm_bins)
+        self.table = np.asarray(table, dtype=np.int16)
+        self.scalers = scalers
+        self.forests = forests
+        self.info = info
+        self.n_trees = np.array([f.n_trees for f in forests], dtype=np.int64)
+        self._inv_wind = 1.0 / self.wind_width
+        self._inv_rpm = 1.0 / self.rpm_width
+        # Tabla en listas de Python para el camino escalar
+        self._table = self.table.tolist()
+        self._fitted = None  # (scaler, model) de sklearn tras build(), para save()
+
+    @property
+    def n_regimes(self) -> int:
+        return len(self.forests)
+
+    # ------------------------------------------------------------------
+    # Construcción
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def build(cls, X: np.ndarray, wind_width: float = None, wind_bins: int = None,
+              rpm_bins: int = None, rpm_width: float = None, n_estimators: int = None,
+              max_samples: int = None, contamination: float = None,
+              min_samples: int = None, seed: int = 42) -> 'RegimeRouter':
+        """Entrena los bosques por régimen sobre features crudas (N, 4).
+
+        Args:
+            X: Features en las unidades del modelo (viento, rpm, kW, densidad)
+            rpm_width: Ancho del bin de rpm (None = percentil 95 de la rpm / rpm_bins)
+        """
+        from sklearn.ensemble import IsolationForest
+        from sklearn.preprocessing import StandardScaler
+
+        cfg = router_config
+        wind_width = wind_width or cfg.WIND_WIDTH
+        wind_bins = wind_bins or cfg.WIND_BINS
+        rpm_bins = rpm_bins or cfg.RPM_BINS
+        rpm_width = rpm_width or cfg.RPM_WIDTH or max(
+            float(np.quantile(X[:, 1], 0.95)) / rpm_bins, 1e-6)
+        n_estimators = n_estimators or cfg.N_ESTIMATORS
+        max_samples = max_samples or cfg.MAX_SAMPLES
+        contamination = contamination or cfg.CONTAMINATION
+        min_samples = cfg.MIN_SAMPLES if min_samples is None else min_samples
+
+        router = cls(wind_width, wind_bins, rpm_width, rpm_bins,
+                     np.full((wind_bins, rpm_bins), -1), [], [], [])
+        wb, rb = router.cells(X[:, 0], X[:, 1])
+
+        def fit(rows: np.ndarray):
+            data = pd.DataFrame(X[rows], columns=_feature_names())
+            scaler = StandardScaler().fit(data)
+            model = IsolationForest(n_estimators=n_estimators,
+                                    max_samples=min(max_samples, len(data)),
+                                    contamination=contamination, random_state=seed)
+            model.fit(scaler.transform(data))
+            return scaler, model
+
+        table = np.full((wind_bins, rpm_bins), -1, dtype=np.int16)
+        fitted, info = [], []
+        for w in range(wind_bins):
+            in_band = wb == w
+            dense, sparse = [], []
+            for r in range(rpm_bins):
+                rows = in_band & (rb == r)
+                if rows.sum() >= min_samples:
+                    table[w, r] = len(fitted)
+                    dense.append(len(fitted))
+                    fitted.append(fit(rows))
+                    info.append({'wind_bin': w, 'rpm_bin': r, 'samples': int(rows.sum())})
+                else:
+                    sparse.append(r)
+            if not sparse:
+                continue
+            if len(dense) == 1 and not (in_band & np.isin(rb, sparse)).any():
+                # Celdas vacías y una sola celda con datos: el bosque de la franja sería el mismo
+                table[w, sparse] = dense[0]
+            elif in_band.sum() >= min_samples:
+                # Celdas escasas de la franja: un bosque con toda la franja de viento
+                table[w, sparse] = len(fitted)
+                fitted.append(fit(in_band))
+                info.append({'wind_bin': w, 'rpm_bin': None, 'samples': int(in_band.sum())})
+
+        from core.forest import FlatForest
+
+        forests = [FlatForest.from_sklearn(model) for _, model in fitted]
+        for entry, forest in zip(info, forests):
+            entry.update({'trees': forest.n_trees, 'max_samples': forest.max_samples,
+                          'nodes': int(len(forest.value))})
+        router = cls(wind_width, wind_bins, rpm_width, rpm_bins, table,
+                     [scaler for scaler, _ in fitted], forests, info)
+        router._fitted = fitted
+        return router
+
+    # ------------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------------
+
+    def save(self, path: str = None) -> str:
+        """Escribe router.json y un artefacto por régimen (reemplazo atómico del directorio)."""
+        if self._fitted is None:
+            raise ValueError("Solo se puede guardar un enrutador recién construido")
+        path = (path or default_path()).rstrip(os.sep)
+        tmp_dir = path + '.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        regimes = []
+        for k, ((scaler, model), entry) in enumerate(zip(self._fitted, self.info)):
+            name = f'r{k}'
+            model_artifact.export_artifact(scaler, model, os.path.join(tmp_dir, name))
+            regimes.append(dict(entry, dir=name))
+        manifest = {
+            'format': ROUTER_FORMAT,
+            'format_version': ROUTER_VERSION,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'wind_width': self.wind_width, 'wind_bins': self.wind_bins,
+            'rpm_width': self.rpm_width, 'rpm_bins': self.rpm_bins,
+            'table': self.table.tolist(),
+            'regimes': regimes,
+        }
+        with open(os.path.join(tmp_dir, ROUTER_MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+        old_dir = None
+        if os.path.exists(path):
+            old_dir = path + '.old'
+            shutil.rmtree(old_dir, ignore_errors=True)
+            os.replace(path, old_dir)
+        os.replace(tmp_dir, path)
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+        return path
+
+    @classmethod
+    def load(cls, path: str = None, verify: bool = True) -> 'RegimeRouter':
+        path = path or default_path()
+        with open(os.path.join(path, ROUTER_MANIFEST)) as f:
+            manifest = json.load(f)
+        if manifest.get('format') != ROUTER_FORMAT or manifest.get('format_version') != ROUTER_VERSION:
+            raise ValueError(f"{path}: no es un enrutador {ROUTER_FORMAT} v{ROUTER_VERSION}")
+        scalers, forests = [], []
+        for entry in manifest['regimes']:
+            artifact = model_artifact.load_artifact(os.path.join(path, entry['dir']), verify)
+            scalers.append(artifact.scaler)
+            forests.append(artifact.forest)
+        table = np.asarray(manifest['table'], dtype=np.int16)
+        if table.shape != (manifest['wind_bins'], manifest['rpm_bins']) or table.max() >= len(forests):
+            raise ValueError(f"{path}: tabla de regímenes inconsistente")
+        info = [{k: v for k, v in entry.items() if k != 'dir'} for entry in manifest['regimes']]
+        return cls(manifest['wind_width'], manifest['wind_bins'], manifest['rpm_width'],
+                   manifest['rpm_bins'], table, scalers, forests, info)
+
+    @classmethod
+    def load_default(cls) -> Optional['RegimeRouter']:
+        """Enrutador configurado o None si está deshabilitado o no existe."""
+        if not router_config.ENABLED:
+            return None
+        try:
+            router = cls.load(verify=ml_config.ARTIFACT_VERIFY)
+            print(f"Enrutador por régimen cargado ({router.n_regimes} bosques).")
+            return router
+        except (OSError, KeyError, ValueError) as e:
+            print(f"No se cargó el enrutador por régimen (Error: {e}). Se usa el modelo global.")
+            return None
+
+    # ------------------------------------------------------------------
+    # Enrutamiento y score
+    # ------------------------------------------------------------------
+
+    def cells(self, wind, rpm) -> Tuple[np.ndarray, np.ndarray]:
+        """(bin de viento, bin de rpm) de cada frame; los bins extremos son abiertos."""
+        wb = np.floor(np.asarray(wind, dtype=np.float64) * self._inv_wind).astype(np.int64)
+        rb = np.floor(np.asarray(rpm, dtype=np.float64) * self._inv_rpm).astype(np.int64)
+        return np.clip(wb, 0, self.wind_bins - 1), np.clip(rb, 0, self.rpm_bins - 1)
+
+    def route(self, wind, rpm) -> np.ndarray:
+        """Régimen de cada frame (-1 = modelo global)."""
+        return self.table[self.cells(wind, rpm)]
+
+    def route_one(self, wind: float, rpm: float) -> int:
+        wb = min(max(int(wind * self._inv_wind), 0), self.wind_bins - 1)
+        rb = min(max(int(rpm * self._inv_rpm), 0), self.rpm_bins - 1)
+        return self._table[wb][rb]
+
+    def decision(self, X: np.ndarray, regimes: np.ndarray,
+                 attribution: Optional[np.ndarray] = None) -> np.ndarray:
+        """decision_function de cada fila con el bosque de su régimen (regimes >= 0).
+
+        Con `attribution` (N, n_features) la llena con la atribución por
+        feature de cada bosque (FlatForest.decision_attribution).
+        """
+        if len(X) == 1:
+            k = int(regimes[0])
+            X_k = self.scalers[k].transform(X)
+            if attribution is None:
+                return self.forests[k].decision_function(X_k)
+            scores, attribution[:] = self.forests[k].decision_attribution(X_k)
+            return scores
+        scores = np.empty(len(X))
+        for k in np.unique(regimes):
+            sel = regimes == k
+            X_k = self.scalers[k].transform(X[sel])
+            if attribution is None:
+                scores[sel] = self.forests[k].decision_function(X_k)
+            else:
+                scores[sel], attribution[sel] = self.forests[k].decision_attribution(X_k)
+        return scores
+
+    def to_frame(self) -> pd.DataFrame:
+        rows = []
+        for k, entry in enumerate(self.info):
+            w, r = entry['wind_bin'], entry['rpm_bin']
+            rows.append({
+                'regime': k,
+                'viento_ms': f"{w * self.wind_width:g}-" + (
+                    '' if w == self.wind_bins - 1 else f"{(w + 1) * self.wind_width:g}"),
+                'rpm': 'franja' if r is None else f"{r * self.rpm_width:.3g}-" + (
+                    '' if r == self.rpm_bins - 1 else f"{(r + 1) * self.rpm_width:.3g}"),
+                'celdas': int((self.table == k).sum()),
+                'samples': entry['samples'], 'trees': entry['trees'],
+                'max_samples': entry['max_samples'], 'nodes': entry['nodes'],
+            })
+        return pd.DataFrame(rows)
+
+
+def _feature_names() -> List[str]:
+    from pipelines.train import SCALER_FEATURES
+    return SCALER_FEATURES
+
+
+def default_path() -> str:
+    return os.path.join(ml_config.MODEL_DIR, router_config.DIR)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Enrutador por régimen de operación")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_build = sub.add_parser('build', help="Entrenar desde data/*.parquet (y logs opcionales)")
+    p_build.add_argument('--data-dir')
+    p_build.add_argument('--log-dir', default='', help="Sumar filas NORMAL de los logs de sesión")
+    p_build.add_argument('--out', default=default_path())
+    p_build.add_argument('--n-estimators', type=int, default=router_config.N_ESTIMATORS)
+    p_build.add_argument('--max-samples', type=int, default=router_config.MAX_SAMPLES)
+    p_build.add_argument('--min-samples', type=int, default=router_config.MIN_SAMPLES)
+    p_info = sub.add_parser('info')
+    p_info.add_argument('path', nargs='?', default=default_path())
+    args = parser.parse_args()
+
+    if args.cmd == 'build':
+        from pipelines.train import collect_sample
+
+        reservoir, _ = collect_sample(args.data_dir, args.log_dir)
+        router = RegimeRouter.build(reservoir.sample(), n_estimators=args.n_estimators,
+                                    max_samples=args.max_samples, min_samples=args.min_samples)
+        router.save(args.out)
+        print(f"Enrutador escrito en {args.out}: {router.n_regimes} regímenes, "
+              f"{int((router.table < 0).sum())} celdas al modelo global")
+    else:
+        router = RegimeRouter.load(args.path)
+    pd.set_option('display.width', 160)
+    print(router.to_frame().to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -2,21 +2,47 @@ import socket
 import struct
 import queue
 import threading
-from datetime import datetime
-from typing import Dict, Any
+import time
+import numpy as np
+from typing import TYPE_CHECKING, List, Optional
 
-from config.settings import network_config, physics_config
+from config.settings import network_config, physics_config, control_config, storage_config
+from core import protocol, transports
+from core.control_state import ControlState
 from core.ml_inference import MLInferenceEngine
+from core.profiler import traced
+from core.telemetry import ATTRIBUTION_FIELDS, TELEMETRY_DTYPE, StatusCode, TelemetryRecord
+
+if TYPE_CHECKING:  # Sin import en ejecución: permite `python -m core.power_curve`
+    from core.power_curve import PowerCurveIndex
 
 
 class TCPServerManager:
     # Gestor del servidor TCP/IP para comunicación con Simulink
     
-    def __init__( self,  data_queue: queue.Queue,  controls: Dict[str, float], ml_engine: MLInferenceEngine):
+    # Args:
+    #     sinks: Consumidores adicionales del flujo de telemetría (objetos con
+    #            método push(item)), p. ej. RollupEngine
+    #     power_curve: Índice de referencia viento -> potencia/rpm (segundo
+    #                  detector); None deja phys_status en N/A
+    def __init__( self,  data_queue: queue.Queue,  controls: ControlState, ml_engine: MLInferenceEngine, sinks: Optional[List] = None, power_curve: Optional['PowerCurveIndex'] = None):
         self.data_queue = data_queue
         self.controls = controls
+        self.sim_step = 0  # Pasos lock-step de la conexión actual
+        self.protocol_version = 0  # Negociado por conexión (1 = S-Function, 2 = v2)
+        self.sequence = protocol.SequenceTracker()
+        self.capture_enabled = storage_config.CAPTURE_ENABLED
+        self.capture_path: Optional[str] = None  # Captura de la última conexión
         self.ml_engine = ml_engine
+        self.power_curve = power_curve
+        self.sinks = list(sinks or [])
         self.stop_event = threading.Event()
+        # Últimos comandos enviados, por tiempo de simulación del paso que
+        # producen: con ellos se puntúa cada frame del mensaje siguiente
+        self._sent_t = np.empty(0)
+        self._sent_vp = np.empty((0, 2))
+        self._last_t_ns = 0  # Último timestamp asignado (estrictamente creciente)
+        self._capture = None  # CapturingConnection de la conexión actual
     
     def start(self) -> None:
         # Inicia el servidor TCP/IP en un hilo separado
@@ -32,26 +58,25 @@ class TCPServerManager:
         self.stop_event.set()
     
     def _run_server(self) -> None:
-        # Lógica principal del servidor TCP/IP
-        fmt_in = network_config.FORMAT_IN
-        fmt_out = network_config.FORMAT_OUT
-        sz_in = struct.calcsize(fmt_in)
+        # Lógica principal del servidor (transporte según NetworkConfig.TRANSPORT)
+        try:
+            listener = transports.create_listener(network_config.TRANSPORT)
+        except Exception as e:
+            print(f"Error en servidor: {e}")
+            return
         
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            
+        with listener as s:
             try:
-                s.bind((network_config.HOST, network_config.PORT))
-                s.listen(1)
                 s.settimeout(network_config.TIMEOUT)
                 
                 while not self.stop_event.is_set():
                     try:
                         conn, addr = s.accept()
-                        print(f"Cliente conectado: {addr}")
+                        transports.prepare_connection(conn, network_config.TRANSPORT)
+                        print(f"Cliente conectado: {addr or network_config.UNIX_PATH}")
                         
                         with conn:
-                            self._handle_client(conn, sz_in, fmt_in, fmt_out)
+                            self.handle_connection(conn)
                             
                     except socket.timeout:
                         continue
@@ -59,27 +84,188 @@ class TCPServerManager:
             except Exception as e:
                 print(f"Error en servidor: {e}")
     
+    def handle_connection(self, conn) -> None:
+        # Atiende una conexión completa (también la usa el replay de capturas)
+        fmt_in = network_config.FORMAT_IN
+        fmt_out = network_config.FORMAT_OUT
+        sz_in = struct.calcsize(fmt_in)
+        
+        # Tiempo de simulación desde cero por conexión
+        self.sim_step = 0
+        self.protocol_version = 0
+        self.sequence.reset()
+        self.controls.reset_clock()
+        self._sent_t = np.empty(0)
+        self._sent_vp = np.empty((0, 2))
+        
+        writer = None
+        if self.capture_enabled:
+            from core import capture
+            self.capture_path = capture.new_capture_path()
+            writer = capture.CaptureWriter(self.capture_path)
+            conn = capture.CapturingConnection(conn, writer)
+            # Estado inicial para el replay: comando aplicado y calibración
+            calibrator = getattr(self.ml_engine, 'calibrator', None)
+            conn.record_state(self.controls.applied(),
+                              calibrator.state_arrays() if calibrator is not None else None)
+            # También registra lo publicado por frame (scores y diagnósticos)
+            self.sinks.append(conn)
+            self._capture = conn
+            print(f"Capturando tráfico en {self.capture_path}")
+        
+        try:
+            self._handle_client(conn, sz_in, fmt_in, fmt_out)
+        finally:
+            if writer is not None:
+                self._capture = None
+                self.sinks.remove(conn)
+                writer.close()
+    
     def _handle_client(self, conn: socket.socket, sz_in: int, fmt_in: str, fmt_out: str ) -> None:
-        # Maneja la comunicación con un cliente conectado
+        # Maneja la comunicación con un cliente conectado.
+        # Lee todo lo disponible en el socket; si hay varios frames acumulados
+        # se procesan como bloque vectorizado y se responde en un solo envío.
+        buf = bytearray(sz_in * network_config.RECV_BATCH_FRAMES)
+        view = memoryview(buf)
+        filled = 0
+        
         while not self.stop_event.is_set():
-            data = conn.recv(sz_in)
+            n = conn.recv_into(view[filled:])
             
-            if not data:
+            if n == 0:
                 break
             
-            if len(data) == sz_in:
+            filled += n
+            
+            # Negociación del protocolo con los primeros bytes de la conexión
+            if not self.protocol_version:
+                self.protocol_version = protocol.detect_version(view[:filled])
+                if self.protocol_version == protocol.VERSION:
+                    print("Protocolo v2 negociado")
+                    self._handle_client_v2(conn, bytes(view[:filled]), fmt_in)
+                    return
+                if not self.protocol_version:
+                    continue
+            
+            n_frames = filled // sz_in
+            if n_frames == 0:
+                continue
+            
+            used = n_frames * sz_in
+            if n_frames == 1:
                 # Procesar datos recibidos
-                telemetry = self._process_telemetry(data, fmt_in)
-                
-                # Enviar comandos de control
-                self._send_commands(conn, fmt_out)
+                self._process_telemetry(bytes(view[:used]), fmt_in)
+            else:
+                self._process_batch(view[:used], n_frames)
+            
+            # Enviar comandos de control (uno por frame recibido)
+            self._send_commands(conn, fmt_out, n_frames)
+            
+            # Conservar el frame parcial al inicio del buffer
+            rest = filled - used
+            if rest:
+                buf[:rest] = buf[used:filled]
+            filled = rest
+    
+    def _handle_client_v2(self, conn: socket.socket, initial: bytes, fmt_in: str) -> None:
+        # Bucle de la conexión v2: mensajes con cabecera y K pasos, una
+        # respuesta por mensaje. Los mensajes completos acumulados en el
+        # buffer se responden en un solo envío.
+        msg_max = protocol.HEADER_SIZE + network_config.MAX_BLOCK_STEPS * protocol.FRAME_IN_SIZE
+        buf = bytearray(max(2 * msg_max, len(initial)))
+        view = memoryview(buf)
+        buf[:len(initial)] = initial
+        filled = len(initial)
+        
+        while not self.stop_event.is_set():
+            pos = 0
+            replies = []
+            try:
+                while filled - pos >= protocol.HEADER_SIZE:
+                    header = protocol.unpack_header(view[pos:filled])
+                    end = pos + protocol.HEADER_SIZE + header.k * protocol.FRAME_IN_SIZE
+                    if end > filled:
+                        break
+                    payload = view[pos + protocol.HEADER_SIZE:end]
+                    replies.append(self._process_message(header, payload, fmt_in))
+                    pos = end
+            except ValueError as e:
+                print(f"Mensaje v2 inválido, cerrando conexión: {e}")
+                return
+            
+            if replies:
+                conn.sendall(b''.join(replies))
+            
+            # Conservar el mensaje parcial al inicio del buffer
+            if pos:
+                rest = filled - pos
+                buf[:rest] = buf[pos:filled]
+                filled = rest
+            
+            n = conn.recv_into(view[filled:])
+            if n == 0:
+                break
+            filled += n
+    
+    # Procesa un mensaje v2 completo y arma su respuesta
+        # Args:
+        #    header: Cabecera decodificada
+        #    payload: Vista de K * 32 bytes ('<4d' por paso)
+        #    fmt: Formato de struct de un paso
+        # Returns:    Respuesta v2 con K comandos
+    def _process_message(self, header: protocol.MessageHeader, payload: memoryview, fmt: str) -> bytes:
+        flags = self.sequence.check(header)
+        
+        if header.k == 1:
+            self._process_telemetry(bytes(payload), fmt, header.t_sim, header.dt)
+        elif header.k > 1:
+            self._process_batch(payload, header.k, header.step_times(), header.dt)
+        
+        # Comandos para los K pasos siguientes al mensaje, en el tiempo de
+        # simulación en que el cliente los aplicará
+        commands = np.empty((header.k, 2))
+        next_times = header.step_times() + header.k * header.dt
+        for i, t_sim in enumerate(next_times):
+            commands[i] = self.controls.step(float(t_sim))
+        if self._capture is not None:
+            self._capture.record_commands(next_times, commands)
+        np.maximum(commands, (0.1, 0.0), out=commands)
+        self.sim_step += header.k
+        self._sent_t, self._sent_vp = next_times, commands
+        
+        return protocol.pack_reply(header, commands, flags)
+    
+    # Consignas con las que la simulación produjo los pasos de tiempos t_sim:
+    # las del último envío para ese paso (el más cercano si el cliente se
+    # adelantó o retrocedió); sin envíos previos, la consigna aplicada
+        # Returns:    Arreglo (N, 2) viento, pitch
+    def _commands_for(self, t_sim: np.ndarray) -> np.ndarray:
+        if len(self._sent_t) == 0:
+            return np.tile(self.controls.applied(), (len(t_sim), 1))
+        i = np.searchsorted(self._sent_t, t_sim + 1e-9, side='right') - 1
+        return self._sent_vp[np.clip(i, 0, len(self._sent_t) - 1)]
+    
+    # Timestamps de recepción de n frames, estrictamente crecientes: repartidos
+    # entre la recepción anterior y la actual, a lo sumo n pasos dt hacia atrás
+    # (primer bloque o tras una pausa del cliente)
+    def _stamp(self, n: int, dt: float) -> np.ndarray:
+        now = time.time_ns()
+        start = max(self._last_t_ns, now - int(n * dt * 1e9))
+        span = max(now - start, n)
+        stamps = start + (np.arange(1, n + 1, dtype=np.int64) * span) // n
+        self._last_t_ns = int(stamps[-1])
+        return stamps
     
     # Procesa los datos de telemetría recibidos de Simulink
         # Args:
         #    data: Bytes recibidos
         #    fmt: Formato de struct para desempaquetar
-        # Returns:    Diccionario con datos procesados
-    def _process_telemetry(self, data: bytes, fmt: str) -> Dict[str, Any]:
+        #    t_sim: Tiempo de simulación del paso (None = paso lock-step v1)
+        #    dt: Paso de simulación [s]
+        # Returns:    Registro compacto con datos procesados
+    @traced('tcp.process_telemetry')
+    def _process_telemetry(self, data: bytes, fmt: str, t_sim: Optional[float] = None,
+                           dt: float = control_config.SIM_STEP) -> TelemetryRecord:
         # Desempaquetar datos de Simulink
         wm_rads, p_watts, v_rms, s_va = struct.unpack(fmt, data)
         
@@ -88,34 +274,107 @@ class TCPServerManager:
         v_kv = v_rms / physics_config.V_TO_KV
         s_kva = s_va / physics_config.VA_TO_KVA
         
-        # Inferencia ML
-        wind_speed = self.controls['v']
-        status, anomaly_score = self.ml_engine.predict(
-            wind_speed, gen_rpm, p_kw
+        # Inferencia ML con la consigna con la que la simulación produjo el paso
+        if t_sim is None:
+            t_sim = self.sim_step * control_config.SIM_STEP
+        wind_speed, pitch_angle = (float(x) for x in self._commands_for(np.array([t_sim]))[0])
+        status, anomaly_score, attribution = self.ml_engine.predict(
+            wind_speed, gen_rpm, p_kw, explain=True
         )
         
-        # Preparar datos para visualización
-        telemetry = {
-            'Time': datetime.now().strftime("%H:%M:%S"),
-            'wm': wm_rads,
-            'P': p_kw,
-            'V': v_kv,
-            'S': s_kva,
-            'Score': anomaly_score,
-            'Status': status
-        }
+        # Residuo respecto a la curva de potencia de referencia (búsqueda O(1))
+        phys_status, phys = StatusCode.NA, 0.0
+        if self.power_curve is not None:
+            phys_status, phys = self.power_curve.evaluate_one(wind_speed, gen_rpm, p_kw)
+        
+        # Registro compacto: el formato de texto se aplica al visualizar
+        telemetry = TelemetryRecord(
+            int(self._stamp(1, dt)[0]), wind_speed, pitch_angle,
+            wm_rads, p_kw, v_kv, s_kva, anomaly_score, status,
+            phys, phys_status, tuple(attribution.tolist()), t_sim
+        )
         
         # Enviar a cola de visualización
-        self.data_queue.put(telemetry)
+        self._publish(telemetry)
         
         return telemetry
     
+    # Procesa un bloque de N frames de telemetría de forma vectorizada
+        # Args:
+        #    data: Vista de N * 32 bytes ('<4d' por frame)
+        #    n_frames: Número de frames en el bloque
+        #    t_sim: Tiempo de simulación de cada frame (None = pasos lock-step v1)
+        #    dt: Paso de simulación [s]
+        # Returns:    Arreglo estructurado (TELEMETRY_DTYPE) con N registros
+    @traced('tcp.process_batch')
+    def _process_batch(self, data: memoryview, n_frames: int, t_sim: Optional[np.ndarray] = None,
+                       dt: float = control_config.SIM_STEP) -> np.ndarray:
+        # Vista (N, 4) sobre el buffer recibido, sin copiar
+        frames = np.frombuffer(data, dtype='<f8').reshape(n_frames, 4)
+        wm_rads = frames[:, 0]
+        
+        # Conversiones de unidades vectorizadas
+        gen_rpm, p_kw = self.ml_engine.convert_units(wm_rads, frames[:, 1])
+        
+        # Inferencia ML por lote, cada frame con la consigna de su paso
+        if t_sim is None:
+            t_sim = (self.sim_step + np.arange(n_frames)) * control_config.SIM_STEP
+        commands = self._commands_for(t_sim)
+        wind = commands[:, 0]
+        status, anomaly_score, attribution = self.ml_engine.predict_batch(
+            wind, gen_rpm, p_kw, explain=True)
+        
+        block = np.empty(n_frames, dtype=TELEMETRY_DTYPE)
+        block['t_ns'] = self._stamp(n_frames, dt)
+        block['t_sim'] = t_sim
+        block['v'] = wind
+        block['p'] = commands[:, 1]
+        block['wm'] = wm_rads
+        block['P'] = p_kw
+        block['V'] = frames[:, 2] / physics_config.V_TO_KV
+        block['S'] = frames[:, 3] / physics_config.VA_TO_KVA
+        block['score'] = anomaly_score
+        block['status'] = status
+        for j, name in enumerate(ATTRIBUTION_FIELDS):
+            block[name] = attribution[:, j]
+        if self.power_curve is not None:
+            block['phys_status'], block['phys'] = self.power_curve.evaluate(wind, gen_rpm, p_kw)
+        else:
+            block['phys_status'] = StatusCode.NA
+            block['phys'] = 0.0
+        
+        # Todo el bloque viaja como un solo elemento de la cola
+        self._publish(block)
+        
+        return block
+    
+    # Entrega un registro o bloque a la cola de visualización y a los sinks
+    def _publish(self, item) -> None:
+        self.data_queue.put(item)
+        for sink in self.sinks:
+            try:
+                sink.push(item)
+            except Exception as e:
+                print(f"Error en sink de telemetría: {e}")
+    
     # Envía comandos de control a Simulink
         # Args:
         #    conn: Conexión socket
         #    fmt: Formato de struct para empaquetar
-    def _send_commands(self, conn: socket.socket, fmt: str) -> None:
-        wind_speed = max(0.1, self.controls['v'])
-        pitch_angle = max(0.0, self.controls['p'])
+        #    n_frames: Número de respuestas (una por frame recibido)
+    def _send_commands(self, conn: socket.socket, fmt: str, n_frames: int = 1) -> None:
+        replies = []
+        sent_t, sent_vp = np.empty(n_frames), np.empty((n_frames, 2))
+        for i in range(n_frames):
+            # Consigna en tiempo de simulación (no de reloj de pared)
+            self.sim_step += 1
+            sent_t[i] = self.sim_step * control_config.SIM_STEP
+            sent_vp[i] = self.controls.step(sent_t[i])
+        if self._capture is not None:
+            self._capture.record_commands(sent_t, sent_vp)
+        np.maximum(sent_vp, (0.1, 0.0), out=sent_vp)
+        for i in range(n_frames):
+            replies.append(struct.pack(fmt, *sent_vp[i]))
+        self._sent_t, self._sent_vp = sent_t, sent_vp
         
-        conn.sendall(struct.pack(fmt, wind_speed, pitch_angle))
+        conn.sendall(b''.join(replies))
@@ -0,0 +1,184 @@
+import time
+from enum import IntEnum
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class StatusCode(IntEnum):
+    # Código compacto del diagnóstico IA (se guarda como uint8)
+    NA = 0
+    NORMAL = 1
+    ANOMALY = 2
+    ERROR = 3
+
+    @property
+    def label(self) -> str:
+        return STATUS_LABELS[self]
+
+
+# Etiquetas de visualización indexadas por código
+STATUS_LABELS = ('N/A', 'NORMAL', 'ANOMALÍA', 'ERR_ML')
+_STATUS_LABELS_ARRAY = np.array(STATUS_LABELS, dtype=object)
+
+# Registro de telemetría en formato columnar (un frame de Simulink por fila)
+#   t_ns: timestamp de recepción en ns desde epoch (time.time_ns); en un bloque
+#         de varios frames, repartido entre la recepción anterior y la actual
+#   v, p: consignas de viento/pitch con las que la simulación produjo el frame
+#   wm, P, V, S: rad/s, kW, kV, kVA
+#   phys, phys_status: residuo y diagnóstico de la curva de potencia (core/power_curve.py)
+#   attr_*: atribución del score por feature (viento, rpm, potencia, densidad; suma 1)
+#   t_sim: tiempo de simulación del paso [s] (0 en registros sin tiempo de simulación)
+TELEMETRY_DTYPE = np.dtype([
+    ('t_ns', '<i8'),
+    ('v', '<f8'),
+    ('p', '<f8'),
+    ('wm', '<f8'),
+    ('P', '<f8'),
+    ('V', '<f8'),
+    ('S', '<f8'),
+    ('score', '<f8'),
+    ('status', 'u1'),
+    ('phys', '<f8'),
+    ('phys_status', 'u1'),
+    ('attr_v', '<f4'),
+    ('attr_wm', '<f4'),
+    ('attr_P', '<f4'),
+    ('attr_rho', '<f4'),
+    ('t_sim', '<f8'),
+])
+
+# Campos de atribución en el orden de las features del modelo
+ATTRIBUTION_FIELDS = ('attr_v', 'attr_wm', 'attr_P', 'attr_rho')
+
+
+class TelemetryRecord:
+    """Registro compacto de un frame de telemetría (sin dict por frame)."""
+
+    __slots__ = ('t_ns', 'v', 'p', 'wm', 'P', 'V', 'S', 'score', 'status',
+                 'phys', 'phys_status', 'attribution', 't_sim')
+
+    def __init__(self, t_ns: int, v: float, p: float, wm: float, P: float,
+                 V: float, S: float, score: float, status: int,
+                 phys: float = 0.0, phys_status: int = StatusCode.NA,
+                 attribution: Tuple[float, float, float, float] = (0.0, 0.0, 0.0, 0.0),
+                 t_sim: float = 0.0):
+        self.t_ns = t_ns
+        self.v = v
+        self.p = p
+        self.wm = wm
+        self.P = P
+        self.V = V
+        self.S = S
+        self.score = score
+        self.status = status
+        self.phys = phys
+        self.phys_status = phys_status
+        self.attribution = attribution
+        self.t_sim = t_sim
+
+    def as_tuple(self) -> Tuple:
+        """Retorna los campos en el orden de TELEMETRY_DTYPE."""
+        return (self.t_ns, self.v, self.p, self.wm, self.P,
+                self.V, self.S, self.score, self.status,
+                self.phys, self.phys_status, *self.attribution, self.t_sim)
+
+
+def records_to_block(records: Iterable[TelemetryRecord]) -> np.ndarray:
+    """Empaqueta una lista de registros en un arreglo estructurado."""
+    return np.array([r.as_tuple() for r in records], dtype=TELEMETRY_DTYPE)
+
+
+def upgrade_block(block: np.ndarray, dtype: np.dtype = TELEMETRY_DTYPE) -> np.ndarray:
+    """Adapta un bloque guardado con un esquema anterior (campos nuevos en cero)."""
+    if block.dtype == dtype:
+        return block
+    out = np.zeros(len(block), dtype=dtype)
+    for name in block.dtype.names:
+        if name in dtype.names:
+            out[name] = block[name]
+    return out
+
+
+def local_datetimes(t_ns: np.ndarray) -> pd.DatetimeIndex:
+    """Convierte timestamps en ns (UTC) a hora local naive para visualización."""
+    offset = time.localtime().tm_gmtoff * 1_000_000_000
+    return pd.to_datetime(np.asarray(t_ns, dtype=np.int64) + offset, unit='ns')
+
+
+def status_labels(codes: np.ndarray) -> np.ndarray:
+    """Traduce códigos de estado a sus etiquetas de texto."""
+    return _STATUS_LABELS_ARRAY[np.asarray(codes, dtype=np.intp)]
+
+
+class TelemetryBuffer:
+    """Historial circular de tamaño fijo sobre un arreglo estructurado.
+
+    Reemplaza el pd.concat por ciclo: los registros se escriben en sitio y
+    el DataFrame solo se construye al momento de renderizar.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._data = np.zeros(capacity, dtype=TELEMETRY_DTYPE)
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, record: TelemetryRecord) -> None:
+        """Agrega un registro individual."""
+        self._data[self._next] = record.as_tuple()
+        self._next = (self._next + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def extend(self, block: np.ndarray) -> None:
+        """Agrega un bloque de registros (arreglo con TELEMETRY_DTYPE)."""
+        n = len(block)
+        if n == 0:
+            return
+        if n >= self.capacity:
+            self._data[:] = block[-self.capacity:]
+            self._next = 0
+            self._count = self.capacity
+            return
+
+        first = min(n, self.capacity - self._next)
+        self._data[self._next:self._next + first] = block[:first]
+        if first < n:
+            self._data[:n - first] = block[first:]
+        self._next = (self._next + n) % self.capacity
+        self._count = min(self._count + n, self.capacity)
+
+    def view(self) -> np.ndarray:
+        """Retorna una copia ordenada cronológicamente del contenido."""
+        if self._count < self.capacity:
+            return self._data[:self._count].copy()
+        return np.concatenate((self._data[self._next:], self._data[:self._next]))
+
+    def latest(self) -> Optional[np.void]:
+        """Retorna el último registro o None si está vacío."""
+        if self._count == 0:
+            return None
+        return self._data[(self._next - 1) % self.capacity]
+
+    def to_frame(self) -> pd.DataFrame:
+        """Construye el DataFrame de visualización (formato de texto solo aquí)."""
+        data = self.view()
+        return pd.DataFrame({
+            'Time': local_datetimes(data['t_ns']).strftime('%H:%M:%S'),
+            'wm': data['wm'],
+            'P': data['P'],
+            'V': data['V'],
+            'S': data['S'],
+            'Score': data['score'],
+            'Status': status_labels(data['status']),
+            'Phys': data['phys'],
+            'PhysStatus': status_labels(data['phys_status']),
+            'AttrV': data['attr_v'],
+            'AttrWm': data['attr_wm'],
+            'AttrP': data['attr_P'],
+            'AttrRho': data['attr_rho'],
+        })
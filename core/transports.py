@@ -0,0 +1,351 @@
+import json
+import os
+import select
+import socket
+import time
+from multiprocessing import resource_tracker, shared_memory
+from typing import Optional, Tuple
+
+from config.settings import network_config
+
+# ----------------------------------------------------------------------
+# Transportes del gateway
+#
+# 'tcp'  : socket TCP (S-Function de Simulink), TCP_NODELAY configurable
+# 'unix' : socket de dominio Unix, para simuladores en el mismo host
+# 'shm'  : buzón en memoria compartida con dos anillos SPSC (cliente ->
+#          servidor y servidor -> cliente) y notificación por eventfd. Los
+#          eventfd y el nombre del segmento se entregan por un socket Unix de
+#          encuentro (send_fds); sin eventfd ambos lados sondean los contadores.
+#
+# Todas las conexiones exponen la interfaz de socket que usa
+# TCPServerManager: recv_into / recv / sendall / close y contexto `with`.
+# ----------------------------------------------------------------------
+
+TRANSPORTS = ('tcp', 'unix', 'shm')
+
+# Contadores u64 del segmento, cada uno en su propia línea de caché
+_C2S_HEAD, _C2S_TAIL, _S2C_HEAD, _S2C_TAIL, _CLOSED = 0, 8, 16, 24, 32
+_HEADER_BYTES = 320
+
+_HAS_EVENTFD = hasattr(os, 'eventfd') and hasattr(socket, 'send_fds')
+
+
+def shm_rendezvous_path(unix_path: str = None) -> str:
+    """Socket Unix de encuentro del transporte 'shm'."""
+    return (unix_path or network_config.UNIX_PATH) + '.shm'
+
+
+class _Ring:
+    """Anillo de bytes de un productor y un consumidor sobre memoria compartida.
+
+    head (escritos) y tail (leídos) crecen monótonamente; el productor solo
+    escribe head y el consumidor solo tail. Los datos se copian antes de
+    publicar el contador (orden de almacenamiento de x86/ARM64 con las
+    barreras implícitas de las llamadas de CPython).
+    """
+
+    def __init__(self, buf: memoryview, counters: memoryview, head: int, tail: int,
+                 offset: int, capacity: int):
+        self.buf = buf
+        self.counters = counters
+        self.head = head
+        self.tail = tail
+        self.offset = offset
+        self.capacity = capacity
+
+    def readable(self) -> int:
+        return self.counters[self.head] - self.counters[self.tail]
+
+    def writable(self) -> int:
+        return self.capacity - self.readable()
+
+    def write(self, data) -> int:
+        # Escribe lo que quepa; retorna los bytes escritos
+        data = memoryview(data).cast('B')
+        n = min(len(data), self.writable())
+        if n == 0:
+            return 0
+        head = self.counters[self.head]
+        start = head % self.capacity
+        first = min(n, self.capacity - start)
+        base = self.offset
+        self.buf[base + start:base + start + first] = data[:first]
+        if n > first:
+            self.buf[base:base + n - first] = data[first:n]
+        self.counters[self.head] = head + n
+        return n
+
+    def read_into(self, view: memoryview) -> int:
+        n = min(len(view), self.readable())
+        if n == 0:
+            return 0
+        tail = self.counters[self.tail]
+        start = tail % self.capacity
+        first = min(n, self.capacity - start)
+        base = self.offset
+        view[:first] = self.buf[base + start:base + start + first]
+        if n > first:
+            view[first:n] = self.buf[base:base + n - first]
+        self.counters[self.tail] = tail + n
+        return n
+
+
+class ShmConnection:
+    """Extremo de una conexión por memoria compartida con interfaz de socket.
+
+    Args:
+        shm: Segmento compartido (cabecera + dos anillos)
+        control: Socket Unix de encuentro; su cierre indica que el par terminó
+        efd_rx / efd_tx: eventfd de datos entrantes / salientes (None = sondeo)
+        is_server: Define qué anillo se lee y cuál se escribe
+    """
+
+    def __init__(self, shm: shared_memory.SharedMemory, control: socket.socket,
+                 efd_rx: Optional[int], efd_tx: Optional[int], is_server: bool,
+                 ring_bytes: int, spin: int = None):
+        self.shm = shm
+        self.control = control
+        self.efd_rx = efd_rx
+        self.efd_tx = efd_tx
+        self.is_server = is_server
+        if spin is None:
+            # Con una sola CPU el sondeo solo retrasa al par: bloquear directamente
+            spin = network_config.SHM_SPIN if (os.cpu_count() or 1) > 1 else 0
+        self.spin = spin
+        self.timeout: Optional[float] = None
+
+        buf = shm.buf
+        self._counters = buf[:_HEADER_BYTES].cast('Q')
+        c2s = _Ring(buf, self._counters, _C2S_HEAD // 8, _C2S_TAIL // 8,
+                    _HEADER_BYTES, ring_bytes)
+        s2c = _Ring(buf, self._counters, _S2C_HEAD // 8, _S2C_TAIL // 8,
+                    _HEADER_BYTES + ring_bytes, ring_bytes)
+        self._rx, self._tx = (c2s, s2c) if is_server else (s2c, c2s)
+        self._closed = False
+
+        self._poller = select.poll()
+        self._poller.register(control, select.POLLIN)
+        if efd_rx is not None:
+            self._poller.register(efd_rx, select.POLLIN)
+
+    # Interfaz de socket ---------------------------------------------------
+
+    def settimeout(self, timeout: Optional[float]) -> None:
+        self.timeout = timeout
+
+    def setsockopt(self, *args) -> None:
+        pass  # Sin Nagle ni buffers del kernel
+
+    def recv_into(self, view, nbytes: int = 0) -> int:
+        view = memoryview(view).cast('B')
+        if nbytes:
+            view = view[:nbytes]
+        if not self._wait(lambda: self._rx.readable() > 0):
+            return 0
+        return self._rx.read_into(view)
+
+    def recv(self, bufsize: int) -> bytes:
+        data = bytearray(bufsize)
+        n = self.recv_into(data)
+        return bytes(data[:n])
+
+    def sendall(self, data) -> None:
+        data = memoryview(data).cast('B')
+        sent = 0
+        while sent < len(data):
+            n = self._tx.write(data[sent:])
+            if n:
+                sent += n
+                if self.efd_tx is not None:
+                    os.eventfd_write(self.efd_tx, 1)
+            elif not self._wait(lambda: self._tx.writable() > 0, notify=False):
+                raise ConnectionError("Par desconectado")
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._counters[_CLOSED // 8] = 1
+            if self.efd_tx is not None:
+                os.eventfd_write(self.efd_tx, 1)
+        except Exception:
+            pass
+        for fd in (self.efd_rx, self.efd_tx):
+            if fd is not None:
+                os.close(fd)
+        self.control.close()
+        del self._rx, self._tx
+        self._counters.release()
+        self.shm.close()
+        if self.is_server:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # Espera ---------------------------------------------------------------
+
+    def _peer_gone(self) -> bool:
+        if self._counters[_CLOSED // 8]:
+            return True
+        r, _, _ = select.select([self.control], [], [], 0)
+        return bool(r) and not self.control.recv(1, socket.MSG_PEEK)
+
+    def _wait(self, ready, notify: bool = True) -> bool:
+        # Sondeo breve (camino de latencia mínima) y luego bloqueo en el
+        # eventfd junto con el socket de control para detectar la caída del par
+        for _ in range(self.spin):
+            if ready():
+                return True
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            if ready():
+                return True
+            if self._counters[_CLOSED // 8]:
+                return ready()
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise socket.timeout("timed out")
+            if notify and self.efd_rx is not None:
+                wait = 500 if remaining is None else min(500, int(remaining * 1000) + 1)
+                for fd, _ in self._poller.poll(wait):
+                    if fd == self.efd_rx:
+                        try:
+                            os.eventfd_read(self.efd_rx)
+                        except BlockingIOError:
+                            pass
+                    elif self._peer_gone():
+                        return ready()
+            else:
+                if self._peer_gone():
+                    return ready()
+                time.sleep(network_config.SHM_POLL_INTERVAL)
+
+
+class ShmListener:
+    """Acepta clientes por el socket de encuentro y crea un segmento por conexión."""
+
+    def __init__(self, name: str = None, unix_path: str = None, ring_bytes: int = None):
+        self.name = name or network_config.SHM_NAME
+        self.path = shm_rendezvous_path(unix_path)
+        self.ring_bytes = ring_bytes or network_config.SHM_RING_BYTES
+        self._count = 0
+        self.sock = _bind_unix(self.path)
+
+    def settimeout(self, timeout: Optional[float]) -> None:
+        self.sock.settimeout(timeout)
+
+    def accept(self) -> Tuple[ShmConnection, str]:
+        control, _ = self.sock.accept()
+        control.settimeout(None)
+        self._count += 1
+        name = f"{self.name}_{os.getpid()}_{self._count}"
+        shm = shared_memory.SharedMemory(name=name, create=True,
+                                         size=_HEADER_BYTES + 2 * self.ring_bytes)
+        shm.buf[:_HEADER_BYTES] = bytes(_HEADER_BYTES)
+
+        efds = [os.eventfd(0, os.EFD_NONBLOCK) for _ in range(2)] if _HAS_EVENTFD else []
+        hello = json.dumps({'name': name, 'ring_bytes': self.ring_bytes,
+                            'eventfd': bool(efds), 'pid': os.getpid()}).encode()
+        if efds:
+            socket.send_fds(control, [hello], efds)
+        else:
+            control.sendall(hello)
+
+        # efds[0]: cliente -> servidor, efds[1]: servidor -> cliente
+        efd_rx, efd_tx = (efds[0], efds[1]) if efds else (None, None)
+        conn = ShmConnection(shm, control, efd_rx, efd_tx, True, self.ring_bytes)
+        return conn, f"shm:{name}"
+
+    def close(self) -> None:
+        self.sock.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def connect_shm(unix_path: str = None, timeout: float = 5.0) -> ShmConnection:
+    """Extremo cliente del transporte 'shm'."""
+    control = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    control.settimeout(timeout)
+    control.connect(shm_rendezvous_path(unix_path))
+    if _HAS_EVENTFD:
+        hello, fds, _, _ = socket.recv_fds(control, 4096, 2)
+    else:
+        hello, fds = control.recv(4096), []
+    info = json.loads(hello)
+    shm = shared_memory.SharedMemory(name=info['name'])
+    # El servidor es dueño del segmento: el cliente no debe eliminarlo al salir
+    if info.get('pid') != os.getpid():
+        try:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        except Exception:
+            pass
+    efd_rx, efd_tx = (fds[1], fds[0]) if len(fds) == 2 else (None, None)
+    control.settimeout(None)
+    conn = ShmConnection(shm, control, efd_rx, efd_tx, False, info['ring_bytes'])
+    conn.settimeout(timeout)
+    return conn
+
+
+def _bind_unix(path: str) -> socket.socket:
+    # Elimina un socket huérfano de una ejecución anterior
+    if os.path.exists(path):
+        os.unlink(path)
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.bind(path)
+    s.listen(1)
+    return s
+
+
+def create_listener(transport: str = None):
+    """Socket (o equivalente) de escucha del transporte configurado."""
+    transport = transport or network_config.TRANSPORT
+    if transport == 'tcp':
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        s.bind((network_config.HOST, network_config.PORT))
+        s.listen(1)
+        return s
+    if transport == 'unix':
+        return _bind_unix(network_config.UNIX_PATH)
+    if transport == 'shm':
+        return ShmListener()
+    raise ValueError(f"Transporte desconocido: {transport} (opciones: {TRANSPORTS})")
+
+
+def prepare_connection(conn, transport: str = None) -> None:
+    """Opciones por conexión aceptada (Nagle desactivado en TCP)."""
+    transport = transport or network_config.TRANSPORT
+    if transport == 'tcp' and network_config.TCP_NODELAY:
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+def connect(transport: str = None, host: str = '127.0.0.1', port: int = None,
+            timeout: float = 5.0):
+    """Conexión cliente del transporte indicado (GatewayClient, benchmarks)."""
+    transport = transport or network_config.TRANSPORT
+    if transport == 'tcp':
+        sock = socket.create_connection(
+            (host, network_config.PORT if port is None else port), timeout)
+        if network_config.TCP_NODELAY:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+    if transport == 'unix':
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(network_config.UNIX_PATH)
+        return sock
+    if transport == 'shm':
+        return connect_shm(timeout=timeout)
+    raise ValueError(f"Transporte desconocido: {transport} (opciones: {TRANSPORTS})")
@@ -32,7 +32,7 @@ import numpy as np
 import matplotlib
 matplotlib.use('Agg')  # Para entornos sin pantalla
 import matplotlib.pyplot as plt
-from sklearn.metrics import confusion_matrix
+from utils.result_cache import ResultCache, file_digest
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -46,6 +46,7 @@ TURBINA_LOG_PATH = os.path.join("data_logs_gemelo",
 # Modelos de Felipe
 MODEL_PATH  = os.path.join("modelos_exportados", "iso_forest_turbina_v1.pkl")
 SCALER_PATH = os.path.join("modelos_exportados", "scaler_turbina_v1.pkl")
+ARTIFACT_PATH = os.path.join("modelos_exportados", "turbina_v1")
 
 # Valor de wm en estado estacionario de Simulink (rad/s) — figura 6 del paper
 OMEGA_SIMULINK = 1.57
@@ -60,6 +61,12 @@ AIR_DENSITY = 1.03
 RANDOM_SEED = 42
 np.random.seed(RANDOM_SEED)
 
+# Caché de etapas (resultados/cache/): datos limpios y scores se reutilizan
+# mientras no cambien el log, el modelo ni los parámetros de los ataques.
+# Con False se recalcula todo (no se lee ni se escribe la caché).
+USE_CACHE = True
+cache = ResultCache(enabled=USE_CACHE)
+
 # -----------------------------------------------------------------------------
 # PASO 1 — CARGA Y PREPARACIÓN DE DATOS
 # -----------------------------------------------------------------------------
@@ -67,20 +74,34 @@ print("=" * 60)
 print("PASO 1: Cargando y preparando datos...")
 print("=" * 60)
 
-df = pd.read_csv(TURBINA_LOG_PATH)
-df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-df = df.sort_values('Timestamp').reset_index(drop=True)
-
-# Separar estado estable (wm estabilizado) vs arranque/transitorios
-# Umbral: p5 de wm — excluye los pocos puntos de arranque
-STEADY_THRESH = df['Velocidad_Mecanica_rads'].quantile(0.05)
-df_normal   = df[df['Velocidad_Mecanica_rads'] >= STEADY_THRESH].copy()
-df_arranque = df[df['Velocidad_Mecanica_rads'] <  STEADY_THRESH].copy()
-
-print(f"Total de registros       : {len(df)}")
+SIGNAL_COLUMNS = ['Velocidad_Mecanica_rads', 'Potencia_Activa_kW', 'Velocidad_Viento_ms']
+
+def clean_log():
+    """Lee, ordena y separa el log; retorna las columnas de estado estable."""
+    df = pd.read_csv(TURBINA_LOG_PATH)
+    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
+    df = df.sort_values('Timestamp').reset_index(drop=True)
+
+    # Separar estado estable (wm estabilizado) vs arranque/transitorios
+    # Umbral: p5 de wm — excluye los pocos puntos de arranque
+    steady_thresh = df['Velocidad_Mecanica_rads'].quantile(0.05)
+    df_normal = df[df['Velocidad_Mecanica_rads'] >= steady_thresh]
+    arrays = {col: df_normal[col].to_numpy(dtype=np.float64) for col in SIGNAL_COLUMNS}
+    meta = {'total': len(df), 'arranque': len(df) - len(df_normal),
+            'steady_thresh': float(steady_thresh)}
+    return arrays, meta
+
+clean = cache.stage('clean', [file_digest(TURBINA_LOG_PATH)], clean_log)
+df_normal = pd.DataFrame(clean.arrays, columns=SIGNAL_COLUMNS)
+STEADY_THRESH = clean.meta['steady_thresh']
+n_registros, n_arranque = clean.meta['total'], clean.meta['arranque']
+
+if clean.hit:
+    print(f"  (datos limpios desde la caché {clean.key[:12]})")
+print(f"Total de registros       : {n_registros}")
 print(f"Umbral estado estable    : {STEADY_THRESH:.4f} rad/s  (percentil 5)")
-print(f"Registros estado estable : {len(df_normal)} ({100*len(df_normal)/len(df):.1f}%)")
-print(f"Registros arranque       : {len(df_arranque)} ({100*len(df_arranque)/len(df):.1f}%)")
+print(f"Registros estado estable : {len(df_normal)} ({100*len(df_normal)/n_registros:.1f}%)")
+print(f"Registros arranque       : {n_arranque} ({100*n_arranque/n_registros:.1f}%)")
 print(f"wm media estado estable  : {df_normal['Velocidad_Mecanica_rads'].mean():.4f} rad/s")
 print(f"wm std  estado estable   : {df_normal['Velocidad_Mecanica_rads'].std():.4f} rad/s")
 
@@ -91,13 +112,41 @@ print("\n" + "=" * 60)
 print("PASO 2: Cargando modelo Isolation Forest de Felipe...")
 print("=" * 60)
 
-scaler = joblib.load(SCALER_PATH)
-clf    = joblib.load(MODEL_PATH)
-
-print(f"  Modelo   : {type(clf).__name__}")
-print(f"  Features : {list(scaler.feature_names_in_)}")
-print(f"  Medias scaler: {scaler.mean_}")
-print(f"  n_estimators={clf.n_estimators}, contamination={clf.contamination}")
+# Clave del modelo: contenido del artefacto y de los .pkl de respaldo.
+# El modelo solo se carga si alguna etapa de scores no está en la caché.
+MODEL_KEY = [file_digest(p) if os.path.exists(p) else None
+             for p in (ARTIFACT_PATH, SCALER_PATH, MODEL_PATH)]
+_model = None
+
+def load_model():
+    """(scaler, clf): artefacto mapeado en memoria (core/model_artifact.py) o .pkl."""
+    global _model
+    if _model is not None:
+        return _model
+    try:
+        from core import model_artifact
+        # Tras un reentrenamiento los .pkl cambian (y la clave de caché también):
+        # un artefacto exportado de los .pkl anteriores no puede puntuar
+        if model_artifact.is_stale(ARTIFACT_PATH, {'scaler': SCALER_PATH, 'model': MODEL_PATH}):
+            raise ValueError("desactualizado respecto a los .pkl")
+        artifact = model_artifact.load_artifact(ARTIFACT_PATH)
+        scaler, clf = artifact.scaler, artifact.forest
+        print(f"  Modelo   : FlatForest (artefacto {ARTIFACT_PATH})")
+        print(f"  Features : {list(scaler.feature_names_in_)}")
+        print(f"  Medias scaler: {scaler.mean_}")
+        print(f"  n_estimators={clf.n_trees}, "
+              f"contamination={artifact.manifest['forest']['contamination']}")
+    except (ImportError, OSError, ValueError, KeyError) as e:
+        print(f"  Artefacto no disponible ({e}); cargando .pkl con joblib")
+        scaler = joblib.load(SCALER_PATH)
+        clf    = joblib.load(MODEL_PATH)
+
+        print(f"  Modelo   : {type(clf).__name__}")
+        print(f"  Features : {list(scaler.feature_names_in_)}")
+        print(f"  Medias scaler: {scaler.mean_}")
+        print(f"  n_estimators={clf.n_estimators}, contamination={clf.contamination}")
+    _model = (scaler, clf)
+    return _model
 
 # Helper: construye el vector de features en el mismo orden y unidades
 # que usó Felipe para entrenar, IGUAL que hace tcp_server.py en producción.
@@ -119,18 +168,29 @@ def build_features(wind, wm_rads, power_kw, air=AIR_DENSITY):
 
 def predict_with_model(X_raw):
     """Escala y predice igual que MLInferenceEngine.predict()."""
+    scaler, clf = load_model()
     X_scaled = scaler.transform(X_raw)
-    preds  = clf.predict(X_scaled)           # -1 = anomalía, +1 = normal
     scores = clf.decision_function(X_scaled) # <0 = anomalía, >0 = normal
+    preds  = np.where(scores < 0, -1, 1)     # -1 = anomalía, +1 = normal (= clf.predict)
     return preds, scores
 
+def cached_scores(name, matrices, params=None):
+    """Scores de cada matriz de features, desde la caché si modelo y datos no cambiaron."""
+    stage = cache.stage(
+        name, [MODEL_KEY, params, *matrices.values()],
+        lambda: ({k: predict_with_model(X)[1] for k, X in matrices.items()}, {}))
+    if stage.hit:
+        print(f"  (scores '{name}' desde la caché {stage.key[:12]}; modelo sin cargar)")
+    # preds = clf.predict, derivado del score
+    return {k: (np.where(s < 0, -1, 1), s) for k, s in stage.arrays.items()}
+
 # Verificación: el modelo debe clasificar datos de entrenamiento como NORMAL
 X_check = build_features(
     df_normal['Velocidad_Viento_ms'].values,
     df_normal['Velocidad_Mecanica_rads'].values,
     df_normal['Potencia_Activa_kW'].values
 )
-preds_check, scores_check = predict_with_model(X_check)
+preds_check, scores_check = cached_scores('check', {'check': X_check})['check']
 fpr_base = np.mean(preds_check == -1)
 print(f"\n  Verificación sobre {len(df_normal)} filas de estado estable:")
 print(f"    NORMAL  : {(preds_check==1).sum()} ({100*(preds_check==1).mean():.1f}%)")
@@ -232,13 +292,17 @@ print("=" * 60)
 
 results = {}
 
-for attack_name, omega_attacked in attacks.items():
-    label = attack_name.split('\n')[0]
+# Construir features con el wm atacado (el atacante solo altera el tacómetro)
+# viento y potencia quedan inalterados (el atacante no los controla)
+attack_features = {f"attack{i}": build_features(wind_base, omega_attacked, potencia_base)
+                   for i, omega_attacked in enumerate(attacks.values())}
+ATTACK_PARAMS = {'n_total': n_total, 'n_ataque': n_ataque, 'ini_ataque': ini_ataque,
+                 'bias': BIAS_VALUE, 'seed': RANDOM_SEED}
+attack_scores = cached_scores('attacks', attack_features, ATTACK_PARAMS)
 
-    # Construir features con el wm atacado (el atacante solo altera el tacómetro)
-    # viento y potencia quedan inalterados (el atacante no los controla)
-    X_test_raw = build_features(wind_base, omega_attacked, potencia_base)
-    preds_raw, scores = predict_with_model(X_test_raw)
+for (attack_name, omega_attacked), (preds_raw, scores) in zip(attacks.items(),
+                                                             attack_scores.values()):
+    label = attack_name.split('\n')[0]
 
     # Convertir a 0=normal, 1=anomalía detectada
     preds = (preds_raw == -1).astype(int)
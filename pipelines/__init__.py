@@ -0,0 +1 @@
+"""Pipelines de datos y modelo (ingesta de reportes y reentrenamiento)"""
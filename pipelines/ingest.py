@@ -0,0 +1,383 @@
+"""Ingesta incremental y paralela de los reportes diarios del fabricante.
+
+Reemplaza `modelos_exportados/model/01_pre_procesamiento.ipynb` (unión de
+los cuatro CSV GEN/WIND/PWR/AIR por día) y la preparación de
+`02_aed_y_ML_model.ipynb` (reglas físicas, potencia reconstruida y score
+del Isolation Forest), y escribe el mismo layout `data/data_YYYY-MM-DD.parquet`
+que usan FilePlayerManager, el barrido Monte Carlo y la curva de potencia.
+
+- Cada día se procesa en un worker de un pool de procesos.
+- Los CSV se leen en streaming con tipos por columna (pyarrow.csv) y la
+  media por instante se acumula bloque a bloque.
+- Un manifiesto en la carpeta de salida guarda tamaño, mtime y sha256 de
+  cada CSV de origen; los días sin cambios (y con la misma versión de
+  pipeline y modelo) se saltan.
+- Cada parquet se escribe en un temporal y se publica con os.replace.
+
+    python3 -m pipelines.ingest "0 REPORTES DIARIOS 2024" "1 REPORTES DIARIOS 2025"
+    python3 -m pipelines.ingest --workers 4 --force
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pacsv
+
+from config.settings import file_player_config, pipeline_config
+
+# Versión del procesamiento: si cambia, se reprocesan todos los días
+INGEST_VERSION = 1
+
+# Palabra clave en el nombre del CSV -> prefijo de columnas (igual que el notebook)
+FILES_CONFIG = {
+    "Generator speed": "GEN",
+    "wind speed and wind direction": "WIND",
+    "ActivePower": "PWR",
+    "Air density": "AIR",
+}
+SKIP_COLUMNS = ("Time", "Number", "Wind turbine")
+
+# Reglas físicas del notebook 02: (columna, umbral de error grave)
+PHYSICAL_RULES = (
+    ('GEN_Generator speed-Aver', -1.0),
+    ('WIND_Wind speed 10min-Aver', -0.5),
+    ('PWR_TotalActivePower-Aver', -100.0),
+)
+
+# Features del modelo en el orden de entrenamiento
+MODEL_FEATURES = [
+    'WIND_Wind speed 10min-Aver',
+    'GEN_Generator speed-Aver',
+    'PWR_TotalActivePower-Aver',
+    'AIR_Air density-Aver',
+]
+
+
+# ----------------------------------------------------------------------
+# Descubrimiento y huellas de origen
+# ----------------------------------------------------------------------
+
+def discover_days(roots: Sequence[str]) -> List[Path]:
+    """Carpetas de día bajo <año>/<mes>_*/<202*> como en los reportes del fabricante."""
+    days = []
+    for root in map(Path, roots):
+        if not root.exists():
+            print(f"No existe: {root}")
+            continue
+        for month in sorted(root.glob("*_*")):
+            if month.is_dir():
+                days.extend(d for d in sorted(month.glob("202*")) if d.is_dir())
+    return days
+
+
+def find_sources(day: Path) -> Dict[str, Path]:
+    """CSV del día por prefijo (búsqueda por palabra clave sin distinguir mayúsculas)."""
+    files = sorted(day.glob("*.csv"))
+    sources = {}
+    for keyword, prefix in FILES_CONFIG.items():
+        for path in files:
+            if keyword.lower() in path.name.lower():
+                sources[prefix] = path
+                break
+    return sources
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def fingerprint(sources: Dict[str, Path], previous: Optional[dict] = None) -> Dict[str, dict]:
+    """Tamaño, mtime y sha256 de cada CSV de origen.
+
+    Si tamaño y mtime coinciden con la huella previa se reutiliza su sha256
+    y el archivo no se vuelve a leer.
+    """
+    previous = previous or {}
+    out = {}
+    for prefix, path in sources.items():
+        st = path.stat()
+        old = previous.get(prefix)
+        if old and old['file'] == path.name and old['size'] == st.st_size \
+                and old['mtime_ns'] == st.st_mtime_ns:
+            digest = old['sha256']
+        else:
+            digest = _sha256(path)
+        out[prefix] = {'file': path.name, 'size': st.st_size,
+                       'mtime_ns': st.st_mtime_ns, 'sha256': digest}
+    return out
+
+
+def _same_sources(a: Dict[str, dict], b: Dict[str, dict]) -> bool:
+    return (a.keys() == b.keys()
+            and all(a[k]['file'] == b[k]['file'] and a[k]['sha256'] == b[k]['sha256'] for k in a))
+
+
+# ----------------------------------------------------------------------
+# Lectura y transformación de un día
+# ----------------------------------------------------------------------
+
+def read_vendor_csv(path: Path, prefix: str,
+                    block_size: int = None) -> Optional[pd.DataFrame]:
+    """Lee un CSV del fabricante en streaming y promedia por instante.
+
+    'Time' se lee como texto y se interpreta como en el notebook
+    (`pd.to_datetime(errors='coerce')`); el resto de columnas de datos se
+    convierte directamente a float64. Las sumas y conteos por instante se
+    acumulan bloque a bloque, así la media es la de todo el archivo aunque
+    un instante quede repartido entre bloques.
+
+    Returns: DataFrame indexado por 'Time' con columnas '<prefijo>_<columna>'
+    """
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        raw = next(csv.reader([f.readline()]))
+    names = [c.strip() for c in raw]
+    if 'Time' not in names:
+        print(f"'Time' no aparece en {path.name}")
+        return None
+
+    time_col = raw[names.index('Time')]
+    data_cols = [r for r, n in zip(raw, names) if n not in SKIP_COLUMNS]
+    convert = pacsv.ConvertOptions(
+        column_types={time_col: pa.string(), **{c: pa.float64() for c in data_cols}},
+        include_columns=[time_col] + data_cols,
+    )
+    reader = pacsv.open_csv(
+        path,
+        read_options=pacsv.ReadOptions(block_size=block_size or pipeline_config.INGEST_CHUNK_BYTES),
+        convert_options=convert,
+    )
+
+    sums, counts = None, None
+    for batch in reader:
+        chunk = batch.to_pandas()
+        stamps = pd.to_datetime(chunk.pop(time_col), errors='coerce')
+        chunk.index = pd.DatetimeIndex(stamps, name='Time')
+        chunk = chunk[chunk.index.notna()]
+        if chunk.empty:
+            continue
+        grouped = chunk.groupby(level=0)
+        s, c = grouped.sum(), grouped.count()
+        sums = s if sums is None else sums.add(s, fill_value=0.0)
+        counts = c if counts is None else counts.add(c, fill_value=0)
+
+    if sums is None:
+        print(f"{path.name} no tiene datos válidos")
+        return None
+
+    mean = sums / counts.where(counts > 0)
+    mean.columns = [f"{prefix}_{c.strip()}" for c in mean.columns]
+    return mean.sort_index()
+
+
+def join_day(sources: Dict[str, Path]) -> Optional[pd.DataFrame]:
+    """Une los CSV del día por 'Time' (outer), en el orden de FILES_CONFIG."""
+    frames = []
+    for prefix in FILES_CONFIG.values():
+        if prefix not in sources:
+            continue
+        df = read_vendor_csv(sources[prefix], prefix)
+        if df is not None:
+            frames.append(df)
+    if not frames:
+        return None
+    return pd.concat(frames, axis=1, join='outer').sort_index(kind='stable')
+
+
+def clean_day(df: pd.DataFrame) -> pd.DataFrame:
+    """Reglas físicas y potencia reconstruida del notebook 02.
+
+    - Descarta filas bajo el umbral de error grave (y las que no tienen dato)
+    - Lleva a 0 los negativos pequeños (ruido de cero)
+    - Sin instantes duplicados
+    - PWR_TotalActivePower-Aver = (Max - Min) * 6 (acumulado de 10 min -> kW),
+      recortada a >= 0 y filtrada por POWER_LIMIT_KW
+    """
+    for column, threshold in PHYSICAL_RULES:
+        if column not in df.columns:
+            continue
+        df = df[df[column] >= threshold].copy()
+        df.loc[df[column] < 0, column] = 0
+
+    df = df[~df.index.duplicated(keep='first')]
+
+    power = ((df['PWR_TotalActivePower-Max'] - df['PWR_TotalActivePower-Min']) * 6).clip(lower=0)
+    keep = power < pipeline_config.POWER_LIMIT_KW
+    df = df[keep].drop(columns=['PWR_TotalActivePower-Aver'], errors='ignore')
+    df['PWR_TotalActivePower-Aver'] = power[keep]
+    return df
+
+
+def score_day(df: pd.DataFrame, artifact) -> pd.DataFrame:
+    """Agrega anomaly_score / is_anomaly / estado con el artefacto del modelo."""
+    X = df[MODEL_FEATURES].dropna()
+    df['anomaly_score'] = np.nan
+    df['is_anomaly'] = np.nan
+    if len(X):
+        score = artifact.forest.decision_function(artifact.scaler.transform(X.to_numpy()))
+        df.loc[X.index, 'anomaly_score'] = score
+        df.loc[X.index, 'is_anomaly'] = np.where(score < 0, -1.0, 1.0)
+    df['estado'] = df['is_anomaly'].map({1.0: 'Normal', -1.0: 'Anomalía'})
+    return df
+
+
+def _write_parquet(df: pd.DataFrame, path: Path) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    df.to_parquet(tmp)
+    os.replace(tmp, path)
+
+
+_worker_artifact = None
+
+
+def _init_worker(score: bool) -> None:
+    # Un artefacto mapeado por proceso (páginas compartidas entre workers)
+    global _worker_artifact
+    if score:
+        from core.model_artifact import load_artifact
+        _worker_artifact = load_artifact()
+
+
+def process_day(day: Path, out_dir: Path, artifact=None) -> dict:
+    """Procesa una carpeta de día y escribe data_<día>.parquet.
+
+    Returns: {'day', 'rows', 'output', 'missing', 'error'}
+    """
+    artifact = artifact or _worker_artifact
+    result = {'day': day.name, 'rows': 0, 'output': None, 'missing': [], 'error': None}
+    try:
+        sources = find_sources(day)
+        result['missing'] = [k for k, p in FILES_CONFIG.items() if p not in sources]
+        df = join_day(sources)
+        if df is None or df.empty:
+            result['error'] = "sin datos"
+            return result
+        df = clean_day(df)
+        if artifact is not None:
+            df = score_day(df, artifact)
+        output = out_dir / f"data_{day.name}.parquet"
+        _write_parquet(df, output)
+        result.update(rows=len(df), output=output.name)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    return result
+
+
+# ----------------------------------------------------------------------
+# Manifiesto y orquestación
+# ----------------------------------------------------------------------
+
+def _load_manifest(path: Path) -> dict:
+    if path.exists():
+        with open(path) as f:
+            return json.load(f)
+    return {'days': {}}
+
+
+def _save_manifest(manifest: dict, path: Path) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _model_id(score: bool) -> Optional[str]:
+    # Identidad del modelo que puntúa: un modelo nuevo obliga a reprocesar
+    if not score:
+        return None
+    from core.model_artifact import default_path, read_manifest
+    sources = read_manifest(default_path()).get('sources', {})
+    return sources.get('model', {}).get('sha256', 'desconocido')
+
+
+def run_ingest(roots: Sequence[str] = None, out_dir: str = None, workers: Optional[int] = None,
+               force: bool = False, score: bool = True) -> pd.DataFrame:
+    """Ingesta incremental de las carpetas de día bajo `roots`.
+
+    Args:
+        roots: Carpetas de año (por defecto PipelineConfig.INGEST_ROOTS)
+        out_dir: Carpeta de parquet (por defecto FilePlayerConfig.DATA_DIR)
+        workers: Procesos del pool (None = núcleos disponibles)
+        force: Reprocesar aunque las huellas no hayan cambiado
+        score: Agregar el score del Isolation Forest (artefacto del modelo)
+    Returns: Resumen de los días procesados en esta corrida
+    """
+    out = Path(out_dir or file_player_config.DATA_DIR)
+    out.mkdir(parents=True, exist_ok=True)
+    manifest_path = out / pipeline_config.INGEST_MANIFEST
+    manifest = _load_manifest(manifest_path)
+    model_id = _model_id(score)
+
+    days = discover_days(roots or pipeline_config.INGEST_ROOTS)
+    pending = {}
+    for day in days:
+        prev = manifest['days'].get(day.name, {})
+        prints = fingerprint(find_sources(day), prev.get('sources'))
+        unchanged = (prev.get('version') == INGEST_VERSION
+                     and prev.get('model') == model_id
+                     and _same_sources(prev.get('sources', {}), prints)
+                     and (out / prev.get('output', '')).is_file())
+        if force or not unchanged:
+            pending[day] = prints
+
+    print(f"Días encontrados: {len(days)} | Sin cambios: {len(days) - len(pending)} | "
+          f"A procesar: {len(pending)}")
+    if not pending:
+        return pd.DataFrame(columns=['day', 'rows', 'output', 'missing', 'error'])
+
+    t0 = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(score,)) as pool:
+        futures = {pool.submit(process_day, day, out): day for day in pending}
+        for done, future in enumerate(as_completed(futures), start=1):
+            day = futures[future]
+            result = future.result()
+            results.append(result)
+            if result['missing']:
+                print(f"  {day.name}: faltan {', '.join(result['missing'])}")
+            if result['error']:
+                print(f"  {day.name}: no se generó data ({result['error']})")
+            else:
+                manifest['days'][day.name] = {
+                    'version': INGEST_VERSION, 'model': model_id,
+                    'sources': pending[day], 'output': result['output'],
+                    'rows': result['rows'], 'written': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                }
+                # Tras cada día: una corrida interrumpida no repite lo ya escrito
+                _save_manifest(manifest, manifest_path)
+            print(f"  Día {done}/{len(pending)} {day.name} "
+                  f"({result['rows']} filas, {time.perf_counter() - t0:.1f} s)")
+
+    return pd.DataFrame(results).sort_values('day', ignore_index=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Ingesta incremental de reportes diarios a data/*.parquet")
+    parser.add_argument('roots', nargs='*', help="Carpetas de año (por defecto PipelineConfig.INGEST_ROOTS)")
+    parser.add_argument('--out', default=file_player_config.DATA_DIR)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--force', action='store_true', help="Reprocesar todos los días")
+    parser.add_argument('--no-score', action='store_true',
+                        help="No agregar anomaly_score / is_anomaly / estado")
+    args = parser.parse_args()
+
+    summary = run_ingest(args.roots or None, args.out, args.workers, args.force, not args.no_score)
+    ok = summary['error'].isna().sum() if len(summary) else 0
+    print(f"Total de días procesados: {ok}")
+
+
+if __name__ == "__main__":
+    main()
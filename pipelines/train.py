@@ -0,0 +1,349 @@
+"""Reentrenamiento del Isolation Forest desde el archivo y los logs de sesión.
+
+Reemplaza el entrenamiento interactivo de `02_aed_y_ML_model.ipynb` con
+memoria acotada:
+
+- Los parquet de `data/` se leen por lotes de filas (pyarrow) y los CSV de
+  `data_logs/` por chunks, solo con las columnas de las features.
+- Las reglas físicas del notebook se aplican vectorizadas por chunk.
+- Un reservorio de tamaño fijo (muestreo de reservorio, algoritmo R
+  vectorizado) conserva una muestra uniforme de todo lo leído, sin importar
+  cuántos años haya en el archivo.
+- StandardScaler + IsolationForest(n_jobs) sobre el reservorio, con una
+  fracción reservada para validación.
+- Salida versionada en `modelos_exportados/`: scaler/modelo .pkl, artefacto
+  mapeable (core/model_artifact.py) y reporte JSON de validación.
+
+    python3 -m pipelines.train
+    python3 -m pipelines.train --reservoir 500000 --n-jobs 4 --no-logs
+"""
+import argparse
+import glob
+import json
+import os
+import re
+import time
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from config.settings import (file_player_config, ml_config, physics_config,
+                             pipeline_config, storage_config)
+from core.telemetry import StatusCode, STATUS_LABELS
+from pipelines.ingest import MODEL_FEATURES, PHYSICAL_RULES
+
+# Nombres con los que se ajustó el scaler original (feature_names_in_)
+SCALER_FEATURES = [
+    'WIND_Wind speed 10min-Aver',
+    'GEN_Generator speed-Aver',
+    'ActivePower_kW',
+    'AIR_Air density-Aver',
+]
+
+# Columnas del CSV de sesión usadas como features
+LOG_COLUMNS = ['Velocidad_Viento_ms', 'Velocidad_Mecanica_rads',
+               'Potencia_Activa_kW', 'Status_IA']
+
+# Umbral de error grave por índice de feature (reglas físicas del notebook)
+_RULES = [(MODEL_FEATURES.index(col), threshold) for col, threshold in PHYSICAL_RULES]
+
+
+# ----------------------------------------------------------------------
+# Lectura por chunks
+# ----------------------------------------------------------------------
+
+def iter_archive(data_dir: str = None, chunk_rows: int = None) -> Iterator[np.ndarray]:
+    """Chunks (N, 4) de features desde data/*.parquet."""
+    data_dir = data_dir or file_player_config.DATA_DIR
+    chunk_rows = chunk_rows or pipeline_config.TRAIN_CHUNK_ROWS
+    for path in sorted(glob.glob(os.path.join(data_dir, '*.parquet'))):
+        pf = pq.ParquetFile(path)
+        if not set(MODEL_FEATURES) <= set(pf.schema_arrow.names):
+            print(f"  {os.path.basename(path)}: sin las columnas de features, se omite")
+            continue
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=MODEL_FEATURES):
+            yield np.column_stack([batch.column(c).to_numpy(zero_copy_only=False)
+                                   for c in MODEL_FEATURES]).astype(np.float64)
+
+
+def iter_logs(log_dir: str = None, chunk_rows: int = None) -> Iterator[np.ndarray]:
+    """Chunks (N, 4) de features desde los CSV de sesión, solo filas NORMAL.
+
+    Mismas unidades que el servidor TCP: rpm = wm * RAD_TO_RPM y densidad
+    del aire constante (MLConfig.AIR_DENSITY).
+    """
+    log_dir = log_dir or storage_config.LOG_DIR
+    chunk_rows = chunk_rows or pipeline_config.TRAIN_CHUNK_ROWS
+    normal = STATUS_LABELS[StatusCode.NORMAL]
+    for path in sorted(glob.glob(os.path.join(log_dir, 'turbina_log_*.csv'))):
+        try:
+            reader = pd.read_csv(path, usecols=LOG_COLUMNS, chunksize=chunk_rows,
+                                 dtype={c: np.float64 for c in LOG_COLUMNS[:3]})
+            for chunk in reader:
+                # Sin anomalías ni errores del modelo vigente en el entrenamiento
+                chunk = chunk[chunk['Status_IA'] == normal]
+                if chunk.empty:
+                    continue
+                yield np.column_stack([
+                    chunk['Velocidad_Viento_ms'].to_numpy(),
+                    chunk['Velocidad_Mecanica_rads'].to_numpy() * physics_config.RAD_TO_RPM,
+                    chunk['Potencia_Activa_kW'].to_numpy(),
+                    np.full(len(chunk), ml_config.AIR_DENSITY),
+                ])
+        except (ValueError, KeyError) as e:
+            print(f"  {os.path.basename(path)}: formato no reconocido ({e}), se omite")
+
+
+def clean_chunk(X: np.ndarray) -> np.ndarray:
+    """Reglas físicas del notebook, vectorizadas sobre un chunk (N, 4).
+
+    Descarta filas incompletas o bajo el umbral de error grave y lleva a 0
+    los negativos pequeños de las columnas con regla.
+    """
+    keep = np.isfinite(X).all(axis=1)
+    for j, threshold in _RULES:
+        keep &= X[:, j] >= threshold
+    X = X[keep]
+    for j, _ in _RULES:
+        np.maximum(X[:, j], 0.0, out=X[:, j])
+    return X
+
+
+# ----------------------------------------------------------------------
+# Muestreo de reservorio
+# ----------------------------------------------------------------------
+
+class Reservoir:
+    """Muestra uniforme de tamaño fijo de un flujo de filas (algoritmo R).
+
+    Cada fila i (base 0) reemplaza la posición j ~ U[0, i] si j < capacidad.
+    Por chunk se sortean todas las j de una vez; con índices repetidos la
+    asignación de NumPy conserva la última, igual que el orden secuencial.
+    """
+
+    def __init__(self, capacity: int, n_features: int, seed: int = 0):
+        self.capacity = capacity
+        self.data = np.empty((capacity, n_features))
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return min(self.seen, self.capacity)
+
+    def add(self, X: np.ndarray) -> None:
+        n = len(X)
+        if n == 0:
+            return
+        fill = max(0, min(n, self.capacity - self.seen))
+        if fill:
+            self.data[self.seen:self.seen + fill] = X[:fill]
+        rest = X[fill:]
+        if len(rest):
+            idx = np.arange(self.seen + fill, self.seen + n)
+            j = (self.rng.random(len(rest)) * (idx + 1)).astype(np.int64)
+            hit = j < self.capacity
+            self.data[j[hit]] = rest[hit]
+        self.seen += n
+
+    def sample(self) -> np.ndarray:
+        return self.data[:len(self)]
+
+
+# ----------------------------------------------------------------------
+# Entrenamiento y validación
+# ----------------------------------------------------------------------
+
+def collect_sample(data_dir: str = None, log_dir: Optional[str] = '',
+                   reservoir_size: int = None, seed: int = None):
+    """Recorre el archivo (y los logs si `log_dir`) y llena el reservorio.
+
+    Returns: (Reservoir, {fuente: {'rows_read', 'rows_kept'}})
+    """
+    reservoir = Reservoir(reservoir_size or pipeline_config.TRAIN_RESERVOIR,
+                          len(MODEL_FEATURES),
+                          pipeline_config.TRAIN_SEED if seed is None else seed)
+    counts = {}
+    sources = [('archivo', iter_archive(data_dir))]
+    if log_dir:
+        sources.append(('logs', iter_logs(log_dir)))
+    for name, chunks in sources:
+        read = kept = 0
+        for X in chunks:
+            read += len(X)
+            X = clean_chunk(X)
+            kept += len(X)
+            reservoir.add(X)
+        counts[name] = {'rows_read': read, 'rows_kept': kept}
+        print(f"  {name}: {read} filas leídas, {kept} tras reglas físicas")
+    return reservoir, counts
+
+
+def next_version(model_dir: str) -> int:
+    """Siguiente versión libre de iso_forest_turbina_v<N>.pkl."""
+    found = [int(m.group(1)) for f in os.listdir(model_dir)
+             if (m := re.fullmatch(r'iso_forest_turbina_v(\d+)\.pkl', f))]
+    return max(found, default=0) + 1
+
+
+def _regime_rates(X: np.ndarray, anomalous: np.ndarray, width: float = 2.0) -> Dict[str, dict]:
+    # Tasa de anomalías por régimen de viento (misma partición que la calibración)
+    bins = np.floor(X[:, 0] / width).astype(int)
+    out = {}
+    for b in np.unique(bins):
+        sel = bins == b
+        out[f"{b * width:g}-{(b + 1) * width:g}"] = {
+            'samples': int(sel.sum()), 'anomaly_rate': float(anomalous[sel].mean())}
+    return out
+
+
+def validate(scaler, model, X_train: np.ndarray, X_val: np.ndarray) -> dict:
+    """Reporte de validación: tasas, cuantiles y acuerdo con el modelo vigente."""
+    s_train = model.decision_function(scaler.transform(_frame(X_train)))
+    s_val = model.decision_function(scaler.transform(_frame(X_val)))
+    report = {
+        'train_anomaly_rate': float(np.mean(s_train < 0)),
+        'validation_anomaly_rate': float(np.mean(s_val < 0)),
+        'validation_score_quantiles': {
+            f'q{q:g}': float(np.quantile(s_val, q)) for q in (0.01, 0.04, 0.1, 0.5, 0.9)},
+        'validation_by_wind_regime': _regime_rates(X_val, s_val < 0),
+    }
+
+    # Acuerdo con el modelo en producción sobre la misma validación
+    try:
+        from core.ml_inference import MLInferenceEngine
+        current = MLInferenceEngine(calibrate=False)
+        if current.is_active:
+            s_cur = current._decision(current.scaler.transform(X_val), exact=True)
+            report['vs_current_model'] = {
+                'status_agreement': float(np.mean((s_cur < 0) == (s_val < 0))),
+                'score_correlation': float(np.corrcoef(s_cur, s_val)[0, 1]),
+                'current_anomaly_rate': float(np.mean(s_cur < 0)),
+            }
+    except Exception as e:
+        report['vs_current_model'] = {'error': str(e)}
+    return report
+
+
+def _frame(X: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame(X, columns=SCALER_FEATURES)
+
+
+def train(data_dir: str = None, log_dir: Optional[str] = None, out_dir: str = None,
+          reservoir_size: int = None, n_estimators: int = None, contamination: float = None,
+          n_jobs: Optional[int] = None, validation: float = None, seed: int = None,
+          version: Optional[int] = None) -> dict:
+    """Entrena y publica una versión nueva del scaler y del modelo.
+
+    Args:
+        data_dir: Carpeta de parquet del archivo (None = FilePlayerConfig.DATA_DIR)
+        log_dir: Carpeta de CSV de sesión; '' para no usarlos
+        out_dir: Carpeta de modelos (None = MLConfig.MODEL_DIR)
+        reservoir_size: Filas máximas en memoria para el ajuste
+        n_jobs: Procesos de sklearn para ajustar los árboles (-1 = todos)
+        validation: Fracción del reservorio reservada para validación
+        version: Versión a escribir (None = siguiente libre)
+    Returns: Reporte de entrenamiento (también escrito como JSON)
+    """
+    from sklearn.ensemble import IsolationForest
+    from sklearn.preprocessing import StandardScaler
+    import joblib
+
+    from core import model_artifact
+
+    cfg = pipeline_config
+    out_dir = out_dir or ml_config.MODEL_DIR
+    reservoir_size = reservoir_size or cfg.TRAIN_RESERVOIR
+    n_estimators = n_estimators or cfg.TRAIN_N_ESTIMATORS
+    contamination = contamination or cfg.TRAIN_CONTAMINATION
+    n_jobs = cfg.TRAIN_N_JOBS if n_jobs is None else n_jobs
+    validation = cfg.TRAIN_VALIDATION_FRACTION if validation is None else validation
+    seed = cfg.TRAIN_SEED if seed is None else seed
+    if log_dir is None:
+        log_dir = storage_config.LOG_DIR if cfg.TRAIN_INCLUDE_LOGS else ''
+
+    t0 = time.perf_counter()
+    reservoir, counts = collect_sample(data_dir, log_dir, reservoir_size, seed)
+    sample = reservoir.sample()
+    if len(sample) < 10:
+        raise ValueError(f"Muestras insuficientes para entrenar ({len(sample)})")
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(sample))
+    n_val = int(len(sample) * validation)
+    X_val, X_train = sample[order[:n_val]], sample[order[n_val:]]
+    t_read = time.perf_counter() - t0
+
+    scaler = StandardScaler().fit(_frame(X_train))
+    model = IsolationForest(n_estimators=n_estimators, contamination=contamination,
+                            random_state=seed, n_jobs=n_jobs)
+    t1 = time.perf_counter()
+    model.fit(scaler.transform(_frame(X_train)))
+    t_fit = time.perf_counter() - t1
+    # n_jobs solo acelera el ajuste; en inferencia el motor usa FlatForest
+    model.set_params(n_jobs=None)
+
+    version = version or next_version(out_dir)
+    scaler_file = f'scaler_turbina_v{version}.pkl'
+    model_file = f'iso_forest_turbina_v{version}.pkl'
+    artifact_dir = os.path.join(out_dir, f'turbina_v{version}')
+    for obj, name in ((scaler, scaler_file), (model, model_file)):
+        tmp = os.path.join(out_dir, f'.{name}.tmp')
+        joblib.dump(obj, tmp)
+        os.replace(tmp, os.path.join(out_dir, name))
+    model_artifact.export_artifact(scaler, model, artifact_dir, sources={
+        'scaler': os.path.join(out_dir, scaler_file),
+        'model': os.path.join(out_dir, model_file)})
+
+    report = {
+        'version': version,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'files': {'scaler': scaler_file, 'model': model_file,
+                  'artifact': os.path.basename(artifact_dir)},
+        'params': {'n_estimators': n_estimators, 'contamination': contamination,
+                   'max_samples': int(model.max_samples_), 'seed': seed,
+                   'reservoir': reservoir_size, 'validation_fraction': validation},
+        'sources': counts,
+        'rows_seen': reservoir.seen,
+        'train_rows': len(X_train),
+        'validation_rows': len(X_val),
+        'timing_s': {'read': t_read, 'fit': t_fit, 'total': time.perf_counter() - t0},
+        'scaler': {'mean': scaler.mean_.tolist(), 'scale': scaler.scale_.tolist()},
+    }
+    report.update(validate(scaler, model, X_train, X_val))
+    with open(os.path.join(out_dir, f'train_report_v{version}.json'), 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return report
+
+
+def main() -> None:
+    cfg = pipeline_config
+    parser = argparse.ArgumentParser(description="Reentrenamiento del Isolation Forest con memoria acotada")
+    parser.add_argument('--data-dir', default=file_player_config.DATA_DIR)
+    parser.add_argument('--log-dir', default=storage_config.LOG_DIR)
+    parser.add_argument('--no-logs', action='store_true', help="Solo el archivo parquet")
+    parser.add_argument('--out', default=ml_config.MODEL_DIR)
+    parser.add_argument('--reservoir', type=int, default=cfg.TRAIN_RESERVOIR)
+    parser.add_argument('--n-estimators', type=int, default=cfg.TRAIN_N_ESTIMATORS)
+    parser.add_argument('--contamination', type=float, default=cfg.TRAIN_CONTAMINATION)
+    parser.add_argument('--n-jobs', type=int, default=cfg.TRAIN_N_JOBS)
+    parser.add_argument('--validation', type=float, default=cfg.TRAIN_VALIDATION_FRACTION)
+    parser.add_argument('--seed', type=int, default=cfg.TRAIN_SEED)
+    parser.add_argument('--version', type=int)
+    args = parser.parse_args()
+
+    report = train(args.data_dir, '' if args.no_logs else args.log_dir, args.out,
+                   args.reservoir, args.n_estimators, args.contamination, args.n_jobs,
+                   args.validation, args.seed, args.version)
+    print(f"Versión v{report['version']}: {report['train_rows']} filas de entrenamiento, "
+          f"{report['validation_rows']} de validación ({report['rows_seen']} vistas)")
+    print(f"Anomalías en validación: {report['validation_anomaly_rate']:.1%} | "
+          f"ajuste {report['timing_s']['fit']:.1f} s")
+    if 'status_agreement' in report.get('vs_current_model', {}):
+        print(f"Acuerdo con el modelo vigente: {report['vs_current_model']['status_agreement']:.1%}")
+    print(f"Para usarla: MLConfig.SCALER_FILE='{report['files']['scaler']}', "
+          f"MODEL_FILE='{report['files']['model']}', ARTIFACT_DIR='{report['files']['artifact']}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,6 @@
+"""Módulo de simulación sin MATLAB (gemelo sustituto)"""
+from .pmsg_plant import PMSGPlant, power_coefficient
+from .gateway_client import GatewayClient
+from .monte_carlo import run_sweep, PITCH_POLICIES
+
+__all__ = ['PMSGPlant', 'power_coefficient', 'GatewayClient', 'run_sweep', 'PITCH_POLICIES']
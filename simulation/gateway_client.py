@@ -0,0 +1,180 @@
+import socket
+import struct
+import time
+from typing import Optional
+
+import numpy as np
+
+from config.settings import network_config, control_config
+from core import protocol, transports
+from simulation.pmsg_plant import PMSGPlant
+
+
+class GatewayClient:
+    """Cliente sustituto del S-Function sfun_tcp_gateway (protocolo lock-step).
+
+    Con version=1 envía por cada paso la telemetría '<4d' (wm, P, V, S) y
+    espera el comando '<2d' (viento, pitch), igual que Simulink. Con
+    version=2 usa el protocolo con cabecera (core/protocol.py) y envía
+    bloques de `block` pasos con una sola respuesta por bloque.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = None,
+                 timeout: float = 5.0, version: int = 1, block: int = 1,
+                 transport: str = None):
+        self.host = host
+        self.transport = transport or network_config.TRANSPORT
+        self.port = network_config.PORT if port is None else port
+        self.timeout = timeout
+        self.version = version
+        self.block = block if version == protocol.VERSION else 1
+        self.seq = 0
+        self.fmt_in = network_config.FORMAT_IN
+        self.fmt_out = network_config.FORMAT_OUT
+        self.sz_out = struct.calcsize(self.fmt_out)
+        self.sock: Optional[socket.socket] = None  # O ShmConnection
+
+    def connect(self, retries: int = 50, delay: float = 0.1) -> None:
+        """Conecta al servidor (reintenta mientras el servidor arranca)."""
+        self.seq = 0
+        for attempt in range(retries):
+            try:
+                self.sock = transports.connect(self.transport, self.host,
+                                               self.port, self.timeout)
+                return
+            except OSError:
+                if attempt == retries - 1:
+                    raise
+                time.sleep(delay)
+
+    def close(self) -> None:
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def _recv_exact(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self.sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Servidor cerró la conexión")
+            data += chunk
+        return bytes(data)
+
+    def exchange(self, wm: float, p: float, v: float, s: float):
+        """Un paso lock-step. Retorna (viento, pitch)."""
+        self.sock.sendall(struct.pack(self.fmt_in, wm, p, v, s))
+        return struct.unpack(self.fmt_out, self._recv_exact(self.sz_out))
+
+    def exchange_block(self, frames: np.ndarray, t_sim: float, dt: float) -> np.ndarray:
+        """Un mensaje v2 con K pasos (frames (K, 4)). Retorna comandos (K, 2)."""
+        self.sock.sendall(protocol.pack_request(self.seq, t_sim, dt, frames))
+        header = protocol.unpack_header(self._recv_exact(protocol.HEADER_SIZE))
+        if header.seq != self.seq:
+            raise ConnectionError(f"Respuesta fuera de secuencia: {header.seq} != {self.seq}")
+        self.seq += header.k
+        payload = self._recv_exact(header.k * protocol.FRAME_OUT_SIZE)
+        return np.frombuffer(payload, dtype='<f8').reshape(header.k, 2)
+
+    def run(self, plant: PMSGPlant, n_steps: int, realtime: bool = False) -> dict:
+        """Ejecuta n_steps acoplando la planta sustituta (turbina 0) al servidor.
+
+        Args:
+            realtime: Si True, respeta SIM_STEP en reloj de pared
+        Returns: Estadísticas de la corrida
+        """
+        if self.version == protocol.VERSION:
+            return self._run_v2(plant, n_steps, realtime)
+        dt = control_config.SIM_STEP
+        out = plant.outputs()[0]
+        t0 = time.perf_counter()
+        rtt = np.empty(n_steps)
+        for k in range(n_steps):
+            t_send = time.perf_counter()
+            wind, pitch = self.exchange(*out)
+            rtt[k] = time.perf_counter() - t_send
+            out = plant.step(wind, pitch, dt)[0]
+            if realtime:
+                sleep = t0 + (k + 1) * dt - time.perf_counter()
+                if sleep > 0:
+                    time.sleep(sleep)
+        elapsed = time.perf_counter() - t0
+        return {
+            'steps': n_steps,
+            'elapsed_s': elapsed,
+            'sim_s': n_steps * dt,
+            'speedup': n_steps * dt / elapsed if elapsed > 0 else float('inf'),
+            'rtt_mean_us': float(rtt.mean() * 1e6),
+            'rtt_p99_us': float(np.percentile(rtt, 99) * 1e6),
+        }
+
+    def _run_v2(self, plant: PMSGPlant, n_steps: int, realtime: bool) -> dict:
+        # La planta avanza un bloque completo con los comandos de la respuesta
+        # anterior (uno por paso) y envía sus K salidas en un solo mensaje
+        dt = control_config.SIM_STEP
+        k = self.block
+        n_msgs = -(-n_steps // k)
+        rtt = np.empty(n_msgs)
+        outputs = np.empty((k, 4))
+
+        t0 = time.perf_counter()
+        commands = self.exchange_block(plant.outputs()[:1], 0.0, dt)
+        for m in range(n_msgs):
+            n = min(k, n_steps - m * k)
+            t_first = plant.t + dt
+            for i in range(n):
+                wind, pitch = commands[min(i, len(commands) - 1)]
+                outputs[i] = plant.step(wind, pitch, dt)[0]
+            t_send = time.perf_counter()
+            commands = self.exchange_block(outputs[:n], t_first, dt)
+            rtt[m] = time.perf_counter() - t_send
+            if realtime:
+                sleep = t0 + (m * k + n) * dt - time.perf_counter()
+                if sleep > 0:
+                    time.sleep(sleep)
+        elapsed = time.perf_counter() - t0
+        return {
+            'steps': n_steps,
+            'elapsed_s': elapsed,
+            'sim_s': n_steps * dt,
+            'speedup': n_steps * dt / elapsed if elapsed > 0 else float('inf'),
+            'rtt_mean_us': float(rtt.mean() * 1e6),
+            'rtt_p99_us': float(np.percentile(rtt, 99) * 1e6),
+            'rtt_step_us': float(rtt.sum() / n_steps * 1e6),
+        }
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Planta PMSG sustituta conectada al servidor SCADA")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=network_config.PORT)
+    parser.add_argument('--steps', type=int, default=2000)
+    parser.add_argument('--realtime', action='store_true',
+                        help="Respetar el paso de simulación en tiempo real")
+    parser.add_argument('--protocol', type=int, choices=(1, 2), default=1)
+    parser.add_argument('--transport', choices=transports.TRANSPORTS,
+                        default=network_config.TRANSPORT)
+    parser.add_argument('--block', type=int, default=1,
+                        help="Pasos por mensaje (solo protocolo v2)")
+    args = parser.parse_args()
+
+    plant = PMSGPlant(1)
+    client = GatewayClient(args.host, args.port, version=args.protocol, block=args.block,
+                           transport=args.transport)
+    client.connect()
+    try:
+        stats = client.run(plant, args.steps, args.realtime)
+    finally:
+        client.close()
+
+    print(f"Pasos: {stats['steps']} | Simulado: {stats['sim_s']:.1f} s | "
+          f"Real: {stats['elapsed_s']:.2f} s | x{stats['speedup']:.1f}")
+    print(f"RTT medio: {stats['rtt_mean_us']:.1f} us | p99: {stats['rtt_p99_us']:.1f} us")
+    if 'rtt_step_us' in stats:
+        print(f"RTT por paso: {stats['rtt_step_us']:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import os
+import glob
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from config.settings import file_player_config, control_config
+from core.telemetry import StatusCode
+from simulation.pmsg_plant import PMSGPlant
+
+WIND_COLUMN = 'WIND_Wind speed 1s-Aver'  # Igual que FilePlayerManager
+
+# Columnas del resumen por escenario
+SUMMARY_COLUMNS = [
+    'scenario', 'day', 'policy', 'seed', 'wind_scale',
+    'wind_mean', 'wm_mean', 'wm_max', 'p_mean_kw', 'energy_kwh',
+    'score_mean', 'score_min', 'score_p05', 'anomaly_rate',
+]
+
+
+# ----------------------------------------------------------------------
+# Políticas de pitch: viento (S, T) -> pitch (S, T) [deg]
+# ----------------------------------------------------------------------
+
+def _fixed(angle: float) -> Callable[[np.ndarray], np.ndarray]:
+    return lambda wind: np.full_like(wind, angle)
+
+
+def _rated(v_rated: float = 11.0, gain: float = 2.5) -> Callable[[np.ndarray], np.ndarray]:
+    # Pitch proporcional por encima del viento nominal
+    return lambda wind: np.clip(gain * (wind - v_rated), 0.0, 90.0)
+
+
+PITCH_POLICIES: Dict[str, Callable[[np.ndarray], np.ndarray]] = {
+    'fijo_0': _fixed(0.0),
+    'fijo_5': _fixed(5.0),
+    'fijo_15': _fixed(15.0),
+    'nominal': _rated(),
+}
+
+
+@dataclass
+class ScenarioBatch:
+    # Lote de escenarios que procesa un worker
+    ids: np.ndarray          # (S,)
+    days: List[str]          # (S,)
+    policies: List[str]      # (S,)
+    seeds: np.ndarray        # (S,)
+    scales: np.ndarray       # (S,)
+    wind: np.ndarray         # (S, T) viento por paso
+    lengths: np.ndarray      # (S,) pasos reales de cada día (el resto es relleno)
+
+
+def load_wind_profiles(data_dir: str = None) -> Dict[str, np.ndarray]:
+    """Lee el perfil de viento de cada parquet diario del archivo."""
+    data_dir = data_dir or file_player_config.DATA_DIR
+    profiles = {}
+    for path in sorted(glob.glob(os.path.join(data_dir, '*.parquet'))):
+        wind = pd.read_parquet(path, columns=[WIND_COLUMN])[WIND_COLUMN]
+        profiles[os.path.basename(path)] = wind.interpolate().fillna(0.0).to_numpy(np.float64)
+    return profiles
+
+
+def expand_profile(profile: np.ndarray, hold_steps: int, length: int) -> np.ndarray:
+    """Mantiene cada registro del parquet hold_steps pasos y ajusta a length."""
+    wind = np.repeat(profile, hold_steps)
+    if len(wind) < length:
+        wind = np.pad(wind, (0, length - len(wind)), mode='edge')
+    return wind[:length]
+
+
+def build_scenarios(profiles: Dict[str, np.ndarray], policies: Sequence[str],
+                    samples: int, seed: int = 42) -> List[dict]:
+    """Producto días × políticas × muestras aleatorias (escala + turbulencia)."""
+    rng = np.random.default_rng(seed)
+    scenarios = []
+    for day in profiles:
+        for policy in policies:
+            for _ in range(samples):
+                scenarios.append({
+                    'day': day,
+                    'policy': policy,
+                    'seed': int(rng.integers(0, 2 ** 31)),
+                    'scale': float(rng.uniform(0.8, 1.2)) if samples > 1 else 1.0,
+                })
+    for i, sc in enumerate(scenarios):
+        sc['id'] = i
+    return scenarios
+
+
+def _make_batch(scenarios: List[dict], profiles: Dict[str, np.ndarray],
+                hold_steps: int, turbulence: float) -> ScenarioBatch:
+    # Matriz del largo del día más largo del lote; los días más cortos se
+    # rellenan para simular en bloque, pero el resumen ignora ese relleno
+    lengths = np.array([len(profiles[sc['day']]) * hold_steps for sc in scenarios])
+    length = int(lengths.max())
+    wind = np.empty((len(scenarios), length))
+    for i, sc in enumerate(scenarios):
+        base = expand_profile(profiles[sc['day']], hold_steps, length) * sc['scale']
+        noise = np.random.default_rng(sc['seed']).standard_normal(length)
+        wind[i] = np.maximum(base * (1.0 + turbulence * noise), 0.0)
+    return ScenarioBatch(
+        ids=np.array([sc['id'] for sc in scenarios]),
+        days=[sc['day'] for sc in scenarios],
+        policies=[sc['policy'] for sc in scenarios],
+        seeds=np.array([sc['seed'] for sc in scenarios]),
+        scales=np.array([sc['scale'] for sc in scenarios]),
+        wind=wind,
+        lengths=lengths,
+    )
+
+
+# Motor de inferencia por proceso (se carga una vez en el initializer)
+_worker_engine = None
+
+
+def _init_worker() -> None:
+    global _worker_engine
+    from core.ml_inference import MLInferenceEngine
+    # Umbral fijo: el resultado por escenario no depende del orden de los lotes
+    _worker_engine = MLInferenceEngine(calibrate=False)
+
+
+def simulate_batch(batch: ScenarioBatch, score_every: int = 1,
+                   engine=None) -> pd.DataFrame:
+    """Simula y puntúa un lote (S escenarios × T pasos) de una vez."""
+    engine = engine or _worker_engine
+    n, length = batch.wind.shape
+
+    pitch = np.empty_like(batch.wind)
+    for policy in set(batch.policies):
+        rows = np.array([p == policy for p in batch.policies])
+        pitch[rows] = PITCH_POLICIES[policy](batch.wind[rows])
+
+    plant = PMSGPlant(n)
+    plant.settle(batch.wind[:, 0], pitch[:, 0], seconds=10.0)
+    out = plant.run(batch.wind, pitch)          # (S, T, 4)
+
+    # Telemetría en las mismas unidades que TCPServerManager
+    wm = out[:, :, 0]
+    gen_rpm, p_kw = engine.convert_units(wm, out[:, :, 1])
+    sel = slice(None, None, score_every)
+    status, score = engine.predict_batch(
+        batch.wind[:, sel].ravel(), gen_rpm[:, sel].ravel(), p_kw[:, sel].ravel())
+    status = status.reshape(n, -1)
+    score = score.reshape(n, -1)
+
+    # Estadísticas solo sobre los pasos reales de cada escenario
+    real = np.arange(length) < batch.lengths[:, None]
+    steps = batch.lengths
+    scored = real[:, sel]
+    score_real = np.where(scored, score, np.nan)
+    step_h = control_config.SIM_STEP / 3600.0
+    return pd.DataFrame({
+        'scenario': batch.ids,
+        'day': batch.days,
+        'policy': batch.policies,
+        'seed': batch.seeds,
+        'wind_scale': batch.scales,
+        'wind_mean': np.where(real, batch.wind, 0.0).sum(axis=1) / steps,
+        'wm_mean': np.where(real, wm, 0.0).sum(axis=1) / steps,
+        'wm_max': np.where(real, wm, -np.inf).max(axis=1),
+        'p_mean_kw': np.where(real, p_kw, 0.0).sum(axis=1) / steps,
+        'energy_kwh': np.where(real, p_kw, 0.0).sum(axis=1) * step_h,
+        'score_mean': np.nanmean(score_real, axis=1),
+        'score_min': np.nanmin(score_real, axis=1),
+        'score_p05': np.nanpercentile(score_real, 5, axis=1),
+        'anomaly_rate': ((status == StatusCode.ANOMALY) & scored).sum(axis=1) / scored.sum(axis=1),
+    }, columns=SUMMARY_COLUMNS)
+
+
+def _run_chunk(args) -> pd.DataFrame:
+    scenarios, profiles, hold_steps, turbulence, score_every = args
+    batch = _make_batch(scenarios, profiles, hold_steps, turbulence)
+    return simulate_batch(batch, score_every)
+
+
+def run_sweep(output: str, data_dir: str = None, policies: Sequence[str] = None,
+              samples: int = 1, hold_steps: int = 20, turbulence: float = 0.05,
+              chunk_size: int = 64, workers: Optional[int] = None,
+              score_every: int = 1, seed: int = 42) -> pd.DataFrame:
+    """Barrido Monte Carlo sobre el archivo de viento.
+
+    Cada worker simula un lote de escenarios como matriz (escenarios × tiempo)
+    y puntúa toda su telemetría en bloque. Los resúmenes se agregan al CSV de
+    salida a medida que terminan los lotes.
+    """
+    profiles = load_wind_profiles(data_dir)
+    if not profiles:
+        raise FileNotFoundError("No hay archivos .parquet en el directorio de datos")
+    policies = list(policies or PITCH_POLICIES)
+    length = max(len(p) for p in profiles.values()) * hold_steps
+    scenarios = build_scenarios(profiles, policies, samples, seed)
+    chunks = [scenarios[i:i + chunk_size] for i in range(0, len(scenarios), chunk_size)]
+    steps = sum(len(profiles[sc['day']]) * hold_steps for sc in scenarios)
+
+    print(f"Escenarios: {len(scenarios)} ({len(profiles)} días × {len(policies)} políticas × "
+          f"{samples} muestras) | Pasos: hasta {length} | Lotes: {len(chunks)}")
+
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    pd.DataFrame(columns=SUMMARY_COLUMNS).to_csv(output, index=False)
+
+    t0 = time.perf_counter()
+    results = []
+    # Cada tarea lleva solo los perfiles de sus días (no todo el archivo)
+    tasks = [(c, {day: profiles[day] for day in {sc['day'] for sc in c}},
+              hold_steps, turbulence, score_every) for c in chunks]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        for done, summary in enumerate(pool.map(_run_chunk, tasks), start=1):
+            summary.to_csv(output, mode='a', header=False, index=False)
+            results.append(summary)
+            print(f"  Lote {done}/{len(chunks)} ({time.perf_counter() - t0:.1f} s)")
+
+    summary = pd.concat(results, ignore_index=True)
+    sim_hours = steps * control_config.SIM_STEP / 3600.0
+    elapsed = time.perf_counter() - t0
+    print(f"Completado en {elapsed:.1f} s | {sim_hours:.1f} h simuladas "
+          f"(x{sim_hours * 3600.0 / max(elapsed, 1e-9):.0f} tiempo real)")
+    return summary
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Barrido Monte Carlo de escenarios de flota sobre el archivo parquet")
+    parser.add_argument('--data-dir', default=file_player_config.DATA_DIR)
+    parser.add_argument('--output', default=os.path.join('resultados', 'monte_carlo.csv'))
+    parser.add_argument('--policies', nargs='+', choices=list(PITCH_POLICIES))
+    parser.add_argument('--samples', type=int, default=1,
+                        help="Muestras aleatorias por (día, política)")
+    parser.add_argument('--hold-steps', type=int, default=20,
+                        help="Pasos de simulación por registro del parquet")
+    parser.add_argument('--turbulence', type=float, default=0.05)
+    parser.add_argument('--chunk-size', type=int, default=64)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--score-every', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    summary = run_sweep(args.output, args.data_dir, args.policies, args.samples,
+                        args.hold_steps, args.turbulence, args.chunk_size,
+                        args.workers, args.score_every, args.seed)
+    print(summary.groupby('policy')[['anomaly_rate', 'score_mean', 'energy_kwh']].mean())
+
+
+if __name__ == "__main__":
+    main()
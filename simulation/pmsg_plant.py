@@ -0,0 +1,132 @@
+import numpy as np
+from typing import Optional, Tuple
+
+from config.settings import plant_config, control_config
+
+
+def power_coefficient(tsr: np.ndarray, pitch: np.ndarray, cfg=plant_config) -> np.ndarray:
+    """Cp(lambda, beta) con los coeficientes c1..c6 del modelo Simulink."""
+    inv_li = 1.0 / (tsr + 0.08 * pitch) - 0.035 / (pitch ** 3 + 1.0)
+    cp = (cfg.C1 * (cfg.C2 * inv_li - cfg.C3 * pitch - cfg.C4) * np.exp(-cfg.C5 * inv_li)
+          + cfg.C6 * tsr)
+    return np.maximum(cp, 0.0)
+
+
+def _optimal_point(cfg=plant_config) -> Tuple[float, float]:
+    # (lambda_opt, Cp_max) con pitch = 0, por búsqueda en malla fina
+    tsr = np.linspace(1.0, 15.0, 14001)
+    cp = power_coefficient(tsr, np.zeros_like(tsr), cfg)
+    i = int(np.argmax(cp))
+    return float(tsr[i]), float(cp[i])
+
+
+class PMSGPlant:
+    """Gemelo sustituto vectorizado de la turbina PMSG (sin MATLAB).
+
+    Integra la dinámica del rotor  J dw/dt = Tm - Te - Bm w  con RK4 de paso
+    fijo para N turbinas a la vez (arreglos de forma (N,)). El par
+    aerodinámico sale de Cp(lambda, beta) y el par del generador sigue la
+    ley MPPT de par óptimo Te = Kopt w^2, saturada a la potencia nominal.
+
+    Las salidas replican el frame '<4d' del S-Function:
+        wm [rad/s], P [W], V [V rms línea], S [VA]
+    """
+
+    def __init__(self, n: int = 1, omega0: Optional[np.ndarray] = None, cfg=plant_config):
+        self.cfg = cfg
+        self.n = n
+        self.area = np.pi * cfg.R ** 2
+        self.tsr_opt, self.cp_max = _optimal_point(cfg)
+        self.k_opt = 0.5 * cfg.RHO * self.area * cfg.R ** 3 * self.cp_max / self.tsr_opt ** 3
+        self.omega = (np.full(n, 0.1) if omega0 is None
+                      else np.array(np.broadcast_to(omega0, (n,)), dtype=np.float64))
+        self.t = 0.0
+
+    # ------------------------------------------------------------------
+    # Modelo
+    # ------------------------------------------------------------------
+
+    def aero_torque(self, omega: np.ndarray, wind: np.ndarray, pitch: np.ndarray) -> np.ndarray:
+        cfg = self.cfg
+        w = np.maximum(omega, 1e-3)
+        v = np.maximum(wind, 0.1)
+        cp = power_coefficient(w * cfg.R / v, pitch, cfg)
+        return 0.5 * cfg.RHO * self.area * cp * v ** 3 / w
+
+    def generator_torque(self, omega: np.ndarray) -> np.ndarray:
+        w = np.maximum(omega, 1e-3)
+        return np.minimum(self.k_opt * w * w, self.cfg.PN / w)
+
+    def _derivative(self, omega, wind, pitch):
+        cfg = self.cfg
+        return (self.aero_torque(omega, wind, pitch)
+                - self.generator_torque(omega) - cfg.BM * omega) / cfg.J
+
+    # ------------------------------------------------------------------
+    # Integración
+    # ------------------------------------------------------------------
+
+    def step(self, wind, pitch, dt: float = None) -> np.ndarray:
+        """Avanza dt segundos con viento/pitch constantes en el intervalo.
+
+        Args:
+            wind, pitch: Escalares o arreglos (N,) [m/s], [deg]
+            dt: Tiempo a integrar (por defecto un paso lock-step)
+        Returns: Salidas (N, 4) al final del intervalo
+        """
+        dt = control_config.SIM_STEP if dt is None else dt
+        wind = np.broadcast_to(np.asarray(wind, dtype=np.float64), (self.n,))
+        pitch = np.broadcast_to(np.asarray(pitch, dtype=np.float64), (self.n,))
+        n_sub = max(1, int(round(dt / self.cfg.SOLVER_DT)))
+        h = dt / n_sub
+
+        w = self.omega
+        f = self._derivative
+        for _ in range(n_sub):
+            k1 = f(w, wind, pitch)
+            k2 = f(w + 0.5 * h * k1, wind, pitch)
+            k3 = f(w + 0.5 * h * k2, wind, pitch)
+            k4 = f(w + h * k3, wind, pitch)
+            w = np.clip(w + (h / 6.0) * (k1 + 2.0 * k2 + 2.0 * k3 + k4), 0.0, self.cfg.OMEGA_MAX)
+
+        self.omega = w
+        self.t += dt
+        return self.outputs()
+
+    def outputs(self) -> np.ndarray:
+        """Salidas eléctricas/mecánicas actuales, forma (N, 4)."""
+        cfg = self.cfg
+        w = self.omega
+        te = self.generator_torque(w)
+        we = cfg.POLE_PAIRS * w
+        iq = te / (1.5 * cfg.POLE_PAIRS * cfg.LAMBDA_PM)
+
+        # Tensión de fase (pico) en ejes dq y potencia en bornes
+        vd = -we * cfg.LQ * iq
+        vq = we * cfg.LAMBDA_PM - cfg.RS * iq
+        v_line_rms = np.sqrt(1.5) * np.hypot(vd, vq)
+        p_elec = te * w - 1.5 * cfg.RS * iq ** 2
+        q_elec = 1.5 * we * cfg.LQ * iq ** 2
+
+        out = np.empty((self.n, 4))
+        out[:, 0] = w
+        out[:, 1] = p_elec
+        out[:, 2] = v_line_rms
+        out[:, 3] = np.hypot(p_elec, q_elec)
+        return out
+
+    def settle(self, wind, pitch=0.0, seconds: float = 60.0) -> np.ndarray:
+        """Lleva las turbinas a régimen permanente para el viento dado."""
+        return self.step(wind, pitch, seconds)
+
+    def run(self, wind: np.ndarray, pitch: np.ndarray, dt: float = None) -> np.ndarray:
+        """Simula perfiles completos de forma (N, T).
+
+        Returns: Salidas (N, T, 4), una por paso
+        """
+        wind = np.asarray(wind, dtype=np.float64).reshape(self.n, -1)
+        pitch = np.broadcast_to(np.asarray(pitch, dtype=np.float64), wind.shape)
+        out = np.empty((self.n, wind.shape[1], 4))
+        for k in range(wind.shape[1]):
+            out[:, k] = self.step(wind[:, k], pitch[:, k], dt)
+        return out
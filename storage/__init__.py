@@ -0,0 +1,14 @@
+"""Módulo de persistencia de telemetría"""
+from .timeseries_store import TimeSeriesStore
+from .rollups import RollupEngine
+from .compression import HistorianCompressor, HistorianReader, CompressedSeries
+from .checkpoint import CheckpointManager
+
+__all__ = [
+    'TimeSeriesStore',
+    'RollupEngine',
+    'HistorianCompressor',
+    'HistorianReader',
+    'CompressedSeries',
+    'CheckpointManager'
+]
@@ -0,0 +1,280 @@
+"""Checkpoints de arranque en caliente del estado del servidor.
+
+Una instantánea binaria compacta con el historial crudo reciente (buffer
+circular de TelemetryBuffer), los agregados multi-resolución y el estado de
+la calibración en línea del motor de IA:
+
+    b'AEOLCKP1' | u64 largo del encabezado | encabezado JSON | arreglos
+
+El encabezado lleva, por arreglo, su dtype (descr de numpy), forma, offset
+(alineado a 64 bytes) y crc32. Al arrancar el archivo se mapea en memoria y
+los arreglos son vistas np.frombuffer sobre el mapeo: no hay unpickle ni
+descompresión, y restaurar es copiar unos pocos MB.
+
+Escritura copy-on-write a nivel de archivo: cada instantánea se escribe en
+un archivo nuevo y se publica con os.replace. Un lector que tenga mapeada la
+anterior la sigue viendo completa (otro inodo) y un corte de luz a mitad de
+escritura deja la instantánea previa intacta. El hilo del servidor TCP solo
+paga un append bajo lock; copiar el estado y escribir ocurre en un hilo
+aparte cada CHECKPOINT_INTERVAL segundos.
+
+    python3 -m storage.checkpoint info
+    python3 -m storage.checkpoint info data_logs/checkpoint.bin
+"""
+import argparse
+import atexit
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+
+from config.settings import calibration_config, ml_config, router_config, storage_config
+from core.telemetry import TELEMETRY_DTYPE, TelemetryBuffer, TelemetryRecord, upgrade_block
+
+MAGIC = b'AEOLCKP1'
+CHECKPOINT_VERSION = 1
+ALIGN = 64
+_HEADER_LEN = struct.Struct('<Q')
+
+
+def default_path() -> str:
+    return os.path.join(storage_config.LOG_DIR, storage_config.CHECKPOINT_FILE)
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGN) * ALIGN
+
+
+def write_snapshot(path: str, arrays: Dict[str, np.ndarray], meta: dict = None) -> int:
+    """Escribe una instantánea (archivo nuevo + os.replace). Retorna bytes escritos."""
+    arrays = {name: np.ascontiguousarray(arr) for name, arr in arrays.items()}
+    entries, offset = {}, 0
+    for name, arr in arrays.items():
+        entries[name] = {
+            'descr': np.lib.format.dtype_to_descr(arr.dtype),
+            'shape': list(arr.shape),
+            'offset': offset,
+            'crc32': zlib.crc32(memoryview(arr).cast('B')),
+        }
+        offset = _aligned(offset + arr.nbytes)
+    header = json.dumps({
+        'version': CHECKPOINT_VERSION,
+        'created_ns': time.time_ns(),
+        'meta': meta or {},
+        'arrays': entries,
+    }).encode()
+    # Datos alineados respecto al inicio del archivo (el mapeo empieza en 0)
+    data_start = _aligned(len(MAGIC) + _HEADER_LEN.size + len(header))
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(_HEADER_LEN.pack(len(header)))
+        f.write(header)
+        for name, arr in arrays.items():
+            f.seek(data_start + entries[name]['offset'])
+            f.write(memoryview(arr).cast('B'))
+        f.truncate(data_start + offset)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return data_start + offset
+
+
+def read_snapshot(path: str, verify: bool = True) -> Tuple[Dict[str, np.ndarray], dict]:
+    """Mapea una instantánea en memoria.
+
+    Args:
+        path: Archivo de la instantánea
+        verify: Comprobar el crc32 de cada arreglo
+    Returns: ({nombre: vista de solo lectura sobre el mapeo}, encabezado)
+    """
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buf[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path}: no es un checkpoint de Aeolus")
+    (header_len,) = _HEADER_LEN.unpack_from(buf, len(MAGIC))
+    start = len(MAGIC) + _HEADER_LEN.size
+    header = json.loads(buf[start:start + header_len])
+    if header.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"{path}: versión {header.get('version')} no soportada "
+                         f"(se espera {CHECKPOINT_VERSION})")
+    data_start = _aligned(start + header_len)
+
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        dtype = np.lib.format.descr_to_dtype(entry['descr'])
+        count = int(np.prod(entry['shape'], dtype=np.int64))
+        arr = np.frombuffer(buf, dtype=dtype, count=count,
+                            offset=data_start + entry['offset']).reshape(entry['shape'])
+        if verify and zlib.crc32(memoryview(arr).cast('B')) != entry['crc32']:
+            raise ValueError(f"{path}: crc32 de '{name}' no coincide")
+        arrays[name] = arr
+    return arrays, header
+
+
+class CheckpointManager:
+    """Instantáneas periódicas del estado del servidor para arrancar en caliente.
+
+    Se registra como sink de TCPServerManager: cada registro o bloque entra
+    en un buffer circular de CHECKPOINT_HISTORY_ROWS frames. `start()` lanza
+    el hilo que guarda la instantánea cada `interval` segundos y `restore()`
+    la carga de vuelta antes de arrancar el servidor.
+    """
+
+    def __init__(self, rollups=None, ml_engine=None, path: str = None,
+                 interval: float = None, history_rows: int = None):
+        self.rollups = rollups
+        self.ml_engine = ml_engine
+        self.path = path or default_path()
+        self.interval = storage_config.CHECKPOINT_INTERVAL if interval is None else interval
+        self.history = TelemetryBuffer(history_rows or storage_config.CHECKPOINT_HISTORY_ROWS)
+        self.saves = 0
+        self.last_save_seconds = 0.0
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def push(self, item: Union[TelemetryRecord, np.ndarray]) -> None:
+        """Incorpora un registro o bloque del flujo de telemetría."""
+        with self._lock:
+            if isinstance(item, np.ndarray):
+                self.history.extend(item)
+            else:
+                self.history.append(item)
+            self._dirty = True
+
+    def history_block(self, rows: int = None) -> np.ndarray:
+        """Últimos `rows` frames del historial retenido (copia cronológica)."""
+        with self._lock:
+            data = self.history.view()
+        return data if rows is None else data[-rows:]
+
+    def _calibration_meta(self) -> dict:
+        # El estado de la calibración solo vale para el mismo modelo y configuración
+        engine = self.ml_engine
+        return {
+            'model': ml_config.MODEL_FILE,
+            'artifact': ml_config.ARTIFACT_DIR,
+            'router': router_config.DIR if engine is not None and engine.router is not None else None,
+            'quantile': calibration_config.QUANTILE,
+            'bin_width': calibration_config.BIN_WIDTH,
+            'bins': calibration_config.BINS,
+        }
+
+    def _collect(self) -> Tuple[Dict[str, np.ndarray], dict]:
+        arrays = {'history': self.history_block()}
+        meta = {}
+        if self.rollups is not None:
+            for name, slots in self.rollups.state_arrays().items():
+                arrays[f'rollups.{name}'] = slots
+        calibrator = getattr(self.ml_engine, 'calibrator', None)
+        if calibrator is not None:
+            for name, arr in calibrator.state_arrays().items():
+                arrays[f'calibration.{name}'] = arr
+            meta['calibration'] = self._calibration_meta()
+        return arrays, meta
+
+    def save(self) -> int:
+        """Escribe la instantánea ahora. Retorna bytes escritos."""
+        t0 = time.perf_counter()
+        self._dirty = False
+        arrays, meta = self._collect()
+        size = write_snapshot(self.path, arrays, meta)
+        self.last_save_seconds = time.perf_counter() - t0
+        self.saves += 1
+        return size
+
+    def restore(self) -> bool:
+        """Carga la última instantánea. Retorna True si existía y era válida.
+
+        Cada parte se restaura solo si es compatible con la configuración
+        actual: agregados con las mismas resoluciones y más recientes que
+        rollups.npz, y calibración con el mismo modelo y regímenes. El
+        historial de un TELEMETRY_DTYPE anterior se adapta con upgrade_block.
+        """
+        if not os.path.exists(self.path):
+            return False
+        try:
+            arrays, header = read_snapshot(self.path)
+        except (OSError, ValueError) as e:
+            print(f"Checkpoint descartado ({e}).")
+            return False
+
+        # Un historial de un esquema anterior se adapta (campos nuevos en cero)
+        history = arrays.get('history')
+        if history is not None and history.dtype.names:
+            with self._lock:
+                self.history.extend(upgrade_block(history, TELEMETRY_DTYPE))
+
+        if self.rollups is not None:
+            saved = (os.path.getmtime(self.rollups.path) * 1e9
+                     if os.path.exists(self.rollups.path) else 0)
+            if header['created_ns'] > saved:
+                self.rollups.restore_arrays({name[len('rollups.'):]: arr
+                                             for name, arr in arrays.items()
+                                             if name.startswith('rollups.')})
+
+        calibrator = getattr(self.ml_engine, 'calibrator', None)
+        if (calibrator is not None
+                and header['meta'].get('calibration') == self._calibration_meta()):
+            calibrator.restore_arrays({name[len('calibration.'):]: arr
+                                       for name, arr in arrays.items()
+                                       if name.startswith('calibration.')})
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            if not self._dirty:
+                continue
+            try:
+                self.save()
+            except Exception as e:
+                print(f"Error al guardar checkpoint: {e}")
+
+    def start(self) -> None:
+        """Lanza el hilo de instantáneas periódicas (guarda también al salir)."""
+        if self._thread is not None or not self.interval:
+            return
+        self._thread = threading.Thread(target=self._run, name='checkpoint', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self) -> None:
+        """Detiene el hilo y guarda una última instantánea si hubo datos nuevos."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        if self._dirty:
+            self.save()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Checkpoint de arranque en caliente")
+    sub = parser.add_subparsers(dest='cmd', required=True)
+    p_info = sub.add_parser('info')
+    p_info.add_argument('path', nargs='?', default=default_path())
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    arrays, header = read_snapshot(args.path)
+    elapsed = time.perf_counter() - t0
+    created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(header['created_ns'] / 1e9))
+    print(f"{args.path}: {os.path.getsize(args.path) / 1024:.0f} KiB, creado {created}, "
+          f"mapeado y verificado en {elapsed * 1e3:.1f} ms")
+    for name, arr in arrays.items():
+        print(f"  {name:<28} {str(arr.shape):<14} {arr.nbytes / 1024:>8.0f} KiB")
+    print(json.dumps(header['meta'], indent=2))
+
+
+if __name__ == "__main__":
+    main()
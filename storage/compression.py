@@ -0,0 +1,354 @@
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from config.settings import storage_config
+from core.telemetry import StatusCode, TelemetryRecord, records_to_block
+
+# ----------------------------------------------------------------------
+# Compresión de historiador (estilo PI/SCADA) por señal
+#
+# 'deadband'       : guarda un punto cuando se aleja más de tol del último
+#                    guardado; reconstrucción por retención (escalón).
+# 'swinging_door'  : guarda el mínimo de puntos tal que la interpolación
+#                    lineal entre puntos guardados queda a <= tol de cada
+#                    muestra original.
+#
+# Los puntos guardados conservan timestamp y valor exactos (float64). Se
+# fuerzan en todas las señales los cambios de estado y las muestras con
+# ANOMALÍA / ERR_ML, y al menos un punto cada max_gap segundos.
+# ----------------------------------------------------------------------
+
+METHODS = ('deadband', 'swinging_door')
+
+Tolerances = Dict[str, Tuple[str, float]]
+
+
+class _SignalFilter:
+    """Estado de compresión de una señal (se conserva entre bloques)."""
+
+    def __init__(self, method: str, tol: float, max_gap_ns: int):
+        if method not in METHODS:
+            raise ValueError(f"Método desconocido: {method} (opciones: {METHODS})")
+        self.method = method
+        self.tol = float(tol)
+        self.max_gap_ns = max_gap_ns
+        self.kept_t: List[int] = []
+        self.kept_x: List[float] = []
+        # Último archivado y último visto (pendiente de archivar)
+        self._t0 = None
+        self._x0 = 0.0
+        self._tp = None
+        self._xp = 0.0
+        self._pending = False
+        self._up = -np.inf   # Pendiente máxima hacia la puerta superior
+        self._low = np.inf   # Pendiente mínima hacia la puerta inferior
+
+    def _archive(self, t: int, x: float) -> None:
+        self.kept_t.append(t)
+        self.kept_x.append(x)
+        self._t0, self._x0 = t, x
+        self._up, self._low = -np.inf, np.inf
+        self._pending = False
+
+    def feed(self, t: np.ndarray, x: np.ndarray, force: np.ndarray) -> None:
+        tol = self.tol
+        gap = self.max_gap_ns
+        deadband = self.method == 'deadband'
+
+        for ti, xi, fi in zip(t.tolist(), x.tolist(), force.tolist()):
+            if self._t0 is None:
+                self._archive(ti, xi)
+                self._tp, self._xp = ti, xi
+                continue
+
+            if ti <= self._tp:
+                # Timestamp repetido o que retrocede: ni el escalón ni la
+                # pendiente acotan el error ahí, se archivan el punto previo y
+                # la muestra (read() informa su dispersión como cota)
+                if self._pending:
+                    self._archive(self._tp, self._xp)
+                self._archive(ti, xi)
+            elif fi or ti - self._t0 >= gap:
+                # Cerrar el tramo con el punto previo para que siga valiendo la cota
+                if self._pending and not deadband:
+                    self._archive(self._tp, self._xp)
+                self._archive(ti, xi)
+            elif deadband:
+                if abs(xi - self._x0) > tol:
+                    self._archive(ti, xi)
+                else:
+                    self._pending = True
+            else:
+                # La muestra solo puede cerrar el tramo si la recta desde el
+                # último archivado hasta ella pasa por todas las puertas
+                # intermedias; si no, se archiva la anterior (que sí podía)
+                dt = ti - self._t0
+                if not (self._up <= (xi - self._x0) / dt <= self._low):
+                    self._archive(self._tp, self._xp)
+                    dt = ti - self._t0
+                self._up = max(self._up, (xi - self._x0 - tol) / dt)
+                self._low = min(self._low, (xi - self._x0 + tol) / dt)
+                self._pending = True
+
+            self._tp, self._xp = ti, xi
+
+    def flush(self) -> None:
+        """Archiva el último punto visto (cierre de segmento o de sesión)."""
+        if self._pending:
+            self._archive(self._tp, self._xp)
+
+    def take(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Entrega y vacía los puntos archivados."""
+        t = np.array(self.kept_t, dtype=np.int64)
+        x = np.array(self.kept_x, dtype=np.float64)
+        self.kept_t, self.kept_x = [], []
+        return t, x
+
+
+class CompressedSeries:
+    """Puntos guardados de una señal y lectura interpolada con cota de error."""
+
+    def __init__(self, name: str, method: str, tol: float, t_ns: np.ndarray, values: np.ndarray):
+        self.name = name
+        self.method = method
+        self.tol = tol
+        self.t_ns = t_ns
+        self.values = values
+
+    def __len__(self) -> int:
+        return len(self.t_ns)
+
+    def read(self, t_ns) -> Tuple[np.ndarray, np.ndarray]:
+        """Valores reconstruidos en los instantes pedidos.
+
+        Returns: (valores, cota de error); la cota es 0 en puntos guardados,
+        tol entre ellos y NaN fuera del rango almacenado. En un instante con
+        varios puntos guardados (timestamp repetido) el valor es el último y
+        la cota es la dispersión de esos puntos.
+        """
+        t_ns = np.asarray(t_ns, dtype=np.int64)
+        if len(self.t_ns) == 0:
+            nan = np.full(t_ns.shape, np.nan)
+            return nan, nan.copy()
+
+        # Último punto guardado en o antes de cada instante: con timestamps
+        # repetidos el tramo siguiente arranca del último del grupo y el
+        # anterior termina en el primero (el siguiente índice)
+        last = len(self.t_ns) - 1
+        idx = np.clip(np.searchsorted(self.t_ns, t_ns, side='right') - 1, 0, last)
+        values = self.values[idx].astype(np.float64)
+        if self.method != 'deadband':
+            nxt = np.minimum(idx + 1, last)
+            span = (self.t_ns[nxt] - self.t_ns[idx]).astype(np.float64)
+            between = (span > 0) & (t_ns > self.t_ns[idx])
+            frac = np.divide(t_ns - self.t_ns[idx], span, out=np.zeros_like(span), where=between)
+            values += frac * (self.values[nxt] - self.values[idx])
+
+        exact = self.t_ns[idx] == t_ns
+        starts = np.flatnonzero(np.r_[True, np.diff(self.t_ns) != 0])
+        spread = (np.maximum.reduceat(self.values, starts)
+                  - np.minimum.reduceat(self.values, starts)).astype(np.float64)
+        group = np.searchsorted(starts, idx, side='right') - 1
+        bound = np.where(exact, spread[group], self.tol)
+        outside = (t_ns < self.t_ns[0]) | (t_ns > self.t_ns[-1])
+        values[outside] = np.nan
+        bound[outside] = np.nan
+        return values, bound
+
+
+class HistorianCompressor:
+    """Etapa de compresión del historiador alimentada por el flujo de telemetría.
+
+    Se registra como sink de TCPServerManager (push de registros o bloques).
+    Cada segment_seconds escribe un segmento .npz con los puntos guardados de
+    todas las señales en `directory`.
+    """
+
+    def __init__(self, tolerances: Tolerances = None, directory: str = None,
+                 max_gap: float = None, segment_seconds: float = None):
+        self.tolerances = dict(tolerances or storage_config.HISTORIAN_TOLERANCES)
+        self.directory = directory or storage_config.HISTORIAN_DIR
+        max_gap = storage_config.HISTORIAN_MAX_GAP if max_gap is None else max_gap
+        self.segment_seconds = (storage_config.HISTORIAN_SEGMENT_SECONDS
+                                if segment_seconds is None else segment_seconds)
+        self.filters = {name: _SignalFilter(method, tol, int(max_gap * 1e9))
+                        for name, (method, tol) in self.tolerances.items()}
+        self.raw_samples = 0
+        self.kept_points = 0
+        self._last_status = None
+        self._lock = threading.Lock()
+        self._segment_start = time.monotonic()
+
+    def _force_mask(self, status: np.ndarray, phys_status: np.ndarray) -> np.ndarray:
+        # Cambios de estado y muestras anómalas/erróneas (IA o curva de potencia)
+        prev = np.empty_like(status)
+        prev[0] = status[0] if self._last_status is None else self._last_status
+        prev[1:] = status[:-1]
+        self._last_status = status[-1]
+        return ((status != prev)
+                | (status == StatusCode.ANOMALY)
+                | (status == StatusCode.ERROR)
+                | (phys_status == StatusCode.ANOMALY))
+
+    def push(self, item: Union[TelemetryRecord, np.ndarray]) -> None:
+        """Incorpora un registro o bloque del flujo de telemetría."""
+        rows = item if isinstance(item, np.ndarray) else records_to_block((item,))
+        if len(rows) == 0:
+            return
+        with self._lock:
+            force = self._force_mask(rows['status'], rows['phys_status'])
+            t = rows['t_ns']
+            for name, f in self.filters.items():
+                f.feed(t, rows[name], force)
+            self.raw_samples += len(rows)
+
+        if self.segment_seconds and time.monotonic() - self._segment_start >= self.segment_seconds:
+            self.write_segment()
+
+    def take(self, final: bool = False) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """Puntos guardados desde la última llamada, por señal.
+
+        Args:
+            final: Archiva también el último punto pendiente de cada señal
+        """
+        with self._lock:
+            out = {}
+            for name, f in self.filters.items():
+                if final:
+                    f.flush()
+                out[name] = f.take()
+                self.kept_points += len(out[name][0])
+        return out
+
+    def write_segment(self, final: bool = False) -> Optional[str]:
+        """Escribe los puntos guardados como segmento (escritura atómica)."""
+        self._segment_start = time.monotonic()
+        points = self.take(final)
+        if not any(len(t) for t, _ in points.values()):
+            return None
+
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        path = os.path.join(self.directory, f"hist_{stamp}.npz")
+        arrays = {}
+        for name, (t, x) in points.items():
+            arrays[f'{name}__t'] = t
+            arrays[f'{name}__x'] = x
+        meta = {name: list(spec) for name, spec in self.tolerances.items()}
+        arrays['meta'] = np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8)
+
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+        return path
+
+    def stats(self) -> dict:
+        """Muestras recibidas vs. puntos guardados (todas las señales)."""
+        raw = self.raw_samples * len(self.filters)
+        return {
+            'raw_points': raw,
+            'kept_points': self.kept_points,
+            'ratio': raw / self.kept_points if self.kept_points else float('nan'),
+        }
+
+
+def compress_block(rows: np.ndarray, tolerances: Tolerances = None,
+                   max_gap: float = None) -> Dict[str, CompressedSeries]:
+    """Comprime un bloque completo (p. ej. un log de sesión) en memoria."""
+    compressor = HistorianCompressor(tolerances, max_gap=max_gap, segment_seconds=0)
+    compressor.push(rows)
+    points = compressor.take(final=True)
+    return {name: CompressedSeries(name, method, tol, *points[name])
+            for name, (method, tol) in compressor.tolerances.items()}
+
+
+class HistorianReader:
+    """Lectura de los segmentos del historiador por señal y rango."""
+
+    def __init__(self, directory: str = None):
+        self.directory = directory or storage_config.HISTORIAN_DIR
+
+    def segments(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.directory, 'hist_*.npz')))
+
+    def series(self, name: str, start_ns: int = None, end_ns: int = None) -> CompressedSeries:
+        """Puntos guardados de una señal en [start_ns, end_ns]."""
+        ts, xs = [], []
+        method, tol = storage_config.HISTORIAN_TOLERANCES.get(name, ('swinging_door', 0.0))
+        for path in self.segments():
+            with np.load(path) as data:
+                if f'{name}__t' not in data:
+                    continue
+                method, tol = json.loads(data['meta'].tobytes()).get(name, (method, tol))
+                t = data[f'{name}__t']
+                if len(t) == 0:
+                    continue
+                if (start_ns is not None and t[-1] < start_ns) or (end_ns is not None and t[0] > end_ns):
+                    continue
+                ts.append(t)
+                xs.append(data[f'{name}__x'])
+
+        t = np.concatenate(ts) if ts else np.empty(0, np.int64)
+        x = np.concatenate(xs) if xs else np.empty(0, np.float64)
+        order = np.argsort(t, kind='stable')
+        t, x = t[order], x[order]
+        sel = np.ones(len(t), dtype=bool)
+        if start_ns is not None:
+            sel &= t >= start_ns
+        if end_ns is not None:
+            sel &= t <= end_ns
+        return CompressedSeries(name, method, tol, t[sel], x[sel])
+
+
+def evaluate(rows: np.ndarray, tolerances: Tolerances = None) -> List[dict]:
+    """Compresión y error máximo de reconstrucción por señal sobre un bloque."""
+    series = compress_block(rows, tolerances)
+    report = []
+    for name, s in series.items():
+        values, bound = s.read(rows['t_ns'])
+        err = np.abs(values - rows[name])
+        report.append({
+            'signal': name,
+            'method': s.method,
+            'tol': s.tol,
+            'raw': len(rows),
+            'kept': len(s),
+            'ratio': len(rows) / max(len(s), 1),
+            'max_error': float(np.nanmax(err)) if len(err) else 0.0,
+            'within_bound': bool(np.all(err <= bound + 1e-9)),
+        })
+    return report
+
+
+def main() -> None:
+    import argparse
+
+    import pandas as pd
+    from storage.timeseries_store import csv_to_block
+
+    parser = argparse.ArgumentParser(description="Compresión de historiador sobre logs de sesión")
+    parser.add_argument('files', nargs='+', help="CSV de sesión (turbina_log_*.csv)")
+    parser.add_argument('--write', action='store_true',
+                        help="Escribir un segmento por archivo en HISTORIAN_DIR")
+    args = parser.parse_args()
+
+    for path in args.files:
+        rows = csv_to_block(path)
+        print(f"\n{path} ({len(rows)} muestras)")
+        print(pd.DataFrame(evaluate(rows)).to_string(index=False))
+        if args.write:
+            compressor = HistorianCompressor(segment_seconds=0)
+            compressor.push(rows)
+            print(f"Segmento: {compressor.write_segment(final=True)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+import os
+import threading
+import time
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from config.settings import storage_config
+from core.telemetry import (
+    StatusCode,
+    TelemetryRecord,
+    local_datetimes,
+    records_to_block
+)
+
+# Señales agregadas (todas las numéricas del registro)
+ROLLUP_SIGNALS = ('v', 'p', 'wm', 'P', 'V', 'S', 'score')
+
+# Una fila por intervalo: contadores y min/max/suma por señal
+ROLLUP_DTYPE = np.dtype(
+    [('bucket', '<i8'), ('count', '<i8'), ('anomalies', '<i8')]
+    + [(f'{s}_min', '<f8') for s in ROLLUP_SIGNALS]
+    + [(f'{s}_max', '<f8') for s in ROLLUP_SIGNALS]
+    + [(f'{s}_sum', '<f8') for s in ROLLUP_SIGNALS]
+)
+
+
+class RollupLevel:
+    """Agregados de una resolución en un buffer circular direccionado por intervalo.
+
+    El intervalo k ocupa la ranura k % capacity; al llegar un intervalo nuevo
+    la ranura se reinicia. La memoria queda fija en capacity filas.
+    """
+
+    def __init__(self, seconds: int, capacity: int):
+        self.seconds = seconds
+        self.capacity = capacity
+        self.step_ns = seconds * 1_000_000_000
+        self.slots = np.zeros(capacity, dtype=ROLLUP_DTYPE)
+        self.slots['bucket'] = -1
+
+    def update(self, rows: np.ndarray) -> None:
+        buckets = rows['t_ns'] // self.step_ns
+        order = np.argsort(buckets, kind='stable')
+        keys, first, counts = np.unique(buckets[order], return_index=True, return_counts=True)
+        anomalies = np.add.reduceat(
+            (rows['status'][order] == StatusCode.ANOMALY).astype(np.int64), first)
+
+        # Descartar intervalos que no caben en el buffer o ya fueron expulsados
+        slot_idx = keys % self.capacity
+        stored = self.slots['bucket'][slot_idx]
+        sel = (keys > keys[-1] - self.capacity) & (stored <= keys)
+        slot_idx, keys = slot_idx[sel], keys[sel]
+        fresh = slot_idx[stored[sel] != keys]
+
+        slots = self.slots
+        slots['bucket'][fresh] = keys[stored[sel] != keys]
+        slots['count'][fresh] = 0
+        slots['anomalies'][fresh] = 0
+        slots['count'][slot_idx] += counts[sel]
+        slots['anomalies'][slot_idx] += anomalies[sel]
+
+        for s in ROLLUP_SIGNALS:
+            values = rows[s][order]
+            lo, hi, total = slots[f'{s}_min'], slots[f'{s}_max'], slots[f'{s}_sum']
+            lo[fresh] = np.inf
+            hi[fresh] = -np.inf
+            total[fresh] = 0.0
+            lo[slot_idx] = np.minimum(lo[slot_idx], np.minimum.reduceat(values, first)[sel])
+            hi[slot_idx] = np.maximum(hi[slot_idx], np.maximum.reduceat(values, first)[sel])
+            total[slot_idx] += np.add.reduceat(values, first)[sel]
+
+    def ordered(self) -> np.ndarray:
+        """Intervalos válidos ordenados cronológicamente (copia)."""
+        valid = self.slots[self.slots['bucket'] >= 0]
+        return valid[np.argsort(valid['bucket'])]
+
+
+class RollupEngine:
+    """Agregados multi-resolución (1 s / 1 min / 10 min) mantenidos en línea.
+
+    Se alimenta del flujo de telemetría (registros o bloques) y permite
+    graficar rangos amplios sin recorrer las muestras crudas. La resolución
+    de 10 min es comparable con las features de entrenamiento
+    ('WIND_Wind speed 10min-Aver').
+    """
+
+    def __init__(self, resolutions: Dict[int, int] = None, path: str = None,
+                 save_interval: float = None):
+        resolutions = resolutions or storage_config.ROLLUP_RESOLUTIONS
+        self.levels = {sec: RollupLevel(sec, cap) for sec, cap in resolutions.items()}
+        self.path = path or os.path.join(storage_config.LOG_DIR, storage_config.ROLLUP_FILE)
+        self.save_interval = (storage_config.ROLLUP_SAVE_INTERVAL
+                              if save_interval is None else save_interval)
+        self._lock = threading.Lock()
+        self._last_save = time.monotonic()
+
+    def push(self, item: Union[TelemetryRecord, np.ndarray]) -> None:
+        """Incorpora un registro o bloque del flujo de telemetría."""
+        rows = item if isinstance(item, np.ndarray) else records_to_block((item,))
+        if len(rows) == 0:
+            return
+        with self._lock:
+            for level in self.levels.values():
+                level.update(rows)
+
+        if self.save_interval and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+    def frame(self, seconds: int, start_ns: Optional[int] = None,
+              signals: Sequence[str] = ('wm', 'P', 'V', 'S', 'score')) -> pd.DataFrame:
+        """Agregados de una resolución como DataFrame para gráficas.
+
+        Columnas: 'Time' (hora local), '<señal>' (media), '<señal>_min',
+        '<señal>_max', 'count' y 'anomalies'.
+        """
+        level = self.levels[seconds]
+        with self._lock:
+            rows = level.ordered()
+        if start_ns is not None:
+            rows = rows[rows['bucket'] >= start_ns // level.step_ns]
+
+        data = {'Time': local_datetimes(rows['bucket'] * level.step_ns)}
+        for s in signals:
+            data[s] = rows[f'{s}_sum'] / rows['count']
+            data[f'{s}_min'] = rows[f'{s}_min']
+            data[f'{s}_max'] = rows[f'{s}_max']
+        data['count'] = rows['count']
+        data['anomalies'] = rows['anomalies']
+        return pd.DataFrame(data)
+
+    def state_arrays(self) -> Dict[str, np.ndarray]:
+        """Copia del estado interno (una matriz por resolución)."""
+        with self._lock:
+            return {f'level_{sec}': level.slots.copy() for sec, level in self.levels.items()}
+
+    def restore_arrays(self, arrays) -> None:
+        """Restaura el estado desde state_arrays() (resoluciones compatibles)."""
+        with self._lock:
+            for sec, level in self.levels.items():
+                key = f'level_{sec}'
+                if key in arrays and len(arrays[key]) == level.capacity:
+                    level.slots[:] = arrays[key]
+
+    def save(self) -> None:
+        """Persiste los agregados junto a los logs (escritura atómica)."""
+        arrays = self.state_arrays()
+        self._last_save = time.monotonic()
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> bool:
+        """Carga los agregados persistidos. Retorna True si existían."""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            with np.load(self.path) as arrays:
+                self.restore_arrays(arrays)
+            return True
+        except Exception as e:
+            print(f"No se pudieron cargar los agregados ({e}).")
+            return False
@@ -0,0 +1,484 @@
+import os
+import glob
+import io
+import json
+import operator
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from config.settings import storage_config
+from core.telemetry import (
+    STATUS_LABELS,
+    TELEMETRY_DTYPE,
+    local_datetimes,
+    status_labels,
+    upgrade_block
+)
+
+NS_PER_DAY = 86_400 * 1_000_000_000
+
+# Columnas con resumen min/max por bloque (todas salvo el timestamp)
+VALUE_COLUMNS = [name for name in TELEMETRY_DTYPE.names if name != 't_ns']
+
+# Nombres aceptados en consultas: columnas del CSV de sesión y de la UI
+COLUMN_ALIASES = {
+    'Timestamp': 't_ns',
+    'Velocidad_Viento_ms': 'v',
+    'Angulo_Pitch_deg': 'p',
+    'Velocidad_Mecanica_rads': 'wm',
+    'Potencia_Activa_kW': 'P',
+    'Voltaje_Red_kV': 'V',
+    'Potencia_Aparente_kVA': 'S',
+    'Anomaly_Score': 'score',
+    'Score': 'score',
+    'Status_IA': 'status',
+    'Status': 'status',
+    'Residuo_Fisico': 'phys',
+    'Status_Fisico': 'phys_status',
+    'Attr_Viento': 'attr_v',
+    'Attr_RPM': 'attr_wm',
+    'Attr_Potencia': 'attr_P',
+    'Attr_Densidad': 'attr_rho',
+}
+
+_OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+}
+
+# Índice lateral: una fila por bloque con rango temporal y min/max por columna
+INDEX_DTYPE = np.dtype(
+    [('day', '<i4'), ('block', '<i4'), ('rows', '<i4'),
+     ('t_min', '<i8'), ('t_max', '<i8')]
+    + [(f'{c}_min', '<f8') for c in VALUE_COLUMNS]
+    + [(f'{c}_max', '<f8') for c in VALUE_COLUMNS]
+)
+
+Predicate = Tuple[str, str, Union[float, int, str]]
+TimeLike = Union[None, int, str, pd.Timestamp]
+
+
+def to_ns(value: TimeLike) -> Optional[int]:
+    """Convierte un instante (ns, texto u objeto fecha en hora local) a ns UTC."""
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is not None:
+        return ts.value
+    # Hora local naive, igual que los logs de sesión
+    offset = time.localtime(ts.timestamp()).tm_gmtoff * 1_000_000_000
+    return ts.value - offset
+
+
+def resolve_column(name: str) -> str:
+    """Traduce un nombre de columna del CSV/UI al nombre interno."""
+    name = COLUMN_ALIASES.get(name, name)
+    if name not in TELEMETRY_DTYPE.names:
+        raise KeyError(f"Columna desconocida: {name}")
+    return name
+
+
+def _resolve_value(column: str, value):
+    # Los estados se pueden consultar por etiqueta ('ANOMALÍA')
+    if column in ('status', 'phys_status') and isinstance(value, str):
+        return STATUS_LABELS.index(value)
+    return value
+
+
+def csv_to_block(filepath: str) -> np.ndarray:
+    """Lee un CSV de sesión (turbina_log_*.csv) como bloque estructurado ordenado."""
+    return _frame_to_block(pd.read_csv(filepath))
+
+
+def csv_tail_to_block(filepath: str, offset: int = 0) -> Tuple[np.ndarray, int]:
+    """Lee las líneas completas de un CSV de sesión a partir del byte `offset`.
+
+    Los logs de sesión solo crecen por el final: se lee el encabezado y el
+    tramo nuevo, sin volver a parsear lo ya ingerido. Una última línea a
+    medio escribir queda para la próxima lectura.
+
+    Returns: (bloque ordenado, offset del final de la última línea leída)
+    """
+    with open(filepath, 'rb') as f:
+        header = f.readline()
+        f.seek(max(offset, len(header)))
+        tail = f.read()
+    end = tail.rfind(b'\n') + 1
+    if end == 0:
+        return np.zeros(0, dtype=TELEMETRY_DTYPE), max(offset, len(header))
+    df = pd.read_csv(io.BytesIO(header + tail[:end]))
+    return _frame_to_block(df), max(offset, len(header)) + end
+
+
+def _frame_to_block(df: pd.DataFrame) -> np.ndarray:
+    # En cero: los logs anteriores no traen todas las columnas (atribución, residuo)
+    block = np.zeros(len(df), dtype=TELEMETRY_DTYPE)
+    if len(df) == 0:
+        return block
+
+    stamps = pd.to_datetime(df['Timestamp'])
+    offset = time.localtime(stamps.iloc[0].timestamp()).tm_gmtoff * 1_000_000_000
+    block['t_ns'] = stamps.values.astype('datetime64[ns]').astype(np.int64) - offset
+    for csv_name, column in COLUMN_ALIASES.items():
+        if csv_name in df.columns and column not in ('t_ns', 'status', 'phys_status'):
+            block[column] = df[csv_name].to_numpy(dtype=np.float64)
+    codes = {label: code for code, label in enumerate(STATUS_LABELS)}
+    block['status'] = df['Status_IA'].map(codes).fillna(0).to_numpy(dtype=np.uint8)
+    # Logs anteriores a la curva de potencia: sin residuo físico (N/A)
+    block['phys_status'] = (df['Status_Fisico'].map(codes).fillna(0).to_numpy(dtype=np.uint8)
+                            if 'Status_Fisico' in df.columns else 0)
+
+    return block[np.argsort(block['t_ns'], kind='stable')]
+
+
+class TimeSeriesStore:
+    """Almacén de series temporales sobre los logs de sesión.
+
+    Disposición en disco (particionado por día UTC):
+        <root>/index.npy              índice lateral (INDEX_DTYPE)
+        <root>/sources.json           logs CSV ya ingeridos (bytes leídos y bloques)
+        <root>/YYYYMMDD/blk_NNNNNN.npy bloques inmutables con TELEMETRY_DTYPE
+
+    Las consultas usan el índice para descartar bloques por rango temporal y
+    por min/max de columna, y solo mapean en memoria los bloques relevantes.
+    """
+
+    def __init__(self, root: str = None, block_rows: int = None):
+        self.root = root or storage_config.STORE_DIR
+        self.block_rows = block_rows or storage_config.BLOCK_ROWS
+        os.makedirs(self.root, exist_ok=True)
+        self._index_path = os.path.join(self.root, 'index.npy')
+        self._sources_path = os.path.join(self.root, 'sources.json')
+        self.index = self._load_index()
+        self._pending: List[np.ndarray] = []
+        self._pending_rows = 0
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    def _load_index(self) -> np.ndarray:
+        if os.path.exists(self._index_path):
+            return upgrade_block(np.load(self._index_path), INDEX_DTYPE)
+        return np.empty(0, dtype=INDEX_DTYPE)
+
+    def _block_path(self, day: int, block: int) -> str:
+        return os.path.join(self.root, f'{day:08d}', f'blk_{block:06d}.npy')
+
+    def _write_atomic(self, path: str, array: np.ndarray) -> None:
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp_path, path)
+
+    def _write_block(self, rows: np.ndarray) -> Tuple[int, int]:
+        day_start = int(rows['t_ns'][0] // NS_PER_DAY) * NS_PER_DAY
+        day = int(pd.Timestamp(day_start).strftime('%Y%m%d'))
+        same_day = self.index['block'][self.index['day'] == day]
+        block_id = int(same_day.max()) + 1 if len(same_day) else 0
+
+        path = self._block_path(day, block_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write_atomic(path, rows)
+
+        entry = np.zeros(1, dtype=INDEX_DTYPE)
+        entry['day'] = day
+        entry['block'] = block_id
+        entry['rows'] = len(rows)
+        entry['t_min'] = rows['t_ns'][0]
+        entry['t_max'] = rows['t_ns'][-1]
+        for column in VALUE_COLUMNS:
+            entry[f'{column}_min'] = rows[column].min()
+            entry[f'{column}_max'] = rows[column].max()
+        self.index = np.concatenate((self.index, entry))
+        self._write_atomic(self._index_path, self.index)
+        return day, block_id
+
+    def _write_sorted(self, rows: np.ndarray) -> List[Tuple[int, int]]:
+        # Cortar por día y por tamaño de bloque. Retorna (día, bloque) escritos
+        days = rows['t_ns'] // NS_PER_DAY
+        cuts = np.flatnonzero(np.diff(days)) + 1
+        written = []
+        for part in np.split(rows, cuts):
+            for start in range(0, len(part), self.block_rows):
+                written.append(self._write_block(part[start:start + self.block_rows]))
+        return written
+
+    def _drop_blocks(self, blocks: Iterable[Sequence[int]]) -> None:
+        # Quita bloques del índice y del disco (re-ingesta de un log reescrito)
+        drop = {(int(day), int(block)) for day, block in blocks}
+        if not drop:
+            return
+        keep = np.array([(int(e['day']), int(e['block'])) not in drop for e in self.index], dtype=bool)
+        self.index = self.index[keep]
+        self._write_atomic(self._index_path, self.index)
+        for day, block in drop:
+            try:
+                os.remove(self._block_path(day, block))
+            except FileNotFoundError:
+                pass
+
+    def append(self, block: np.ndarray) -> None:
+        """Agrega registros en vivo; se escriben al completar un bloque."""
+        if len(block) == 0:
+            return
+        self._pending.append(np.asarray(block, dtype=TELEMETRY_DTYPE))
+        self._pending_rows += len(block)
+        if self._pending_rows >= self.block_rows:
+            self.flush()
+
+    def flush(self) -> None:
+        """Escribe los registros pendientes como bloque(s) en disco."""
+        if not self._pending:
+            return
+        rows = np.concatenate(self._pending)
+        self._pending = []
+        self._pending_rows = 0
+        self._write_sorted(rows[np.argsort(rows['t_ns'], kind='stable')])
+
+    def _load_sources(self) -> Dict[str, dict]:
+        if os.path.exists(self._sources_path):
+            with open(self._sources_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {}
+
+    @staticmethod
+    def _head_crc(filepath: str, length: int) -> int:
+        # Huella del inicio ya ingerido: detecta un log reescrito con otro contenido
+        with open(filepath, 'rb') as f:
+            return zlib.crc32(f.read(min(length, 1 << 16)))
+
+    @staticmethod
+    def _legacy_source(filepath: str, signature: List[float]) -> dict:
+        # sources.json anterior ([tamaño, mtime]): se ingirió el archivo completo
+        # hasta ese tamaño; sus bloques no se registraban
+        with open(filepath, 'rb') as f:
+            head = f.read(int(signature[0]))
+        return {'size': signature[0], 'mtime': signature[1],
+                'offset': head.rfind(b'\n') + 1, 'rows': None, 'blocks': []}
+
+    def ingest_csv(self, filepath: str, force: bool = False) -> int:
+        """Ingiere un log CSV de sesión. Retorna el número de filas nuevas.
+
+        Un log que creció solo agrega las filas del final (desde el byte ya
+        leído). Si se reescribió (más corto o con otro inicio) o con `force`,
+        sus bloques anteriores se eliminan y se ingiere completo.
+        """
+        sources = self._load_sources()
+        name = os.path.basename(filepath)
+        stat = os.stat(filepath)
+        source = sources.get(name)
+        if isinstance(source, list):
+            source = self._legacy_source(filepath, source)
+        if (not force and source is not None
+                and [source['size'], source['mtime']] == [stat.st_size, stat.st_mtime]):
+            return 0
+
+        if (force or source is None or stat.st_size < source['offset']
+                or source.get('head_crc', self._head_crc(filepath, source['offset']))
+                != self._head_crc(filepath, source['offset'])):
+            if source is not None:
+                self._drop_blocks(source['blocks'])
+            source = {'offset': 0, 'rows': 0, 'blocks': []}
+
+        block, offset = csv_tail_to_block(filepath, source['offset'])
+        written = self._write_sorted(block) if len(block) else []
+
+        sources[name] = {
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'offset': offset,
+            'head_crc': self._head_crc(filepath, offset),
+            'rows': None if source['rows'] is None else source['rows'] + len(block),
+            'blocks': [list(b) for b in source['blocks']] + [list(b) for b in written],
+        }
+        tmp_path = self._sources_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(sources, f, indent=1)
+        os.replace(tmp_path, self._sources_path)
+        return len(block)
+
+    def ingest_logs(self, log_dir: str = None) -> int:
+        """Ingiere todos los turbina_log_*.csv nuevos o modificados."""
+        log_dir = log_dir or storage_config.LOG_DIR
+        pattern = os.path.join(log_dir, 'turbina_log_*.csv')
+        return sum(self.ingest_csv(path) for path in sorted(glob.glob(pattern)))
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def _candidate_blocks(self, start: Optional[int], end: Optional[int],
+                          where: Sequence[Tuple[str, str, object]]) -> np.ndarray:
+        idx = self.index
+        mask = np.ones(len(idx), dtype=bool)
+        if start is not None:
+            mask &= idx['t_max'] >= start
+        if end is not None:
+            mask &= idx['t_min'] <= end
+
+        # Poda por resumen min/max de cada bloque
+        for column, op, value in where:
+            if column == 't_ns':
+                continue
+            lo, hi = idx[f'{column}_min'], idx[f'{column}_max']
+            if op == '==':
+                mask &= (lo <= value) & (hi >= value)
+            elif op == '!=':
+                mask &= ~((lo == value) & (hi == value))
+            elif op in ('<', '<='):
+                mask &= _OPERATORS[op](lo, value)
+            else:
+                mask &= _OPERATORS[op](hi, value)
+        return idx[mask]
+
+    def _prepare_where(self, where: Optional[Iterable[Predicate]]) -> List[Tuple[str, str, object]]:
+        prepared = []
+        for column, op, value in where or ():
+            if op not in _OPERATORS:
+                raise ValueError(f"Operador no soportado: {op}")
+            column = resolve_column(column)
+            value = to_ns(value) if column == 't_ns' else _resolve_value(column, value)
+            prepared.append((column, op, value))
+        return prepared
+
+    def query(self, start: TimeLike = None, end: TimeLike = None,
+              where: Optional[Iterable[Predicate]] = None,
+              columns: Optional[Sequence[str]] = None) -> np.ndarray:
+        """Consulta por rango temporal [start, end] y predicados.
+
+        Args:
+            start, end: Límites (ns UTC, texto o Timestamp en hora local)
+            where: Lista de predicados (columna, operador, valor), p. ej.
+                   [('Status', '==', 'ANOMALÍA'), ('Score', '<', -0.05)]
+            columns: Columnas a retornar (siempre incluye t_ns)
+        Returns: Arreglo estructurado ordenado por tiempo
+        """
+        start_ns, end_ns = to_ns(start), to_ns(end)
+        predicates = self._prepare_where(where)
+        blocks = self._candidate_blocks(start_ns, end_ns, predicates)
+
+        parts = []
+        for entry in blocks:
+            rows = np.load(self._block_path(int(entry['day']), int(entry['block'])),
+                           mmap_mode='r')
+            # Recorte temporal por búsqueda binaria (bloques ordenados)
+            lo = 0 if start_ns is None else np.searchsorted(rows['t_ns'], start_ns, 'left')
+            hi = len(rows) if end_ns is None else np.searchsorted(rows['t_ns'], end_ns, 'right')
+            rows = rows[lo:hi]
+            if predicates and len(rows):
+                keep = np.ones(len(rows), dtype=bool)
+                for column, op, value in predicates:
+                    keep &= _OPERATORS[op](rows[column], value)
+                rows = rows[keep]
+            if len(rows):
+                parts.append(upgrade_block(np.array(rows)))
+
+        result = np.concatenate(parts) if parts else np.empty(0, dtype=TELEMETRY_DTYPE)
+        if len(parts) > 1:
+            result = result[np.argsort(result['t_ns'], kind='stable')]
+        if columns is not None:
+            names = ['t_ns'] + [resolve_column(c) for c in columns if resolve_column(c) != 't_ns']
+            result = result[names]
+        return result
+
+    def downsample(self, start: TimeLike = None, end: TimeLike = None,
+                   interval_s: float = 60.0,
+                   columns: Optional[Sequence[str]] = None,
+                   where: Optional[Iterable[Predicate]] = None) -> pd.DataFrame:
+        """Lectura reducida: media por intervalo de tiempo fijo.
+
+        Returns: DataFrame indexado por hora local con una fila por intervalo
+        """
+        columns = [resolve_column(c) for c in (columns or ['wm', 'P', 'V', 'S', 'score'])]
+        rows = self.query(start, end, where=where, columns=columns)
+        if len(rows) == 0:
+            return pd.DataFrame(columns=columns)
+
+        step = int(interval_s * 1_000_000_000)
+        buckets = rows['t_ns'] // step
+        keys, first, counts = np.unique(buckets, return_index=True, return_counts=True)
+        data = {
+            column: np.add.reduceat(rows[column].astype(np.float64), first) / counts
+            for column in columns
+        }
+        data['count'] = counts
+        return pd.DataFrame(data, index=local_datetimes(keys * step))
+
+    @staticmethod
+    def to_frame(rows: np.ndarray) -> pd.DataFrame:
+        """Convierte un resultado de consulta a DataFrame indexado por hora local."""
+        frame = pd.DataFrame({
+            name: rows[name] for name in rows.dtype.names if name != 't_ns'
+        }, index=local_datetimes(rows['t_ns']))
+        for column in ('status', 'phys_status'):
+            if column in frame.columns:
+                frame[column] = status_labels(frame[column].to_numpy())
+        return frame
+
+    def summary(self) -> pd.DataFrame:
+        """Resumen del índice (un registro por bloque)."""
+        return pd.DataFrame(self.index)
+
+
+def _parse_predicate(text: str) -> Predicate:
+    for op in ('==', '!=', '<=', '>=', '<', '>'):
+        if op in text:
+            column, value = text.split(op, 1)
+            value = value.strip()
+            try:
+                return column.strip(), op, float(value)
+            except ValueError:
+                return column.strip(), op, value
+    raise ValueError(f"Predicado inválido: {text}")
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Almacén de series temporales de los logs de sesión")
+    parser.add_argument('--root', default=storage_config.STORE_DIR)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p_ingest = sub.add_parser('ingest', help="Ingiere los logs CSV nuevos")
+    p_ingest.add_argument('log_dir', nargs='?', default=storage_config.LOG_DIR)
+
+    p_query = sub.add_parser('query', help="Consulta por rango y predicados")
+    p_query.add_argument('--start')
+    p_query.add_argument('--end')
+    p_query.add_argument('--where', action='append', default=[],
+                         help="Predicado, p. ej. 'Status==ANOMALÍA'")
+    p_query.add_argument('--every', type=float,
+                         help="Intervalo de reducción en segundos")
+
+    args = parser.parse_args()
+    store = TimeSeriesStore(args.root)
+
+    if args.command == 'ingest':
+        t0 = time.perf_counter()
+        n = store.ingest_logs(args.log_dir)
+        print(f"Filas ingeridas: {n} ({time.perf_counter() - t0:.2f} s, {len(store.index)} bloques)")
+        return
+
+    where = [_parse_predicate(w) for w in args.where]
+    t0 = time.perf_counter()
+    if args.every:
+        result = store.downsample(args.start, args.end, args.every, where=where)
+    else:
+        result = TimeSeriesStore.to_frame(store.query(args.start, args.end, where=where))
+    print(result)
+    print(f"{len(result)} filas en {(time.perf_counter() - t0) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,14 @@ from .styles import get_custom_css
 from .header import render_header
 from .sidebar import render_sidebar
 from .metrics import render_metrics_panel
-from .charts import render_charts
+from .charts import render_charts, render_resolution_selector, render_rollup_charts
 
 __all__ = [
     'get_custom_css',
     'render_header',
     'render_sidebar',
     'render_metrics_panel',
-    'render_charts'
+    'render_charts',
+    'render_resolution_selector',
+    'render_rollup_charts'
 ]
@@ -1,7 +1,11 @@
 import streamlit as st
 import pandas as pd
+from typing import Optional, Tuple
+
+from core.profiler import traced
 
 #  Renderiza las gráficas técnicas de la aplicación
+@traced('ui.render_charts')
 def render_charts(history: pd.DataFrame) -> None:
     st.markdown("---")
     
@@ -22,3 +26,58 @@ def render_charts(history: pd.DataFrame) -> None:
     
     st.markdown("### Dinámica del Rotor (wm)")
     st.line_chart(history.set_index('Time')[['wm']], height=220)
+
+
+# Opciones de resolución de las gráficas: etiqueta -> segundos (None = crudo)
+RESOLUTION_OPTIONS = {
+    "Tiempo real": None,
+    "1 s": 1,
+    "1 min": 60,
+    "10 min": 600,
+}
+
+
+# Selector de resolución de las gráficas técnicas
+# Returns: (segundos por intervalo o None para el historial crudo, etiqueta)
+def render_resolution_selector() -> Tuple[Optional[int], str]:
+    label = st.radio(
+        "Resolución de gráficas",
+        list(RESOLUTION_OPTIONS),
+        horizontal=True,
+        key="chart_resolution",
+        help="Tiempo real: últimas muestras. 1 s / 1 min / 10 min: agregados en línea (media, mín. y máx.)."
+    )
+    return RESOLUTION_OPTIONS[label], label
+
+
+# Renderiza las gráficas a partir de agregados (media con banda mín./máx.)
+# Args: rollup: DataFrame de RollupEngine.frame()
+#       label: Texto de la resolución
+@traced('ui.render_rollup_charts')
+def render_rollup_charts(rollup: pd.DataFrame, label: str) -> None:
+    st.markdown("---")
+    
+    if rollup.empty:
+        st.info(f"Sin agregados de {label} todavía.")
+        return
+    
+    series = rollup.set_index('Time')
+    
+    col_graph1, col_graph2 = st.columns(2)
+    
+    with col_graph1:
+        st.markdown(f"### ⚡ Potencia Activa (P) — {label}")
+        st.line_chart(series[['P_min', 'P', 'P_max']], height=250)
+    
+    with col_graph2:
+        st.markdown(f"### Voltaje (V) — {label}")
+        st.line_chart(series[['V_min', 'V', 'V_max']], height=250)
+    
+    st.markdown(f"### Potencia Aparente (S) — {label}")
+    st.line_chart(series[['S_min', 'S', 'S_max']], height=220)
+    
+    st.markdown(f"### Dinámica del Rotor (wm) — {label}")
+    st.line_chart(series[['wm_min', 'wm', 'wm_max']], height=220)
+    
+    st.caption(f"Intervalos: {len(series)} | Muestras: {int(series['count'].sum())} | "
+               f"Anomalías: {int(series['anomalies'].sum())}")
@@ -1,6 +1,11 @@
 import streamlit as st
 import pandas as pd
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from core.profiler import traced
+
+# Columnas de atribución del historial -> nombre de la feature
+ATTRIBUTION_LABELS = {'AttrV': 'Viento', 'AttrWm': 'RPM', 'AttrP': 'Potencia', 'AttrRho': 'Densidad'}
 
 # Genera el HTML de la animación de la turbina
 # Args: rotation_speed: Velocidad de rotación en rad/s
@@ -29,11 +34,21 @@ def get_turbine_animation(rotation_speed: float) -> str:
 </div>
 """
 
+# Genera el texto de las features que más pesaron en el aislamiento
+# Args: attribution: {feature: fracción} (suma 1)
+# Returns: String como "RPM 62% · Potencia 21%" o vacío si no hay atribución
+def get_attribution_text(attribution: Optional[Dict[str, float]], top: int = 2) -> str:
+    if not attribution or sum(attribution.values()) <= 0:
+        return ""
+    ranked = sorted(attribution.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return " · ".join(f"{name} {share:.0%}" for name, share in ranked)
+
 # Genera el HTML del panel de diagnóstico IA
 # Args: status: Estado de la predicción ("NORMAL", "ANOMALÍA", etc.)
 #       score: Score de anomalía
+#       attribution: {feature: fracción} del aislamiento (opcional)
 # Returns: String con el HTML del panel
-def get_anomaly_status_html(status: str, score: float) -> str:
+def get_anomaly_status_html(status: str, score: float, attribution: Optional[Dict[str, float]] = None) -> str:
     if status == "NORMAL":
         return f"""
         <div style="background-color: rgba(34, 197, 94, 0.2); 
@@ -44,21 +59,38 @@ def get_anomaly_status_html(status: str, score: float) -> str:
         </div>
         """
     elif status == "ANOMALÍA":
+        drivers = get_attribution_text(attribution)
         return f"""
         <div style="background-color: rgba(239, 68, 68, 0.2); 
                     border: 1px solid #ef4444; color: #ef4444; 
                     padding: 15px; border-radius: 10px; text-align: center;">
             <h2 style="margin:0;">🚨 ANOMALÍA DETECTADA</h2>
             <p style="margin:0;">Patrón operativo desconocido (Score: {score:.4f})</p>
+            {f'<p style="margin:4px 0 0;">Determinante: {drivers}</p>' if drivers else ''}
         </div>
         """
     else:
         return "<p style='text-align: center; color: #9ca3af;'>Esperando inferencia...</p>"
 
+# Genera el HTML de la línea del detector físico (curva de potencia)
+# Args: status: Estado del detector ("NORMAL", "ANOMALÍA", "N/A")
+#       residual: Residuo en anchos de banda del bin de viento
+# Returns: String con el HTML de la línea
+def get_physics_status_html(status: str, residual: float) -> str:
+    if status == "NORMAL":
+        color, text = "#22c55e", "Coherente con la curva de potencia"
+    elif status == "ANOMALÍA":
+        color, text = "#ef4444", "Fuera de la curva de potencia"
+    else:
+        return "<p style='margin:6px 0 0; color: #9ca3af;'>Curva de potencia: sin referencia para este viento</p>"
+    return (f"<p style='margin:6px 0 0; color: {color};'>"
+            f"⚙️ {text} (residuo: {residual:+.2f})</p>")
+
 # Renderiza el panel de métricas con KPIs y diagnóstico IA
 # Args: latest_data: Último registro de datos
 #       history: DataFrame con historial de datos
 # Returns: None
+@traced('ui.render_metrics_panel')
 def render_metrics_panel(latest_data: Dict[str, Any], history: pd.DataFrame) -> None:
     turbine_html = get_turbine_animation(latest_data['wm'])
     
@@ -78,11 +110,17 @@ def render_metrics_panel(latest_data: Dict[str, Any], history: pd.DataFrame) ->
     with col_ai:
         st.markdown("### Diagnóstico IA (Isolation Forest)")
         
+        attribution = {label: latest_data[col] for col, label in ATTRIBUTION_LABELS.items()
+                       if col in latest_data}
         anomaly_html = get_anomaly_status_html(
             latest_data['Status'],
-            latest_data['Score']
+            latest_data['Score'],
+            attribution
         )
         st.markdown(anomaly_html, unsafe_allow_html=True)
+        if 'PhysStatus' in latest_data:
+            st.markdown(get_physics_status_html(latest_data['PhysStatus'], latest_data['Phys']),
+                        unsafe_allow_html=True)
         
         # Mini gráfica de tendencia
         st.caption("Tendencia del Score de Anomalía ( < 0 es Crítico)")
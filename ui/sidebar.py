@@ -5,6 +5,7 @@ import time
 from typing import Dict, Tuple
 
 from config.settings import ui_config, file_player_config
+from core.profiler import profiler
 
 
 def render_sidebar(controls: Dict[str, float], on_start, on_stop) -> Tuple[Dict[str, float], str]:
@@ -30,6 +31,8 @@ def render_sidebar(controls: Dict[str, float], on_start, on_stop) -> Tuple[Dict[
         else:
             result_controls = _render_file_mode(controls)
 
+        _render_diagnostics()
+
         st.caption("Estado: En Línea | Elecaustro V2.0 AI")
 
     return result_controls, mode
@@ -110,13 +113,13 @@ def _render_file_mode(controls: Dict[str, float]) -> Dict[str, float]:
     # Intervalo de reproducción
     st.write("**Velocidad de Reproducción**")
     interval = st.slider(
-        "Intervalo entre filas [s]",
+        "Intervalo entre filas [s simulados]",
         file_player_config.MIN_INTERVAL,
         file_player_config.MAX_INTERVAL,
         file_player_config.DEFAULT_INTERVAL,
         step=0.5,
         key="playback_interval",
-        help="Segundos de espera entre cada registro del archivo."
+        help="Segundos de simulación entre cada registro del archivo."
     )
 
     # Pitch sigue siendo manual
@@ -186,6 +189,53 @@ def _render_playback_controls(filepath: str, interval: float) -> None:
         st.progress(0.0, text="Presione PLAY para iniciar")
 
 
+def _render_diagnostics() -> None:
+    """Perfilador de muestreo y trazas del camino caliente (core/profiler.py)."""
+    with st.expander("Diagnóstico de rendimiento"):
+        sampling = st.toggle("Perfilador de muestreo", value=profiler.running, key="profiler_on")
+        spans = st.toggle("Trazas del camino caliente", value=profiler.tracing, key="profiler_spans",
+                          disabled=not sampling)
+        if sampling and (not profiler.running or spans != profiler.tracing):
+            profiler.start(spans=spans)
+        elif not sampling and profiler.running:
+            profiler.stop()
+
+        if profiler.samples == 0:
+            return
+        st.caption(f"{profiler.samples} muestras | costo del muestreo "
+                   f"{profiler.overhead() * 100:.2f} %")
+        top = profiler.top_functions(5)
+        st.dataframe(
+            [{'Hilo': thread, 'Función': func, 'Muestras': count} for thread, func, count in top],
+            hide_index=True, use_container_width=True
+        )
+        stats = profiler.span_stats()
+        if stats:
+            st.dataframe(stats, hide_index=True, use_container_width=True)
+
+        # Las exportaciones se generan solo al pulsar Exportar: serializarlas en
+        # cada rerun de cada sesión costaba ~0.25 s y ~11 MB con el buffer lleno
+        col1, col2 = st.columns(2)
+        with col1:
+            exported = st.button("Exportar", use_container_width=True, key="profiler_export")
+        with col2:
+            if st.button("Limpiar", use_container_width=True, key="profiler_reset"):
+                profiler.reset()
+                st.session_state.pop('profiler_dump', None)
+        if exported:
+            st.session_state.profiler_dump = profiler.dump()
+        paths = st.session_state.get('profiler_dump')
+        if paths is None:
+            return
+        st.caption(" | ".join(paths))
+        if exported:
+            # Descargas ofrecidas en el rerun de la exportación; los archivos quedan en disco
+            for i, (path, label) in enumerate(zip(paths, ("Pilas (.folded)", "Trazas (.json)"))):
+                with open(path, 'rb') as f:
+                    st.download_button(label, f.read(), file_name=os.path.basename(path),
+                                       use_container_width=True, key=f"profiler_download_{i}")
+
+
 def _init_file_player(filepath: str, interval: float) -> None:
     """Crea e inicializa el FilePlayerManager en session_state."""
     from core.file_player import FilePlayerManager
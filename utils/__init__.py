@@ -1,4 +1,5 @@
 """Módulo de utilidades"""
 from .data_processing import DataProcessor
+from .result_cache import ResultCache, file_digest
 
-__all__ = ['DataProcessor']
+__all__ = ['DataProcessor', 'ResultCache', 'file_digest']
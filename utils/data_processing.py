@@ -1,52 +1,84 @@
 import pandas as pd
+import numpy as np
 import queue
-import time
 import os
 from datetime import datetime
 from typing import Optional
 
-from config.settings import ui_config
+from config.settings import ui_config, storage_config
+from core.profiler import traced
+from core.telemetry import (
+    TelemetryBuffer,
+    local_datetimes,
+    records_to_block,
+    status_labels
+)
+
+# Columnas del archivo CSV de registro de sesión
+CSV_COLUMNS = [
+    'Timestamp', 'Time', 'Velocidad_Viento_ms', 'Angulo_Pitch_deg',
+    'Velocidad_Mecanica_rads', 'Potencia_Activa_kW',
+    'Voltaje_Red_kV', 'Potencia_Aparente_kVA',
+    'Anomaly_Score', 'Status_IA', 'Residuo_Fisico', 'Status_Fisico',
+    'Attr_Viento', 'Attr_RPM', 'Attr_Potencia', 'Attr_Densidad'
+]
 
 # Procesador de datos en tiempo real
 class DataProcessor:
     
+    # Extrae todos los registros pendientes de la cola
+    # Args:
+        # data_queue: Cola con registros individuales o bloques de telemetría
+    # Returns: Arreglo estructurado (TELEMETRY_DTYPE) o None si no hay datos
+    @staticmethod
+    def drain_queue(data_queue: queue.Queue) -> Optional[np.ndarray]:
+        parts = []
+        records = []
+        while not data_queue.empty():
+            item = data_queue.get()
+            if isinstance(item, np.ndarray):
+                # Bloque del camino vectorizado: conservar el orden de llegada
+                if records:
+                    parts.append(records_to_block(records))
+                    records = []
+                parts.append(item)
+            else:
+                records.append(item)
+
+        if records:
+            parts.append(records_to_block(records))
+
+        if not parts:
+            return None
+
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+    
     # Procesa los datos de la cola y actualiza el historial
     # Args:
         # data_queue: Cola con datos nuevos
-        # history: DataFrame con historial actual
-    # Returns: DataFrame actualizado o None si no hay cambios
+        # history: Historial circular actual
+    # Returns: Bloque con los registros nuevos o None si no hay cambios
     @staticmethod
-    def process_queue(data_queue: queue.Queue, history: pd.DataFrame) -> Optional[pd.DataFrame]:
-        if data_queue.empty():
+    def process_queue(data_queue: queue.Queue, history: TelemetryBuffer) -> Optional[np.ndarray]:
+        block = DataProcessor.drain_queue(data_queue)
+        if block is None:
             return None
         
-        # Extraer todos los datos de la cola
-        new_data = []
-        while not data_queue.empty():
-            new_data.append(data_queue.get())
-        
-        # Agregar al historial
-        new_df = pd.DataFrame(new_data)
-        updated_history = pd.concat(
-            [history, new_df],
-            ignore_index=True
-        ).tail(ui_config.MAX_HISTORY_SIZE)
-        
-        return updated_history
+        # Agregar al historial (escritura en sitio, sin concatenar)
+        history.extend(block)
+        return block
     
-    # Inicializa un DataFrame vacío para el historial
+    # Inicializa el historial circular vacío
     @staticmethod
-    def initialize_history() -> pd.DataFrame:
-        return pd.DataFrame(columns=[
-            'Time', 'wm', 'P', 'V', 'S', 'Score', 'Status'
-        ])
+    def initialize_history() -> TelemetryBuffer:
+        return TelemetryBuffer(ui_config.MAX_HISTORY_SIZE)
     
     # Crea un nuevo archivo CSV para la sesión actual
     # Returns: Ruta del archivo CSV creado
     @staticmethod
     def create_csv_file() -> str:
         # Crear carpeta si no existe
-        log_dir = 'data_logs'
+        log_dir = storage_config.LOG_DIR
         if not os.path.exists(log_dir):
             os.makedirs(log_dir)
         
@@ -56,12 +88,7 @@ class DataProcessor:
         filepath = os.path.join(log_dir, filename)
         
         # Crear archivo con encabezados
-        df_empty = pd.DataFrame(columns=[
-            'Timestamp', 'Time', 'Velocidad_Viento_ms', 'Angulo_Pitch_deg',
-            'Velocidad_Mecanica_rads', 'Potencia_Activa_kW', 
-            'Voltaje_Red_kV', 'Potencia_Aparente_kVA',
-            'Anomaly_Score', 'Status_IA'
-        ])
+        df_empty = pd.DataFrame(columns=CSV_COLUMNS)
         df_empty.to_csv(filepath, index=False)
         
         return filepath
@@ -69,30 +96,34 @@ class DataProcessor:
     # Guarda datos nuevos en el archivo CSV
     # Args:
     #     filepath: Ruta del archivo CSV
-    #     new_data: Lista de diccionarios con datos nuevos
-    #     controls: Diccionario con controles actuales (viento, pitch)
+    #     block: Arreglo estructurado (TELEMETRY_DTYPE) con los registros nuevos.
+    #            Cada registro trae las consignas de viento/pitch de su propio frame.
     @staticmethod
-    def save_to_csv(filepath: str, new_data: list, controls: dict) -> None:
-        if not new_data or not os.path.exists(filepath):
+    @traced('ui.save_to_csv')
+    def save_to_csv(filepath: str, block: np.ndarray) -> None:
+        if block is None or len(block) == 0 or not os.path.exists(filepath):
             return
         
-        # Preparar datos para guardar
-        rows = []
-        for data in new_data:
-            row = {
-                'Timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3],
-                'Time': data.get('Time', ''),
-                'Velocidad_Viento_ms': controls.get('v', 0.0),
-                'Angulo_Pitch_deg': controls.get('p', 0.0),
-                'Velocidad_Mecanica_rads': data.get('wm', 0.0),
-                'Potencia_Activa_kW': data.get('P', 0.0),
-                'Voltaje_Red_kV': data.get('V', 0.0),
-                'Potencia_Aparente_kVA': data.get('S', 0.0),
-                'Anomaly_Score': data.get('Score', 0.0),
-                'Status_IA': data.get('Status', 'N/A')
-            }
-            rows.append(row)
+        # Formato de texto vectorizado, solo al escribir
+        times = local_datetimes(block['t_ns'])
+        df_new = pd.DataFrame({
+            'Timestamp': times.strftime('%Y-%m-%d %H:%M:%S.%f').str[:-3],
+            'Time': times.strftime('%H:%M:%S'),
+            'Velocidad_Viento_ms': block['v'],
+            'Angulo_Pitch_deg': block['p'],
+            'Velocidad_Mecanica_rads': block['wm'],
+            'Potencia_Activa_kW': block['P'],
+            'Voltaje_Red_kV': block['V'],
+            'Potencia_Aparente_kVA': block['S'],
+            'Anomaly_Score': block['score'],
+            'Status_IA': status_labels(block['status']),
+            'Residuo_Fisico': block['phys'],
+            'Status_Fisico': status_labels(block['phys_status']),
+            'Attr_Viento': block['attr_v'],
+            'Attr_RPM': block['attr_wm'],
+            'Attr_Potencia': block['attr_P'],
+            'Attr_Densidad': block['attr_rho']
+        })
         
         # Agregar al CSV (modo append)
-        df_new = pd.DataFrame(rows)
         df_new.to_csv(filepath, mode='a', header=False, index=False)
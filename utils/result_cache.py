@@ -0,0 +1,150 @@
+"""Caché de resultados intermedios direccionada por contenido.
+
+Cada etapa de un script de análisis (datos limpios, scores del modelo...) se
+guarda como un directorio de arreglos `.npy` más un `meta.json`, bajo una
+clave sha256 de sus entradas: contenido del log, archivos del modelo,
+parámetros y arreglos de los que depende. Si ninguna entrada cambió, la
+etapa se carga con `np.load(mmap_mode='r')` sin recalcular; si cambió
+alguna, la clave es otra y la etapa se recalcula sola (no hay invalidación
+manual).
+
+    cache = ResultCache()
+    clean = cache.stage('clean', [file_digest(LOG_PATH)], limpiar_log)
+    scores = cache.stage('scores', [clean, model_key, X], puntuar)
+    scores.arrays['scores'], scores.meta, scores.hit
+
+Las etapas se escriben en un directorio temporal y se publican con
+os.replace: una ejecución interrumpida nunca deja una etapa a medias.
+"""
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Callable, Dict, Iterable, NamedTuple, Tuple
+
+import numpy as np
+
+from config.settings import pipeline_config
+
+_META_FILE = 'meta.json'
+
+
+class CachedStage(NamedTuple):
+    name: str
+    key: str                      # sha256 hex de las entradas
+    arrays: Dict[str, np.ndarray]  # De solo lectura (mapeados) si `hit`
+    meta: dict
+    hit: bool
+
+
+def file_digest(path: str) -> str:
+    """sha256 del contenido de un archivo, o de todos los de un directorio."""
+    h = hashlib.sha256()
+    if os.path.isdir(path):
+        files = sorted(os.path.join(root, name)
+                       for root, _, names in os.walk(path) for name in names)
+    else:
+        files = [path]
+    for file in files:
+        h.update(os.path.relpath(file, path).encode() + b'\0')
+        with open(file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def _update(h, part) -> None:
+    # Cada parte lleva una etiqueta de tipo: 'a' y b'a' no dan la misma clave
+    if isinstance(part, CachedStage):
+        h.update(b'S' + part.key.encode())
+    elif isinstance(part, np.ndarray):
+        part = np.ascontiguousarray(part)
+        h.update(b'A' + f"{part.dtype.str}{part.shape}".encode())
+        h.update(memoryview(part).cast('B'))
+    elif isinstance(part, bytes):
+        h.update(b'B' + part)
+    else:
+        h.update(b'J' + json.dumps(part, sort_keys=True, default=str).encode())
+    h.update(b'\0')
+
+
+class ResultCache:
+    """Etapas de resultados en `directory`/<etapa>/<clave>/."""
+
+    def __init__(self, directory: str = None, enabled: bool = True, keep: int = None):
+        self.directory = directory or pipeline_config.RESULT_CACHE_DIR
+        self.enabled = enabled
+        self.keep = pipeline_config.RESULT_CACHE_KEEP if keep is None else keep
+
+    def key(self, name: str, inputs: Iterable) -> str:
+        h = hashlib.sha256(name.encode() + b'\0')
+        for part in inputs:
+            _update(h, part)
+        return h.hexdigest()
+
+    def _path(self, name: str, key: str) -> str:
+        return os.path.join(self.directory, name, key[:24])
+
+    def load(self, name: str, key: str):
+        """Etapa guardada con esa clave, o None si no existe."""
+        path = self._path(name, key)
+        meta_path = os.path.join(path, _META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        with open(meta_path) as f:
+            stored = json.load(f)
+        if stored.get('key') != key:
+            return None
+        arrays = {array: np.load(os.path.join(path, f"{array}.npy"), mmap_mode='r')
+                  for array in stored['arrays']}
+        return CachedStage(name, key, arrays, stored['meta'], True)
+
+    def save(self, name: str, key: str, arrays: Dict[str, np.ndarray], meta: dict) -> None:
+        path = self._path(name, key)
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for array, values in arrays.items():
+            np.save(os.path.join(tmp_path, f"{array}.npy"), np.asarray(values))
+        # meta.json al final: marca la etapa como completa
+        with open(os.path.join(tmp_path, _META_FILE), 'w') as f:
+            json.dump({'key': key, 'created': time.time(), 'arrays': list(arrays),
+                       'meta': meta}, f, indent=2, default=float)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        self.prune(name)
+
+    def stage(self, name: str, inputs: Iterable,
+              compute: Callable[[], Tuple[Dict[str, np.ndarray], dict]]) -> CachedStage:
+        """Carga la etapa `name` para esas entradas o la calcula y la guarda.
+
+        Args:
+            name: Nombre de la etapa (subdirectorio)
+            inputs: Partes de la clave: CachedStage, arreglos, bytes o valores JSON
+                    (para archivos, pasar `file_digest(ruta)`)
+            compute: Retorna ({nombre: arreglo numérico}, meta serializable en JSON)
+        """
+        key = self.key(name, inputs)
+        if self.enabled:
+            cached = self.load(name, key)
+            if cached is not None:
+                return cached
+        arrays, meta = compute()
+        if self.enabled:
+            self.save(name, key, arrays, meta)
+        return CachedStage(name, key, arrays, meta, False)
+
+    def prune(self, name: str) -> None:
+        """Conserva las `keep` claves más recientes de una etapa."""
+        root = os.path.join(self.directory, name)
+        if not self.keep or not os.path.isdir(root):
+            return
+        entries = sorted((os.path.join(root, entry) for entry in os.listdir(root)
+                          if '.tmp' not in entry),
+                         key=os.path.getmtime, reverse=True)
+        for path in entries[self.keep:]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def clear(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)